@@ -0,0 +1,162 @@
+"""
+Answer cache for repeated chat questions.
+
+Many employees ask the same few things (pay dates, shift swaps, how to
+apply). Before an answer is generated, the question is normalized and
+turned into a hashed n-gram vector:
+
+    "When do I get PAID??"  ->  "when do i get paid"
+                            ->  word unigrams + character trigrams, each hashed
+                                into one of DIMENSIONS buckets, L2-normalized
+
+The vectors of up to `capacity` answered questions are rows of one NumPy
+matrix, so a lookup is a single matrix-vector product: the row with the
+highest cosine similarity wins if it reaches `threshold`. Lookups and
+insertions refresh an entry; the least recently used one is evicted when the
+cache is full. Without NumPy the same vectors are kept as sparse dicts.
+
+generate_answer() is a local stand-in for the expensive answer generator,
+only called for questions the cache cannot answer. Each worker process has
+its own cache, warmed from the latest chat rows on first use.
+"""
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DIMENSIONS = 512
+NGRAM = 3
+
+DEFAULT_CAPACITY = 2048
+# Cosine similarity from which a stored answer is reused
+DEFAULT_THRESHOLD = 0.9
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Spelling variants folded before hashing
+_SYNONYMS = {
+    "pay": "paid", "payday": "paid", "paycheck": "paid", "salary": "paid", "wage": "paid", "wages": "paid",
+    "shifts": "shift", "swap": "switch", "swapping": "switch", "trade": "switch",
+    "applying": "apply", "application": "apply", "applications": "apply",
+    "jobs": "job",
+}
+
+def normalize(question):
+    """Lowercase word tokens with the spelling variants folded, joined by spaces"""
+    return ' '.join(_SYNONYMS.get(token, token) for token in _TOKEN_PATTERN.findall(question.lower()))
+
+def features(text):
+    """Hashed word unigrams and character n-grams of a normalized question -> {bucket: weight}"""
+    counts = {}
+    padded = f' {text} '
+    grams = text.split() + [padded[i:i + NGRAM] for i in range(len(padded) - NGRAM + 1)]
+    for gram in grams:
+        bucket = zlib.crc32(gram.encode('utf-8')) % DIMENSIONS
+        counts[bucket] = counts.get(bucket, 0) + 1
+    norm = sum(count * count for count in counts.values()) ** 0.5
+    return {bucket: count / norm for bucket, count in counts.items()} if norm else {}
+
+def generate_answer(question):
+    """Local stand-in for the answer generator: canned answers by topic"""
+    text = normalize(question)
+    words = set(text.split())
+    if 'paid' in words:
+        return ("Pay is set by each employer and shown on the job posting. Ask the employer "
+                "through your application for their pay dates.")
+    if 'shift' in words or 'switch' in words:
+        return ("Shift changes are arranged with your employer. Contact them from your "
+                "accepted application to switch or swap a shift.")
+    if 'apply' in words:
+        return ("Open a job from the dashboard or Nearby Jobs and press Apply Now. You can add "
+                "a cover letter, and the status shows under My Applications.")
+    return ("Thanks for your question! Browse the open jobs on your dashboard, and check "
+            "My Applications for updates from employers.")
+
+class AnswerCache:
+    """LRU cache of answers, looked up by question similarity"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, threshold=DEFAULT_THRESHOLD):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # normalized question -> slot, least recently used first
+        self.answers = [None] * capacity
+        self.keys = [None] * capacity
+        if numpy is not None:
+            self.vectors = numpy.zeros((capacity, DIMENSIONS), dtype=numpy.float32)
+        else:
+            self.vectors = [{} for _ in range(capacity)]
+        self.warmed = False
+
+    def __len__(self):
+        return len(self.entries)
+
+    def vector(self, key):
+        weights = features(key)
+        if numpy is None:
+            return weights
+        vector = numpy.zeros(DIMENSIONS, dtype=numpy.float32)
+        if weights:
+            vector[list(weights)] = list(weights.values())
+        return vector
+
+    def best_match(self, vector):
+        """(slot, similarity) of the most similar stored question"""
+        used = len(self.entries)
+        if numpy is not None:
+            # Unused slots are zero rows, they never win over a real match
+            similarities = self.vectors[:used] @ vector
+            slot = int(similarities.argmax())
+            return slot, float(similarities[slot])
+        best = (0, 0.0)
+        for slot in range(used):
+            stored = self.vectors[slot]
+            similarity = sum(weight * stored.get(bucket, 0.0) for bucket, weight in vector.items())
+            if similarity > best[1]:
+                best = (slot, similarity)
+        return best
+
+    def lookup(self, question):
+        """The stored answer of a near-identical question and its similarity, or (None, similarity)"""
+        key = normalize(question)
+        with self.lock:
+            slot = self.entries.get(key)
+            if slot is not None:
+                self.entries.move_to_end(key)
+                return self.answers[slot], 1.0
+            if not self.entries or not key:
+                return None, 0.0
+            slot, similarity = self.best_match(self.vector(key))
+            if similarity < self.threshold:
+                return None, similarity
+            self.entries.move_to_end(self.keys[slot])
+            return self.answers[slot], similarity
+
+    def add(self, question, answer):
+        key = normalize(question)
+        if not key:
+            return
+        with self.lock:
+            slot = self.entries.get(key)
+            if slot is None:
+                if len(self.entries) < self.capacity:
+                    slot = len(self.entries)
+                else:
+                    # Reuse the row of the least recently used entry
+                    _, slot = self.entries.popitem(last=False)
+                self.vectors[slot] = self.vector(key)
+                self.keys[slot] = key
+            self.entries[key] = slot
+            self.entries.move_to_end(key)
+            self.answers[slot] = answer
+
+    def warm(self, rows):
+        """Fill the cache from stored (question, answer) rows, oldest first"""
+        for question, answer in rows:
+            self.add(question, answer)
+        self.warmed = True
@@ -1,6 +1,24 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
+import answer_cache
+import archive
+import batch
+import chat_history
+import clusters
 import database as db
+import employee_locations
+import events
+import facets
+import feed
+import fieldsets
+import job_catalogue
+import locations
+import profiler
+import serializers
+import sync
+import texts
+import time_slots
+import traffic
 from werkzeug.security import generate_password_hash, check_password_hash
 import json
 import jwt
@@ -18,6 +36,40 @@ CORS(app)  # Enable Cross-Origin Resource Sharing for all routes
 app.config['SECRET_KEY'] = 'your-secret-key-here'  # Change in production
 app.config['JWT_EXPIRATION'] = 24 * 60 * 60  # 24 hours in seconds
 
+# On-demand request profiling (disabled unless a spool directory is set)
+app.config['PROFILE_SPOOL_DIR'] = os.environ.get('JOBAPP_PROFILE_DIR')
+app.config['PROFILE_SPOOL_LIMIT'] = int(os.environ.get('JOBAPP_PROFILE_LIMIT', 50))
+app.config['PROFILE_ALL_REQUESTS'] = os.environ.get('JOBAPP_PROFILE_ALL') == '1'  # Admin flag
+profiler.init_app(app)
+
+# Build new indexes in a background thread after migrations, so workers start serving at once
+app.config['ONLINE_INDEX_BUILDS'] = os.environ.get('JOBAPP_ONLINE_INDEX_BUILDS') == '1'
+
+# Serve open job listings from the in-memory catalogue (JOBAPP_JOB_CATALOGUE=0 reads SQLite instead)
+app.config['JOB_CATALOGUE'] = os.environ.get('JOBAPP_JOB_CATALOGUE', '1') != '0'
+
+# Seconds between chat history compactions in each worker, 0 turns the compactor off (see chat_history.py)
+app.config['CHAT_COMPACT_INTERVAL'] = float(os.environ.get('JOBAPP_CHAT_COMPACT_INTERVAL', 3600))
+chat_compactor = chat_history.Compactor(db.get_db_connection, app.config['CHAT_COMPACT_INTERVAL'])
+
+# Seconds between prunes of old delta sync tombstones, 0 turns it off (see sync.py)
+app.config['TOMBSTONE_PRUNE_INTERVAL'] = float(os.environ.get('JOBAPP_TOMBSTONE_PRUNE_INTERVAL', 3600))
+tombstone_pruner = sync.Pruner(db.get_db_connection, app.config['TOMBSTONE_PRUNE_INTERVAL'])
+
+# Seconds between refills of feeds that lost closed or deleted jobs, 0 turns it off (see feed.py)
+app.config['FEED_REFILL_INTERVAL'] = float(os.environ.get('JOBAPP_FEED_REFILL_INTERVAL', 60))
+feed_refiller = feed.Refiller(app.config['FEED_REFILL_INTERVAL'])
+
+# Answers reused for near-identical chat questions (see answer_cache.py)
+app.config['CHAT_CACHE_SIZE'] = int(os.environ.get('JOBAPP_CHAT_CACHE_SIZE', answer_cache.DEFAULT_CAPACITY))
+app.config['CHAT_SIMILARITY_THRESHOLD'] = float(os.environ.get('JOBAPP_CHAT_SIMILARITY_THRESHOLD',
+                                                               answer_cache.DEFAULT_THRESHOLD))
+chat_answers = answer_cache.AnswerCache(app.config['CHAT_CACHE_SIZE'], app.config['CHAT_SIMILARITY_THRESHOLD'])
+
+# Optional traffic capture for replay load tests (see traffic.py)
+app.config['TRAFFIC_CAPTURE_PATH'] = os.environ.get('JOBAPP_TRAFFIC_CAPTURE')
+traffic.init_app(app)
+
 # Helper function for creating JWT tokens
 def create_token(user_id, user_type):
     return jwt.encode({
@@ -26,9 +78,44 @@ def create_token(user_id, user_type):
         'exp': datetime.datetime.utcnow() + datetime.timedelta(seconds=app.config['JWT_EXPIRATION'])
     }, app.config['SECRET_KEY'])
 
-# Initialize the database when the app starts
-with app.app_context():
-    db.init_db()
+# Helper function for returning a body that is already encoded as JSON
+def json_response(body, status=200):
+    return Response(body, status=status, mimetype='application/json')
+
+# Sparse fieldsets: ?fields=id,title limits a GET response to those fields (see fieldsets.py)
+def requested_fields(allowed):
+    return fieldsets.parse(request.args.get('fields'), allowed)
+
+@app.errorhandler(fieldsets.InvalidFields)
+def invalid_fields(error):
+    return jsonify({'status': 'error', 'message': str(error)}), 400
+
+# Delta sync: ?since=<token> returns only what changed after the token (see sync.py)
+def requested_since():
+    return sync.parse_token(request.args.get('since'))
+
+@app.errorhandler(sync.InvalidSyncToken)
+def invalid_sync_token(error):
+    return jsonify({'status': 'error', 'message': str(error)}), 400
+
+@app.errorhandler(chat_history.InvalidCursor)
+def invalid_chat_cursor(error):
+    return jsonify({'status': 'error', 'message': str(error)}), 400
+
+def create_app():
+    """App factory for production servers.
+
+    The schema is initialized behind a file lock, so it is safe to call from
+    every worker of a pre-fork server (e.g. gunicorn -w 4 'wsgi:application').
+    """
+    with app.app_context():
+        db.init_db_once(app.config['ONLINE_INDEX_BUILDS'])
+        if app.config['JOB_CATALOGUE']:
+            job_catalogue.catalogue.load()
+    chat_compactor.start()
+    feed_refiller.start()
+    tombstone_pruner.start()
+    return app
 
 # Serve React App at root path
 @app.route('/')
@@ -54,6 +141,17 @@ def test_connection():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+# Several GET requests in one round trip, sharing database connections (see batch.py)
+@app.route('/api/batch', methods=['POST'])
+def batch_requests():
+    try:
+        items, parallel = batch.parse_batch(request.get_json(silent=True))
+    except batch.InvalidBatch as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    headers = {name: request.headers[name] for name in batch.FORWARDED_HEADERS if name in request.headers}
+    return json_response(batch.run_batch(app, items, parallel, headers))
+
 # Authentication endpoints
 @app.route('/api/register', methods=['POST'])
 def register():
@@ -116,6 +214,10 @@ def register():
     if not result['success']:
         return jsonify({'status': 'error', 'message': result['error']}), 400
     
+    if data['userType'] == 'employee':
+        employee_locations.index.invalidate()
+        feed.worker.employee_changed(result['user_id'])
+    
     # Generate JWT token for immediate login
     token = create_token(result['user_id'], data['userType'])
     
@@ -236,31 +338,144 @@ def employer_login():
 # Job related endpoints - These would need authentication middleware in production
 @app.route('/api/jobs', methods=['GET'])
 def get_all_jobs():
-    # Get jobs from database
-    result = db.get_all_jobs()
+    # Optional availability filter, e.g. ?available=Mon 18:00-22:00 or ?available=Weekend
+    job_ids = None
+    if request.args.get('available'):
+        slot = time_slots.parse_time_slot(request.args['available'])
+        if slot is None:
+            return jsonify({'status': 'error', 'message': 'Invalid availability'}), 400
+        job_ids = db.find_available_job_ids(*slot)
+    
+    # Pay filter (hourly rate), ordering and pagination run in SQL on the salary index
+    min_salary = request.args.get('min_salary', type=float)
+    sort = request.args.get('sort', 'newest')
+    limit = request.args.get('limit', type=int)
+    offset = request.args.get('offset', 0, type=int)
+    if sort not in db.JOB_SORT_ORDERS:
+        return jsonify({'status': 'error', 'message': 'Invalid sort order'}), 400
+    if (limit is not None and limit < 0) or offset < 0:
+        return jsonify({'status': 'error', 'message': 'Invalid pagination parameters'}), 400
+    in_sql = min_salary is not None or sort != 'newest' or limit is not None or offset
+    fields = requested_fields(fieldsets.JOB_FIELDS)
+    
+    since = requested_since()
+    if since is not None:
+        if job_ids is not None or in_sql:
+            return jsonify({'status': 'error', 'message': 'since cannot be combined with filters or pagination'}), 400
+        result = db.get_job_changes_json(since, fields)
+        if not result['success']:
+            # The client starts over with since=0
+            status = 410 if result.get('code') == 'RESYNC_REQUIRED' else 400
+            return jsonify({'status': 'error', 'message': result['error']}), status
+        return json_response(serializers.envelope(jobs=result['jobs'], deleted=result['deleted'],
+                                                  sync_token=serializers.dumps(result['sync_token'])))
+    
+    if app.config['JOB_CATALOGUE'] and not in_sql:
+        return json_response(serializers.envelope(jobs=job_catalogue.catalogue.list_jobs_json(job_ids, fields)))
+    
+    # Get jobs from database, already encoded as JSON
+    result = db.get_all_jobs_json(job_ids, min_salary, sort, limit, offset, fields)
     
     if not result['success']:
         return jsonify({'status': 'error', 'message': result['error']}), 400
     
-    return jsonify({
-        'status': 'success',
-        'jobs': result['jobs']
-    }), 200
+    return json_response(serializers.envelope(jobs=result['jobs']))
+
+@app.route('/api/jobs/search', methods=['GET'])
+def search_jobs():
+    fields = requested_fields(fieldsets.JOB_FIELDS)
+    try:
+        # Facet filters, repeat a parameter to select several values (?time_slot=morning&time_slot=evening)
+        filters = {facet: request.args.getlist(facet) for facet in facets.SEARCH_FACETS if request.args.getlist(facet)}
+        
+        # Optional query point for the distance rings
+        latitude = request.args.get('lat')
+        longitude = request.args.get('lng')
+        latitude = float(latitude) if latitude is not None else None
+        longitude = float(longitude) if longitude is not None else None
+        if 'distance' in filters and (latitude is None or longitude is None):
+            return jsonify({'status': 'error', 'message': 'Distance filter needs lat and lng'}), 400
+        
+        limit = request.args.get('limit', 50, type=int)
+        offset = request.args.get('offset', 0, type=int)
+        if limit < 0 or offset < 0:
+            return jsonify({'status': 'error', 'message': 'Invalid pagination parameters'}), 400
+        
+        jobs, total, counts = facets.index.search(filters, latitude, longitude, limit, offset)
+        
+        return jsonify({
+            'status': 'success',
+            'jobs': [fieldsets.pick(job, fields) for job in jobs],
+            'total': total,
+            'facets': counts
+        }), 200
+        
+    except ValueError:
+        return jsonify({
+            'status': 'error', 
+            'message': 'Invalid location parameters'
+        }), 400
+    except Exception as e:
+        print(f"Error searching jobs: {e}")
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'jobs': []
+        }), 500
+
+@app.route('/api/jobs/clusters', methods=['GET'])
+def get_job_clusters():
+    try:
+        # bbox=west,south,east,north in degrees, zoom as used by the map
+        west, south, east, north = (float(value) for value in request.args['bbox'].split(','))
+        zoom = int(float(request.args.get('zoom', 12)))
+        if not (-90 <= south <= north <= 90):
+            raise ValueError('Invalid bbox')
+        
+        return jsonify({
+            'status': 'success',
+            'zoom': max(clusters.MIN_ZOOM, min(clusters.MAX_ZOOM, zoom)),
+            'clusters': clusters.grid.clusters(west, south, east, north, zoom)
+        }), 200
+        
+    except (KeyError, ValueError):
+        return jsonify({
+            'status': 'error', 
+            'message': 'Invalid bbox or zoom parameters'
+        }), 400
+    except Exception as e:
+        print(f"Error clustering jobs: {e}")
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'clusters': []
+        }), 500
 
 @app.route('/api/jobs/nearby', methods=['GET'])
 def get_nearby_jobs():
+    fields = requested_fields(fieldsets.NEARBY_JOB_FIELDS)
     try:
         # Get location parameters
         latitude = float(request.args.get('lat', 0))
         longitude = float(request.args.get('lng', 0))
         radius = float(request.args.get('radius', 10))  # Default 10km radius
+        # Optional predefined location id, answers from the distance matrix
+        location_id = request.args.get('location_id', type=int)
+        
+        if app.config['JOB_CATALOGUE']:
+            return jsonify({
+                'status': 'success',
+                'jobs': [fieldsets.pick(job, fields)
+                         for job in job_catalogue.catalogue.nearby(latitude, longitude, radius, location_id)]
+            }), 200
         
         conn = db.get_db_connection()
         cursor = conn.cursor()
         
         # Get all jobs with location data
-        cursor.execute('''
-            SELECT j.*, e.name AS employer_name, e.company_name 
+        # The coordinates are read for the distance even when not requested
+        cursor.execute(f'''
+            SELECT {fieldsets.projection(fieldsets.NEARBY_JOB_FIELDS, fields, ('latitude', 'longitude'))}
             FROM jobs j
             JOIN employers e ON j.employer_id = e.id
             WHERE j.status = 'open' AND j.latitude IS NOT NULL AND j.longitude IS NOT NULL
@@ -291,7 +506,7 @@ def get_nearby_jobs():
         
         return jsonify({
             'status': 'success',
-            'jobs': nearby_jobs
+            'jobs': [fieldsets.pick(job, fields) for job in nearby_jobs]
         }), 200
         
     except ValueError:
@@ -307,20 +522,54 @@ def get_nearby_jobs():
             'jobs': []
         }), 500
 
+@app.route('/api/employees/density', methods=['GET'])
+def get_talent_density():
+    try:
+        # Optional bbox=west,south,east,north, skill and cell size in degrees
+        bbox = request.args.get('bbox')
+        west, south, east, north = (float(value) for value in bbox.split(',')) if bbox else (-180, -90, 180, 90)
+        if not (-180 <= west <= east <= 180 and -90 <= south <= north <= 90):
+            raise ValueError('Invalid bbox')
+        cell_size = request.args.get('cell', type=float)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid bbox parameters'}), 400
+    
+    # Aggregated counts only, individual employees are never returned
+    result = db.get_talent_density(west, south, east, north, request.args.get('skill'), cell_size)
+    
+    if not result['success']:
+        return jsonify({'status': 'error', 'message': result['error']}), 400
+    
+    return jsonify({
+        'status': 'success',
+        'cell_size': result['cell_size'],
+        'cells': result['cells']
+    }), 200
+
 @app.route('/api/employees/nearby', methods=['GET'])
 def get_nearby_talent():
+    fields = requested_fields(fieldsets.TALENT_FIELDS)
     try:
         # Get location parameters
         latitude = float(request.args.get('lat', 0))
         longitude = float(request.args.get('lng', 0))
         radius = float(request.args.get('radius', 10))  # Default 10km radius
+        location_id = request.args.get('location_id', type=int)
+        
+        # From a predefined location: per-location buckets and the distance matrix
+        nearby_talent = employee_locations.index.find_nearby(latitude, longitude, radius, location_id, fields)
+        if nearby_talent is not None:
+            return jsonify({
+                'status': 'success',
+                'talent': nearby_talent
+            }), 200
         
         conn = db.get_db_connection()
         cursor = conn.cursor()
         
-        # Get all employees with location data
-        cursor.execute('''
-            SELECT id, name, email, education, skills, experience, latitude, longitude
+        # Get all employees with location data (coordinates always, for the distance)
+        cursor.execute(f'''
+            SELECT {fieldsets.projection(fieldsets.TALENT_FIELDS, fields, ('latitude', 'longitude'))}
             FROM employees 
             WHERE latitude IS NOT NULL AND longitude IS NOT NULL
         ''')
@@ -339,7 +588,7 @@ def get_nearby_talent():
                     emp_dict['skills'] = json.loads(emp_dict['skills'])
                 except:
                     emp_dict['skills'] = []
-            else:
+            elif 'skills' in emp_dict:
                 emp_dict['skills'] = []
             
             if emp_dict['latitude'] and emp_dict['longitude']:
@@ -352,9 +601,6 @@ def get_nearby_talent():
                 # Add employee if within radius
                 if distance <= radius:
                     emp_dict['distance'] = round(distance, 2)  # Distance in km
-                    # Remove sensitive information
-                    if 'email' in emp_dict:
-                        del emp_dict['email']
                     nearby_talent.append(emp_dict)
         
         # Sort by distance
@@ -362,7 +608,7 @@ def get_nearby_talent():
         
         return jsonify({
             'status': 'success',
-            'talent': nearby_talent
+            'talent': [fieldsets.pick(employee, fields) for employee in nearby_talent]
         }), 200
         
     except ValueError:
@@ -422,6 +668,10 @@ def create_job():
     if not result['success']:
         return jsonify({'status': 'error', 'message': result['error']}), 400
     
+    if app.config['JOB_CATALOGUE']:
+        job_catalogue.catalogue.job_created(result['job_id'])
+    feed.worker.job_created(result['job_id'])
+    
     return jsonify({
         'status': 'success',
         'message': 'Job created successfully',
@@ -430,7 +680,7 @@ def create_job():
 
 @app.route('/api/jobs/<int:job_id>', methods=['GET'])
 def get_job(job_id):
-    result = db.get_job_by_id(job_id)
+    result = db.get_job_by_id(job_id, requested_fields(fieldsets.JOB_DETAIL_FIELDS))
     
     if not result['success']:
         return jsonify({'status': 'error', 'message': result['error']}), 404
@@ -455,6 +705,8 @@ def apply_for_job_route(job_id):
     if not result['success']:
         return jsonify({'status': 'error', 'message': result['error']}), 400
     
+    events.hub.publish(result['events'])
+    
     return jsonify({
         'status': 'success',
         'message': 'Application submitted successfully',
@@ -466,6 +718,7 @@ def apply_for_job_route(job_id):
 # Get jobs posted by a specific employer
 @app.route('/api/employers/<int:employer_id>/jobs', methods=['GET'])
 def get_employer_jobs(employer_id):
+    fields = requested_fields(fieldsets.EMPLOYER_JOB_FIELDS)
     # Verify employer exists
     conn = db.get_db_connection()
     cursor = conn.cursor()
@@ -477,7 +730,7 @@ def get_employer_jobs(employer_id):
         return jsonify({'status': 'error', 'message': 'Employer not found'}), 404
     
     # Get jobs from database
-    result = db.get_employer_jobs(employer_id)
+    result = db.get_employer_jobs(employer_id, fields)
     
     if not result['success']:
         return jsonify({'status': 'error', 'message': result['error']}), 400
@@ -487,9 +740,56 @@ def get_employer_jobs(employer_id):
         'jobs': result['jobs']
     }), 200
 
+# Get applicant counts per job and in total for the employer dashboard
+@app.route('/api/employers/<int:employer_id>/stats', methods=['GET'])
+def get_employer_stats(employer_id):
+    result = db.get_employer_stats(employer_id)
+    
+    if not result['success']:
+        status = 404 if result.get('code') == 'EMPLOYER_NOT_FOUND' else 400
+        return jsonify({'status': 'error', 'message': result['error']}), status
+    
+    return jsonify({
+        'status': 'success',
+        'jobs': result['jobs'],
+        'totals': result['totals']
+    }), 200
+
+# Daily applications and postings, read from the rollup tables
+@app.route('/api/employers/<int:employer_id>/trends', methods=['GET'])
+def get_employer_trends(employer_id):
+    try:
+        # from/to are UTC days (YYYY-MM-DD), the last 30 days by default
+        today = datetime.datetime.utcnow().date()
+        last_day = datetime.datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else today
+        first_day = (datetime.datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from')
+                     else last_day - datetime.timedelta(days=29))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid date, expected YYYY-MM-DD'}), 400
+    if first_day > last_day:
+        return jsonify({'status': 'error', 'message': 'from must not be after to'}), 400
+    
+    result = db.get_employer_trends(employer_id, first_day.isoformat(), last_day.isoformat(),
+                                    request.args.get('job_id', type=int))
+    
+    if not result['success']:
+        status = 404 if result.get('code') == 'EMPLOYER_NOT_FOUND' else 400
+        return jsonify({'status': 'error', 'message': result['error']}), status
+    
+    return jsonify({
+        'status': 'success',
+        'from': first_day.isoformat(),
+        'to': last_day.isoformat(),
+        'applications': result['applications'],
+        'job_applications': result['job_applications'],
+        'postings': result['postings']
+    }), 200
+
 # Get applications received by an employer
 @app.route('/api/employers/<int:employer_id>/applications', methods=['GET'])
 def get_employer_applications(employer_id):
+    fields = requested_fields(fieldsets.EMPLOYER_APPLICATION_FIELDS)
+    since = requested_since()
     # Verify employer exists
     conn = db.get_db_connection()
     cursor = conn.cursor()
@@ -500,44 +800,124 @@ def get_employer_applications(employer_id):
     if not employer:
         return jsonify({'status': 'error', 'message': 'Employer not found'}), 404
     
-    # Get all job IDs for this employer
+    if since is not None:
+        result = db.get_employer_application_changes_json(employer_id, since, fields)
+        if not result['success']:
+            # The client starts over with since=0
+            status = 410 if result.get('code') == 'RESYNC_REQUIRED' else 400
+            return jsonify({'status': 'error', 'message': result['error']}), status
+        return json_response(serializers.envelope(applications=result['applications'], deleted=result['deleted'],
+                                                  sync_token=serializers.dumps(result['sync_token'])))
+    
+    # Get applications for all jobs (with job titles) in one query, encoded as JSON
+    result = db.get_employer_applications_json(employer_id, fields)
+    
+    if not result['success']:
+        return jsonify({'status': 'error', 'message': result['error']}), 400
+    
+    return json_response(serializers.envelope(applications=result['applications']))
+
+# Get an employee's personalized job feed
+@app.route('/api/employees/<int:employee_id>/feed', methods=['GET'])
+def get_employee_feed(employee_id):
+    # Precomputed recommendations, best match first
+    result = feed.get_feed_json(employee_id, requested_fields(fieldsets.FEED_JOB_FIELDS))
+    
+    if not result['success']:
+        status = 404 if result.get('code') == 'EMPLOYEE_NOT_FOUND' else 400
+        return jsonify({'status': 'error', 'message': result['error']}), status
+    
+    return json_response(serializers.envelope(jobs=result['jobs']))
+
+# Live application events (new applications, status changes) as Server-Sent Events
+def event_stream(user_type, user_id):
+    table = 'employees' if user_type == 'employee' else 'employers'
     conn = db.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT id FROM jobs WHERE employer_id = ?', (employer_id,))
-    job_ids = [row['id'] for row in cursor.fetchall()]
+    exists = conn.execute(f'SELECT id FROM {table} WHERE id = ?', (user_id,)).fetchone()
     conn.close()
+    if not exists:
+        return jsonify({'status': 'error', 'message': f'{user_type.capitalize()} not found'}), 404
     
-    if not job_ids:
-        return jsonify({
-            'status': 'success',
-            'applications': []
-        }), 200
+    # EventSource sends Last-Event-ID when it reconnects; ?last_event_id= for the first connection
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid Last-Event-ID'}), 400
     
-    # Get applications for all jobs
-    applications = []
-    for job_id in job_ids:
-        result = db.get_job_applications(job_id)
-        if result['success']:
-            # Add job title to each application
-            conn = db.get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute('SELECT title FROM jobs WHERE id = ?', (job_id,))
-            job = cursor.fetchone()
-            conn.close()
-            
-            job_title = job['title'] if job else 'Unknown Job'
-            for app in result['applications']:
-                app['job_title'] = job_title
-                applications.append(app)
+    return Response(events.hub.stream(user_type, user_id, last_event_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/employees/<int:employee_id>/events', methods=['GET'])
+def get_employee_events(employee_id):
+    return event_stream('employee', employee_id)
+
+@app.route('/api/employers/<int:employer_id>/events', methods=['GET'])
+def get_employer_events(employer_id):
+    return event_stream('employer', employer_id)
+
+# Get an employee's chat history, newest first: ?limit=20&before=<next_cursor of the previous page>
+@app.route('/api/employees/<int:employee_id>/chat', methods=['GET'])
+def get_employee_chat(employee_id):
+    limit = request.args.get('limit', chat_history.PAGE_SIZE, type=int)
+    if limit < 1 or limit > chat_history.MAX_PAGE_SIZE:
+        return jsonify({'status': 'error', 'message': f'limit must be between 1 and {chat_history.MAX_PAGE_SIZE}'}), 400
+    before = request.args.get('before')
+    if before is not None:
+        before = chat_history.decode_cursor(before)
+    
+    result = db.get_employee_chat_history(employee_id, before, limit)
+    
+    if not result['success']:
+        status = 404 if result.get('code') == 'EMPLOYEE_NOT_FOUND' else 400
+        return jsonify({'status': 'error', 'message': result['error']}), status
     
     return jsonify({
         'status': 'success',
-        'applications': applications
+        'chat_history': result['chat_history'],
+        'next_cursor': result['next_cursor'],
+        'summary': result['summary']
     }), 200
 
+# Ask a question in the chat: reuses the answer of a near-identical earlier question when there is one
+@app.route('/api/employees/<int:employee_id>/chat', methods=['POST'])
+def ask_chat_question(employee_id):
+    data = request.get_json(silent=True)
+    
+    if not data or not isinstance(data.get('question'), str) or not data['question'].strip():
+        return jsonify({'status': 'error', 'message': 'Question is required'}), 400
+    
+    question = data['question'].strip()
+    
+    if not chat_answers.warmed:
+        chat_answers.warm(db.get_recent_chat_answers(app.config['CHAT_CACHE_SIZE']))
+    
+    answer, _ = chat_answers.lookup(question)
+    cached = answer is not None
+    if not cached:
+        # Only genuinely new questions reach the generator
+        answer = answer_cache.generate_answer(question)
+    
+    result = db.save_chat_qa(employee_id, question, answer)
+    
+    if not result['success']:
+        status = 404 if result.get('code') == 'EMPLOYEE_NOT_FOUND' else 400
+        return jsonify({'status': 'error', 'message': result['error']}), status
+    
+    if not cached:
+        chat_answers.add(question, answer)
+    
+    return jsonify({
+        'status': 'success',
+        'chat_id': result['chat_id'],
+        'answer': answer,
+        'cached': cached
+    }), 201
+
 # Get applications submitted by an employee
 @app.route('/api/employees/<int:employee_id>/applications', methods=['GET'])
 def get_employee_applications(employee_id):
+    fields = requested_fields(fieldsets.EMPLOYEE_APPLICATION_FIELDS)
     # Verify employee exists
     conn = db.get_db_connection()
     cursor = conn.cursor()
@@ -548,41 +928,12 @@ def get_employee_applications(employee_id):
     if not employee:
         return jsonify({'status': 'error', 'message': 'Employee not found'}), 404
     
-    # Get applications from database
-    applications = db.get_employee_applications(employee_id)  # This returns a list, not a dictionary
-    
-    if not applications:  # Check if the list is empty or None
-        return jsonify({'status': 'success', 'applications': []}), 200
-    
-    # Enhance application data with job and company information
-    enhanced_applications = []
-    conn = db.get_db_connection()
-    cursor = conn.cursor()
-    
-    for app in applications:
-        # Get job title and employer info
-        cursor.execute('''
-            SELECT j.title, e.company_name
-            FROM jobs j
-            JOIN employers e ON j.employer_id = e.id
-            WHERE j.id = ?
-        ''', (app['job_id'],))
-        
-        job_info = cursor.fetchone()
-        if job_info:
-            app['job_title'] = job_info['title']
-            app['company_name'] = job_info['company_name']
-        else:
-            app['job_title'] = 'Unknown Job'
-            app['company_name'] = 'Unknown Company'
-        
-        enhanced_applications.append(app)
-    
-    conn.close()
+    # Get applications from database, already joined with the job title and company
+    applications = db.get_employee_applications(employee_id, fields)  # This returns a list, not a dictionary
     
     return jsonify({
         'status': 'success',
-        'applications': enhanced_applications
+        'applications': applications or []
     }), 200
 
 @app.route('/api/applications/<int:application_id>/status', methods=['PUT'])
@@ -622,33 +973,39 @@ def update_application_status_route(application_id):
     if not result['success']:
         return jsonify({'status': 'error', 'message': result['error']}), 400
     
+    events.hub.publish(result['events'])
+    
     return jsonify({
         'status': 'success',
         'message': result['message']
     }), 200
 
+# Tables of an application lookup, archive.TABLES holds their archived counterparts
+HOT_APPLICATION_TABLES = {name: name for name in archive.TABLES}
+
 @app.route('/api/applications/<int:application_id>', methods=['GET'])
 def get_application_details(application_id):
+    fields = requested_fields(fieldsets.APPLICATION_DETAIL_FIELDS)
     # Get application from database
     conn = db.get_db_connection()
     cursor = conn.cursor()
     
     try:
-        # Get application with employee and job information
-        cursor.execute('''
-            SELECT a.*, e.name, e.email, e.education, e.skills, e.experience,
-                   j.title as job_title, j.description as job_description,
-                   emp.company_name
-            FROM applications a
-            JOIN employees e ON a.employee_id = e.id
-            JOIN jobs j ON a.job_id = j.id
-            JOIN employers emp ON j.employer_id = emp.id
-            WHERE a.id = ?
-        ''', (application_id,))
-        
-        application = cursor.fetchone()
-        
-        if not application:
+        # Get application with employee and job information, from the archive once its job was archived
+        for tables in (HOT_APPLICATION_TABLES, archive.TABLES):
+            cursor.execute(f'''
+                SELECT {fieldsets.projection(fieldsets.APPLICATION_DETAIL_FIELDS, fields, ('id', 'job_id'))}
+                FROM {tables['applications']} a
+                JOIN employees e ON a.employee_id = e.id
+                JOIN {tables['jobs']} j ON a.job_id = j.id
+                JOIN employers emp ON j.employer_id = emp.id
+                WHERE a.id = ?
+            ''', (application_id,))
+            
+            application = cursor.fetchone()
+            if application:
+                break
+        else:
             return jsonify({
                 'status': 'error', 
                 'message': 'Application not found'
@@ -657,6 +1014,12 @@ def get_application_details(application_id):
         # Convert to dictionary
         app_dict = dict(application)
         
+        # The large texts come from the side tables, only when asked for
+        if fieldsets.wants(fields, 'cover_letter'):
+            app_dict['cover_letter'] = texts.load(cursor, tables['application_texts'], application_id)
+        if fieldsets.wants(fields, 'job_description'):
+            app_dict['job_description'] = texts.load(cursor, tables['job_texts'], app_dict['job_id'])
+        
         # Parse skills JSON if present
         if app_dict.get('skills'):
             try:
@@ -666,7 +1029,7 @@ def get_application_details(application_id):
         
         return jsonify({
             'status': 'success',
-            'application': app_dict
+            'application': fieldsets.pick(app_dict, fields)
         }), 200
         
     except Exception as e:
@@ -680,13 +1043,15 @@ def get_application_details(application_id):
 
 @app.route('/api/employers/<int:employer_id>', methods=['GET'])
 def get_employer_details(employer_id):
+    fields = requested_fields(fieldsets.EMPLOYER_FIELDS)
     # Get employer from database
     conn = db.get_db_connection()
     cursor = conn.cursor()
     
     try:
         # Get employer details
-        cursor.execute('SELECT id, name, email, company_name FROM employers WHERE id = ?', (employer_id,))
+        cursor.execute(f'SELECT {fieldsets.projection(fieldsets.EMPLOYER_FIELDS, fields)} FROM employers WHERE id = ?',
+                       (employer_id,))
         employer = cursor.fetchone()
         
         if not employer:
@@ -727,6 +1092,9 @@ def delete_job_route(job_id):
             return jsonify({'status': 'error', 'message': result['error']}), 404
         return jsonify({'status': 'error', 'message': result['error']}), 400
     
+    if app.config['JOB_CATALOGUE']:
+        job_catalogue.catalogue.job_deleted(job_id)
+    
     return jsonify({
         'status': 'success',
         'message': result['message'],
@@ -736,15 +1104,15 @@ def delete_job_route(job_id):
 @app.route('/api/employees/<int:employee_id>', methods=['GET'])
 def get_employee_details(employee_id):
     """Get employee profile details"""
+    fields = requested_fields(fieldsets.EMPLOYEE_FIELDS)
     # Get employee from database
     conn = db.get_db_connection()
     cursor = conn.cursor()
     
     try:
         # Get employee details
-        cursor.execute('''
-            SELECT id, name, email, dob, education, skills, experience, 
-                   latitude, longitude, created_at
+        cursor.execute(f'''
+            SELECT {fieldsets.projection(fieldsets.EMPLOYEE_FIELDS, fields)}
             FROM employees 
             WHERE id = ?
         ''', (employee_id,))
@@ -762,7 +1130,7 @@ def get_employee_details(employee_id):
                 employee_dict['skills'] = json.loads(employee_dict['skills'])
             except:
                 employee_dict['skills'] = []
-        else:
+        elif 'skills' in employee_dict:
             employee_dict['skills'] = []
         
         return jsonify({
@@ -804,6 +1172,17 @@ def update_employee_profile(employee_id):
                 update_fields.append(f"{field} = ?")
                 update_values.append(data[field])
         
+        # Keep location_id in step with the coordinates
+        if 'latitude' in data or 'longitude' in data:
+            cursor.execute('SELECT latitude, longitude FROM employees WHERE id = ?', (employee_id,))
+            current = cursor.fetchone()
+            if current:
+                update_fields.append("location_id = ?")
+                update_values.append(locations.resolve_location_id(
+                    data.get('latitude', current['latitude']),
+                    data.get('longitude', current['longitude'])
+                ))
+        
         # Handle skills separately as it needs to be JSON
         if 'skills' in data and isinstance(data['skills'], list):
             update_fields.append("skills = ?")
@@ -822,6 +1201,8 @@ def update_employee_profile(employee_id):
         )
         
         conn.commit()
+        employee_locations.index.invalidate()
+        feed.worker.employee_changed(employee_id)
         
         return jsonify({
             'status': 'success', 
@@ -1021,7 +1402,7 @@ def register_employer_route():
 
 # Run the application
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    create_app().run(debug=True, port=5000)
 
 def update_application_status(application_id, new_status):
     """Update the status of a job application"""
@@ -1080,8 +1461,8 @@ def get_employee_applications(employee_id):
             return []
         
         # Join with jobs table to get job title and time_slot
-        cursor.execute('''
-            SELECT a.*, j.title AS job_title, j.time_slot, e.company_name 
+        cursor.execute(f'''
+            SELECT {db.APPLICATION_LISTING_COLUMNS}, j.title AS job_title, j.time_slot, e.company_name 
             FROM applications a
             JOIN jobs j ON a.job_id = j.id
             JOIN employers e ON j.employer_id = e.id
@@ -0,0 +1,128 @@
+"""
+Cold archive for closed jobs and their applications.
+
+Closed jobs and their finalized applications are never listed again but
+stayed in the hot tables forever, making every status = 'open' scan and
+applications join pay for them. The archive job moves jobs closed for more
+than ARCHIVE_AFTER_DAYS days (by closed_at, set by triggers when a job stops
+being open, migration 17), with their applications and texts, into archive
+tables of the same shape (migration 14):
+
+    jobs               -> archived_jobs
+    applications       -> archived_applications
+    job_texts          -> archived_job_texts
+    application_texts  -> archived_application_texts
+
+Each batch of BATCH_SIZE jobs is moved in its own short write transaction, so
+the app's writers only ever wait for one batch. The ids of the batch are held
+in archive_batch while it runs, which tells the daily rollup triggers that
+the rows are being archived, not deleted: trends keep counting them. Delta
+sync reports the moved rows as deleted, like any other removal.
+
+Listings only read the hot tables. Lookups by id (job details, application
+details) fall back to the archive tables when the row is not hot anymore.
+Run it from cron, e.g. nightly:
+
+    python archive.py [--days 90] [--batch-size 500]
+"""
+import argparse
+import time
+
+ARCHIVE_AFTER_DAYS = 90
+BATCH_SIZE = 500
+# Seconds between batches, lets waiting writers in
+BATCH_PAUSE = 0.05
+
+# Hot table -> archive table, for lookups that fall back to the archive
+TABLES = {
+    'jobs': 'archived_jobs',
+    'applications': 'archived_applications',
+    'job_texts': 'archived_job_texts',
+    'application_texts': 'archived_application_texts',
+}
+
+# Columns copied to the archive, the same names as in the hot tables
+JOB_COLUMNS = (
+    'id', 'employer_id', 'title', 'summary', 'salary', 'job_type', 'time_slot',
+    'latitude', 'longitude', 'status', 'created_at', 'updated_at', 'location_id',
+    'slot_days', 'slot_start', 'slot_end', 'salary_min', 'salary_max', 'salary_period',
+    'application_count', 'waiting_count', 'accepted_count', 'rejected_count', 'closed_at',
+)
+APPLICATION_COLUMNS = ('id', 'job_id', 'employee_id', 'status', 'applied_at', 'updated_at')
+
+# Served by the partial index idx_jobs_closed
+ARCHIVABLE_JOBS_SQL = '''
+    SELECT id FROM jobs
+    WHERE status != 'open' AND closed_at < datetime('now', ?)
+    ORDER BY closed_at
+    LIMIT ?
+'''
+
+def copy_sql(table, columns, key):
+    """Copy the rows of the current batch from a hot table to its archive table"""
+    names = ', '.join(columns)
+    return f'''
+        INSERT OR REPLACE INTO {TABLES[table]} ({names})
+        SELECT {names} FROM {table} WHERE {key} IN (SELECT job_id FROM archive_batch)
+    '''
+
+BATCH_STATEMENTS = [
+    copy_sql('jobs', JOB_COLUMNS, 'id'),
+    copy_sql('applications', APPLICATION_COLUMNS, 'job_id'),
+    '''
+    INSERT OR REPLACE INTO archived_job_texts (job_id, description, compressed)
+    SELECT job_id, description, compressed FROM job_texts WHERE job_id IN (SELECT job_id FROM archive_batch)
+    ''',
+    '''
+    INSERT OR REPLACE INTO archived_application_texts (application_id, cover_letter, compressed)
+    SELECT t.application_id, t.cover_letter, t.compressed
+    FROM applications a
+    JOIN application_texts t ON t.application_id = a.id
+    WHERE a.job_id IN (SELECT job_id FROM archive_batch)
+    ''',
+    # The delete triggers clean up the hot side tables, counters and slot intervals
+    'DELETE FROM applications WHERE job_id IN (SELECT job_id FROM archive_batch)',
+    'DELETE FROM jobs WHERE id IN (SELECT job_id FROM archive_batch)',
+    'DELETE FROM archive_batch',
+]
+
+def archive_batch(conn, days=ARCHIVE_AFTER_DAYS, batch_size=BATCH_SIZE):
+    """Move one batch of archivable jobs in one transaction, returns the number of jobs moved"""
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        job_ids = [row[0] for row in cursor.execute(ARCHIVABLE_JOBS_SQL, (f'-{int(days)} days', batch_size))]
+        if job_ids:
+            cursor.executemany('INSERT INTO archive_batch (job_id) VALUES (?)', [(job_id,) for job_id in job_ids])
+            for statement in BATCH_STATEMENTS:
+                cursor.execute(statement)
+        cursor.execute('COMMIT')
+    except Exception:
+        cursor.execute('ROLLBACK')
+        raise
+    return len(job_ids)
+
+def archive_closed_jobs(conn, days=ARCHIVE_AFTER_DAYS, batch_size=BATCH_SIZE, pause=BATCH_PAUSE):
+    """Archive all jobs closed for more than `days` days, returns the number of jobs moved"""
+    total = 0
+    while True:
+        moved = archive_batch(conn, days, batch_size)
+        total += moved
+        if moved < batch_size:
+            return total
+        print(f"Archived {total} jobs so far")
+        time.sleep(pause)
+
+if __name__ == "__main__":
+    import database as db
+
+    parser = argparse.ArgumentParser(description="Move long-closed jobs and their applications to the archive tables")
+    parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS, help="Archive jobs closed for more than this many days")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Jobs moved per transaction")
+    args = parser.parse_args()
+
+    conn = db.get_db_connection()
+    try:
+        print(f"Archived {archive_closed_jobs(conn, args.days, args.batch_size)} jobs")
+    finally:
+        conn.close()
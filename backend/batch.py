@@ -0,0 +1,139 @@
+"""
+Batched GET requests for page loads: POST /api/batch
+
+A dashboard needs several resources at once. Instead of one HTTP request,
+and one SQLite connection, per widget it can send
+
+    {"requests": ["/api/employees/3/applications",
+                  {"id": "jobs", "path": "/api/jobs?fields=id,title"}],
+     "parallel": false}
+
+and gets the sub-responses in request order:
+
+    {"status": "success",
+     "responses": [{"path": "...", "status": 200, "body": {...}}, ...]}
+
+Sub-requests are dispatched straight to the app's view functions inside one
+database.connection_scope(), so they reuse the connections of the batch
+instead of opening their own. With "parallel": true they run on a small
+thread pool, each pool thread with its own connection of the scope. Only GET
+requests under /api/ are allowed. Sub-response bodies are embedded as the
+JSON bytes the views produced, without decoding them again.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
+
+import database as db
+import serializers
+
+MAX_BATCH_SIZE = 20
+BATCH_WORKERS = int(os.environ.get('JOBAPP_BATCH_WORKERS', 4))
+
+# Headers a sub-request inherits from the batch request
+FORWARDED_HEADERS = ('Authorization', 'Cookie')
+
+API_PREFIX = '/api/'
+BATCH_PATH = '/api/batch'
+
+class InvalidBatch(ValueError):
+    """A batch body that cannot be run"""
+
+def parse_batch(data):
+    """Batch body -> ([(id or None, path)], parallel), raises InvalidBatch"""
+    if not isinstance(data, dict) or not isinstance(data.get('requests'), list):
+        raise InvalidBatch('Expected {"requests": [...]}')
+    requests = data['requests']
+    if not requests:
+        raise InvalidBatch('requests must not be empty')
+    if len(requests) > MAX_BATCH_SIZE:
+        raise InvalidBatch(f'At most {MAX_BATCH_SIZE} requests per batch')
+
+    items = []
+    for entry in requests:
+        request_id = None
+        if isinstance(entry, dict):
+            if entry.get('method', 'GET').upper() != 'GET':
+                raise InvalidBatch('Only GET requests can be batched')
+            request_id = entry.get('id')
+            entry = entry.get('path')
+        if not isinstance(entry, str) or not entry.startswith(API_PREFIX):
+            raise InvalidBatch(f'Request paths must start with {API_PREFIX}')
+        if entry.split('?', 1)[0].rstrip('/') == BATCH_PATH:
+            raise InvalidBatch('Batches cannot be nested')
+        items.append((request_id, entry))
+    return items, bool(data.get('parallel'))
+
+def error_body(message):
+    return serializers.dumps({'status': 'error', 'message': message})
+
+def dispatch(app, path, headers):
+    """Run one GET sub-request through the app's view functions -> (status code, JSON bytes)"""
+    builder = EnvironBuilder(path=path, method='GET', headers=headers)
+    try:
+        environ = builder.get_environ()
+    finally:
+        builder.close()
+
+    with app.request_context(environ):
+        try:
+            response = app.make_response(app.dispatch_request())
+        except HTTPException as e:
+            # Unknown paths, wrong methods
+            return e.code, error_body(e.description)
+        except Exception as e:
+            try:
+                # Errors the app has handlers for, e.g. invalid ?fields=
+                response = app.make_response(app.handle_user_exception(e))
+            except Exception as e:
+                print(f"Error in batched request {path}: {e}")
+                return 500, error_body(str(e))
+
+        if response.is_streamed:
+            # Event streams never end
+            response.close()
+            return 400, error_body('Streaming endpoints cannot be batched')
+        body = response.get_data()
+        if response.mimetype != 'application/json':
+            body = serializers.dumps(body.decode('utf-8', 'replace'))
+        return response.status_code, body.rstrip()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='batch')
+        return _executor
+
+def run_batch(app, items, parallel=False, headers=None):
+    """Run the sub-requests on shared connections, returns the response body (bytes)"""
+    headers = headers or {}
+
+    with db.connection_scope() as scope:
+        def run(item):
+            # Pool threads do not inherit the caller's context, hand them the scope
+            with db.connection_scope(scope):
+                try:
+                    return dispatch(app, item[1], headers)
+                finally:
+                    scope.release()
+
+        if parallel and len(items) > 1:
+            results = list(executor().map(run, items))
+        else:
+            results = [run(item) for item in items]
+
+    parts = []
+    for (request_id, path), (status, body) in zip(items, results):
+        part = b'{'
+        if request_id is not None:
+            part += b'"id":' + serializers.dumps(request_id) + b','
+        part += b'"path":' + serializers.dumps(path) + b',"status":' + str(status).encode() + b',"body":' + body + b'}'
+        parts.append(part)
+    return b'{"status":"success","responses":[' + b','.join(parts) + b']}'
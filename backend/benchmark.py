@@ -0,0 +1,279 @@
+"""
+Benchmark suite for the API hot paths.
+
+Seeds databases of several sizes (see seed.py), drives the endpoints through
+the Flask test client and records throughput and p50/p95/p99 latency. Results
+are written as JSON so runs can be compared across commits, and the run fails
+when a tracked endpoint regresses by more than the allowed percentage.
+
+Usage:
+    python benchmark.py --sizes small,medium --output bench.json
+    python benchmark.py --sizes small --baseline bench.json --max-regression 15
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import seed
+
+# Database sizes passed to seed.seed_database
+SIZES = {
+    'small': {'employers': 20, 'employees': 500, 'jobs': 200, 'applications': 2000, 'chats': 500},
+    'medium': {'employers': 100, 'employees': 10000, 'jobs': 2000, 'applications': 50000, 'chats': 10000},
+    'large': {'employers': 500, 'employees': 100000, 'jobs': 20000, 'applications': 1000000, 'chats': 100000},
+}
+
+ENDPOINTS = [
+    'login',
+    'jobs',
+    'jobs_nearby',
+    'employees_nearby',
+    'apply',
+    'status_update',
+    'employer_applications',
+    'employee_applications',
+]
+
+# A point between the business districts, with a radius covering most of them
+NEARBY_QUERY = 'lat=40.7549&lng=-73.9840&radius=5'
+
+def percentile(sorted_values, pct):
+    """Linear-interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * pct / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    fraction = position - lower
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * fraction
+
+def summarize(latencies_ms, elapsed_seconds, errors):
+    latencies = sorted(latencies_ms)
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': errors,
+        'throughput_rps': round(count / elapsed_seconds, 2) if elapsed_seconds else 0.0,
+        'mean_ms': round(sum(latencies) / count, 3) if count else 0.0,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+    }
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def seeded_database(size, workdir, rng_seed):
+    """Return the path of a seeded template database, reusing it when present"""
+    path = os.path.join(workdir, f"bench_{size}_{rng_seed}.db")
+    if not os.path.exists(path):
+        print(f"Seeding {size} database at {path}")
+        seed.seed_database(path, seed=rng_seed, force=True, **SIZES[size])
+    return path
+
+def load_app(db_path):
+    """Import the Flask app pointed at the benchmark database"""
+    os.environ['JOBAPP_DB_PATH'] = db_path
+    with contextlib.redirect_stdout(io.StringIO()):
+        import database as db
+        db.DATABASE_PATH = db_path
+        import app as app_module
+        return app_module.create_app()
+
+def build_requests(db_path, iterations, rng):
+    """Build the request arguments for every endpoint from the seeded data"""
+    conn = sqlite3.connect(db_path)
+    try:
+        employees = conn.execute('SELECT id, email FROM employees ORDER BY id LIMIT 1000').fetchall()
+        open_jobs = [row[0] for row in conn.execute("SELECT id FROM jobs WHERE status = 'open' ORDER BY id")]
+        waiting = [row[0] for row in conn.execute(
+            "SELECT id FROM applications WHERE status = 'waiting' ORDER BY id LIMIT ?", (iterations,))]
+        # The busiest employer and employee are the worst case for the listings
+        employer_id = conn.execute(
+            'SELECT employer_id FROM jobs GROUP BY employer_id ORDER BY COUNT(*) DESC LIMIT 1').fetchone()[0]
+        employee_id = conn.execute(
+            'SELECT employee_id FROM applications GROUP BY employee_id ORDER BY COUNT(*) DESC LIMIT 1').fetchone()[0]
+
+        # Fresh (job, employee) pairs so every apply call inserts a row
+        candidates = open_jobs[-iterations:]
+        applied = set(conn.execute(
+            'SELECT job_id, employee_id FROM applications WHERE job_id IN (%s)' % ','.join('?' * len(candidates)),
+            candidates
+        )) if candidates else set()
+    finally:
+        conn.close()
+
+    apply_pairs = []
+    while len(apply_pairs) < iterations and candidates:
+        pair = (rng.choice(candidates), rng.choice(employees)[0])
+        if pair not in applied:
+            applied.add(pair)
+            apply_pairs.append(pair)
+
+    def login(i):
+        return 'POST', '/api/login', {'email': employees[i % len(employees)][1],
+                                      'password': 'password123', 'userType': 'employee'}, 200
+
+    def apply(i):
+        job_id, applicant_id = apply_pairs[i % len(apply_pairs)]
+        return 'POST', f'/api/jobs/{job_id}/apply', {'employee_id': applicant_id, 'cover_letter': 'Benchmark'}, 201
+
+    def status_update(i):
+        # waiting -> waiting keeps the application updatable on every iteration
+        return 'PUT', f'/api/applications/{waiting[i % len(waiting)]}/status', {'status': 'waiting'}, 200
+
+    return {
+        'login': login,
+        'jobs': lambda i: ('GET', '/api/jobs', None, 200),
+        'jobs_nearby': lambda i: ('GET', f'/api/jobs/nearby?{NEARBY_QUERY}', None, 200),
+        'employees_nearby': lambda i: ('GET', f'/api/employees/nearby?{NEARBY_QUERY}', None, 200),
+        'apply': apply,
+        'status_update': status_update,
+        'employer_applications': lambda i: ('GET', f'/api/employers/{employer_id}/applications', None, 200),
+        'employee_applications': lambda i: ('GET', f'/api/employees/{employee_id}/applications', None, 200),
+    }
+
+def run_endpoint(client, make_request, iterations, warmup):
+    latencies = []
+    errors = 0
+    # Silence the debug prints in the request handlers while timing
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(warmup):
+            method, path, body, _ = make_request(i)
+            client.open(path, method=method, json=body)
+
+        started = time.perf_counter()
+        for i in range(warmup, warmup + iterations):
+            method, path, body, expected_status = make_request(i)
+            request_started = time.perf_counter()
+            response = client.open(path, method=method, json=body)
+            response.get_data()
+            latencies.append((time.perf_counter() - request_started) * 1000)
+            if response.status_code != expected_status:
+                errors += 1
+        elapsed = time.perf_counter() - started
+
+    return summarize(latencies, elapsed, errors)
+
+def run_benchmarks(sizes, endpoints, iterations, warmup, workdir, rng_seed):
+    results = {}
+    for size in sizes:
+        template = seeded_database(size, workdir, rng_seed)
+        # Benchmark on a copy so writes from apply/status_update never leak into the next run
+        run_path = os.path.join(workdir, f"bench_{size}_run.db")
+        shutil.copyfile(template, run_path)
+
+        app = load_app(run_path)
+        import database as db
+        db.DATABASE_PATH = run_path
+        client = app.test_client()
+
+        requests = build_requests(run_path, iterations + warmup, random.Random(rng_seed))
+        results[size] = {}
+        for endpoint in endpoints:
+            stats = run_endpoint(client, requests[endpoint], iterations, warmup)
+            results[size][endpoint] = stats
+            print(f"{size:>7} {endpoint:<22} {stats['throughput_rps']:>9.1f} req/s  "
+                  f"p50 {stats['p50_ms']:>8.2f} ms  p95 {stats['p95_ms']:>8.2f} ms  "
+                  f"p99 {stats['p99_ms']:>8.2f} ms  errors {stats['errors']}")
+    return results
+
+def compare(results, baseline, metric, max_regression, tracked):
+    """Return a list of regressions larger than max_regression percent"""
+    regressions = []
+    for size, endpoints in results.items():
+        for endpoint, stats in endpoints.items():
+            if tracked and endpoint not in tracked:
+                continue
+            previous = baseline.get('results', {}).get(size, {}).get(endpoint)
+            if not previous or not previous.get(metric):
+                continue
+            change = (stats[metric] - previous[metric]) / previous[metric] * 100
+            if change > max_regression:
+                regressions.append({
+                    'size': size,
+                    'endpoint': endpoint,
+                    'metric': metric,
+                    'baseline': previous[metric],
+                    'current': stats[metric],
+                    'change_pct': round(change, 1),
+                })
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the job app API hot paths")
+    parser.add_argument('--sizes', default='small,medium', help=f"Comma separated sizes: {', '.join(SIZES)}")
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help="Comma separated endpoints to run")
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workdir', default=None, help="Directory for seeded databases (reused between runs)")
+    parser.add_argument('--output', default=None, help="Write results to this JSON file")
+    parser.add_argument('--baseline', default=None, help="JSON results of a previous run to compare against")
+    parser.add_argument('--metric', default='p50_ms', choices=['mean_ms', 'p50_ms', 'p95_ms', 'p99_ms'])
+    parser.add_argument('--max-regression', type=float, default=20.0, help="Allowed slowdown in percent")
+    parser.add_argument('--track', default='', help="Comma separated endpoints checked for regressions (default all)")
+    args = parser.parse_args()
+
+    sizes = [size for size in args.sizes.split(',') if size]
+    endpoints = [endpoint for endpoint in args.endpoints.split(',') if endpoint]
+    for name in sizes:
+        if name not in SIZES:
+            parser.error(f"Unknown size: {name}")
+    for name in endpoints:
+        if name not in ENDPOINTS:
+            parser.error(f"Unknown endpoint: {name}")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='jobapp-bench-')
+    os.makedirs(workdir, exist_ok=True)
+
+    results = run_benchmarks(sizes, endpoints, args.iterations, args.warmup, workdir, args.seed)
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'iterations': args.iterations,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        tracked = {endpoint for endpoint in args.track.split(',') if endpoint}
+        regressions = compare(results, baseline, args.metric, args.max_regression, tracked)
+        if regressions:
+            print(f"{len(regressions)} endpoint(s) regressed by more than {args.max_regression}%:")
+            for item in regressions:
+                print(f"  {item['size']} {item['endpoint']}: {item['metric']} "
+                      f"{item['baseline']} -> {item['current']} (+{item['change_pct']}%)")
+            sys.exit(1)
+        print("No regressions against baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Paginated chat history and the retention compactor.
+
+    GET /api/employees/<id>/chat?limit=20&before=<cursor>
+
+Pages are newest first and read the (employee_id, created_at, id) index
+(migration 15). next_cursor is the position of the last row of a page; sent
+back as before= it continues strictly after it, so rows added meanwhile never
+shift the following pages.
+
+Exchanges older than RETENTION_DAYS are folded into one chat_summaries row
+per employee: how many there were, their time span and the latest
+SUMMARY_QUESTIONS questions. The compactor does that in batches of
+BATCH_SIZE rows, one transaction each, keeping both the chat table and the
+history responses bounded. It runs in a daemon thread of every worker
+(JOBAPP_CHAT_COMPACT_INTERVAL seconds, 0 turns it off) or from cron:
+
+    python chat_history.py [--days 30]
+"""
+import argparse
+import base64
+import binascii
+import json
+import threading
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+RETENTION_DAYS = 30
+BATCH_SIZE = 1000
+# Latest compacted questions kept in a summary, each cut to SUMMARY_QUESTION_LENGTH
+SUMMARY_QUESTIONS = 20
+SUMMARY_QUESTION_LENGTH = 200
+
+class InvalidCursor(ValueError):
+    """A before= value this server did not hand out"""
+
+def encode_cursor(created_at, chat_id):
+    """(created_at, id) of a row -> opaque cursor"""
+    raw = json.dumps([created_at, chat_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(text):
+    """Cursor -> (created_at, id), raises InvalidCursor"""
+    try:
+        created_at, chat_id = json.loads(base64.urlsafe_b64decode(text + '=' * (-len(text) % 4)))
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidCursor('Invalid chat cursor')
+    if not isinstance(created_at, str) or not isinstance(chat_id, int):
+        raise InvalidCursor('Invalid chat cursor')
+    return created_at, chat_id
+
+OLD_EXCHANGES_SQL = '''
+    SELECT id, employee_id, question, created_at FROM chat
+    WHERE created_at < datetime('now', ?)
+    ORDER BY id
+    LIMIT ?
+'''
+
+def merge_summary(summary, exchanges):
+    """Fold exchanges (id, employee_id, question, created_at) into a summary dict (None when new)"""
+    exchanges = sorted(exchanges, key=lambda row: (row[3], row[0]))
+    summary = summary or {"exchanges": 0, "first_at": None, "last_at": None, "recent_questions": []}
+    first_at, last_at = exchanges[0][3], exchanges[-1][3]
+    questions = summary["recent_questions"] + [row[2][:SUMMARY_QUESTION_LENGTH] for row in exchanges]
+    return {
+        "exchanges": summary["exchanges"] + len(exchanges),
+        "first_at": min(filter(None, (summary["first_at"], first_at))),
+        "last_at": max(filter(None, (summary["last_at"], last_at))),
+        "recent_questions": questions[-SUMMARY_QUESTIONS:],
+    }
+
+def compact_batch(conn, days=RETENTION_DAYS, batch_size=BATCH_SIZE):
+    """Fold one batch of old exchanges into the summaries, returns the number of rows removed"""
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        rows = cursor.execute(OLD_EXCHANGES_SQL, (f'-{int(days)} days', batch_size)).fetchall()
+        by_employee = {}
+        for row in rows:
+            by_employee.setdefault(row[1], []).append(row)
+
+        for employee_id, exchanges in by_employee.items():
+            stored = cursor.execute('''
+                SELECT exchanges, first_at, last_at, recent_questions FROM chat_summaries WHERE employee_id = ?
+            ''', (employee_id,)).fetchone()
+            summary = merge_summary({
+                "exchanges": stored[0], "first_at": stored[1], "last_at": stored[2],
+                "recent_questions": json.loads(stored[3]),
+            } if stored else None, exchanges)
+            cursor.execute('''
+                INSERT OR REPLACE INTO chat_summaries
+                    (employee_id, exchanges, first_at, last_at, recent_questions, compacted_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ''', (employee_id, summary["exchanges"], summary["first_at"], summary["last_at"],
+                  json.dumps(summary["recent_questions"])))
+
+        if rows:
+            cursor.execute('DELETE FROM chat WHERE id IN (SELECT value FROM json_each(?))',
+                           (json.dumps([row[0] for row in rows]),))
+        cursor.execute('COMMIT')
+    except Exception:
+        cursor.execute('ROLLBACK')
+        raise
+    return len(rows)
+
+def compact(conn, days=RETENTION_DAYS, batch_size=BATCH_SIZE):
+    """Fold all exchanges older than `days` days, returns the number of rows removed"""
+    total = 0
+    while True:
+        removed = compact_batch(conn, days, batch_size)
+        total += removed
+        if removed < batch_size:
+            return total
+
+class Compactor:
+    """Daemon thread compacting every `interval` seconds on connections from `connect`"""
+
+    def __init__(self, connect, interval, days=RETENTION_DAYS):
+        self.connect = connect
+        self.interval = interval
+        self.days = days
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None and self.interval > 0:
+            self.thread = threading.Thread(target=self.run, name='chat-compactor', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            conn = self.connect()
+            try:
+                removed = compact(conn, self.days)
+                if removed:
+                    print(f"Compacted {removed} chat exchanges")
+            except Exception as e:
+                print(f"Error compacting chat history: {e}")
+            finally:
+                conn.close()
+
+if __name__ == "__main__":
+    import database as db
+
+    parser = argparse.ArgumentParser(description="Fold old chat exchanges into per-employee summaries")
+    parser.add_argument('--days', type=int, default=RETENTION_DAYS, help="Keep exchanges of this many days")
+    args = parser.parse_args()
+
+    conn = db.get_db_connection()
+    try:
+        print(f"Compacted {compact(conn, args.days)} chat exchanges")
+    finally:
+        conn.close()
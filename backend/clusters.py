@@ -0,0 +1,182 @@
+"""
+Map clusters of open jobs for NearbyJobsMap.
+
+Jobs are aggregated in a hierarchical grid over Web Mercator: at zoom z
+the world is 2^z tiles wide and every tile is split into CELLS_PER_TILE x
+CELLS_PER_TILE cells (about 64 px on screen). Each cell keeps a count,
+the coordinate sums for the centroid and a few sample job ids (the newest).
+
+A bbox query at zoom z returns the non-empty cells of that level inside the
+box, so the payload grows with the viewport, not with the number of jobs.
+The grid is kept in step with the job catalogue's add/remove notifications.
+"""
+import math
+
+import job_catalogue
+
+MIN_ZOOM = 0
+MAX_ZOOM = 16
+CELLS_PER_TILE = 4
+SAMPLE_SIZE = 3
+
+# Web Mercator is undefined at the poles
+MAX_LATITUDE = 85.05112878
+
+def project(latitude, longitude):
+    """Latitude/longitude -> Web Mercator x, y in [0, 1)"""
+    latitude = max(-MAX_LATITUDE, min(MAX_LATITUDE, latitude))
+    x = (longitude + 180.0) / 360.0
+    sin_lat = math.sin(math.radians(latitude))
+    y = 0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return min(max(x, 0.0), 1 - 1e-12), min(max(y, 0.0), 1 - 1e-12)
+
+def cells_per_axis(zoom):
+    return (1 << zoom) * CELLS_PER_TILE
+
+class Cell:
+    __slots__ = ('count', 'sum_lat', 'sum_lng', 'samples', 'members')
+
+    def __init__(self, finest):
+        self.count = 0
+        self.sum_lat = 0.0
+        self.sum_lng = 0.0
+        self.samples = []  # newest job ids first
+        # Only cells of the finest level know all their jobs, coarser levels
+        # refill their samples from their children
+        self.members = set() if finest else None
+
+    def add_sample(self, job_id):
+        samples = self.samples
+        if len(samples) < SAMPLE_SIZE or job_id > samples[-1]:
+            samples.append(job_id)
+            samples.sort(reverse=True)
+            del samples[SAMPLE_SIZE:]
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'latitude': round(self.sum_lat / self.count, 6),
+            'longitude': round(self.sum_lng / self.count, 6),
+            'sample_ids': list(self.samples),
+        }
+
+class ClusterGrid:
+    def __init__(self, catalogue):
+        self.catalogue = catalogue
+        self.levels = None  # [{(x, y): Cell}] per zoom, None until built or after a reload
+        self.job_points = {}  # job id -> (latitude, longitude, finest x, finest y)
+        catalogue.subscribe(self.job_changed)
+
+    def job_changed(self, event, job_id):
+        # Called by the catalogue with its lock held
+        if self.levels is None:
+            return
+        if event == 'add':
+            self.add_position(self.catalogue.positions[job_id])
+        elif event == 'remove':
+            self.remove(job_id)
+        else:
+            self.levels = None
+
+    def build(self):
+        self.levels = [{} for _ in range(MAX_ZOOM + 1)]
+        self.job_points = {}
+        for position in range(len(self.catalogue)):
+            self.add_position(position)
+
+    def add_position(self, position):
+        latitude = self.catalogue.latitude[position]
+        longitude = self.catalogue.longitude[position]
+        # Jobs without a location (NaN) are not on the map
+        if math.isnan(latitude) or math.isnan(longitude) or not latitude or not longitude:
+            return
+        job_id = self.catalogue.ids[position]
+        x, y = project(latitude, longitude)
+        finest = cells_per_axis(MAX_ZOOM)
+        cell_x, cell_y = int(x * finest), int(y * finest)
+        self.job_points[job_id] = (latitude, longitude, cell_x, cell_y)
+
+        for zoom in range(MAX_ZOOM, MIN_ZOOM - 1, -1):
+            shift = MAX_ZOOM - zoom
+            key = (cell_x >> shift, cell_y >> shift)
+            cell = self.levels[zoom].get(key)
+            if cell is None:
+                cell = self.levels[zoom][key] = Cell(zoom == MAX_ZOOM)
+            cell.count += 1
+            cell.sum_lat += latitude
+            cell.sum_lng += longitude
+            if cell.members is not None:
+                cell.members.add(job_id)
+            cell.add_sample(job_id)
+
+    def remove(self, job_id):
+        point = self.job_points.pop(job_id, None)
+        if point is None:
+            return
+        latitude, longitude, cell_x, cell_y = point
+
+        # Finest level first, so coarser cells can refill samples from their children
+        for zoom in range(MAX_ZOOM, MIN_ZOOM - 1, -1):
+            shift = MAX_ZOOM - zoom
+            key = (cell_x >> shift, cell_y >> shift)
+            level = self.levels[zoom]
+            cell = level[key]
+            cell.count -= 1
+            if cell.count == 0:
+                del level[key]
+                continue
+            cell.sum_lat -= latitude
+            cell.sum_lng -= longitude
+            if cell.members is not None:
+                cell.members.discard(job_id)
+            if job_id in cell.samples:
+                cell.samples = self.refill_samples(zoom, key, cell)
+
+    def refill_samples(self, zoom, key, cell):
+        if cell.members is not None:
+            candidates = cell.members
+        else:
+            children = self.levels[zoom + 1]
+            x, y = key
+            candidates = set()
+            for child_key in ((2 * x, 2 * y), (2 * x + 1, 2 * y), (2 * x, 2 * y + 1), (2 * x + 1, 2 * y + 1)):
+                child = children.get(child_key)
+                if child is not None:
+                    candidates.update(child.samples)
+        return sorted(candidates, reverse=True)[:SAMPLE_SIZE]
+
+    def clusters(self, west, south, east, north, zoom):
+        """Non-empty cells of the zoom level intersecting the bounding box"""
+        catalogue = self.catalogue
+        catalogue.refresh()
+        zoom = max(MIN_ZOOM, min(MAX_ZOOM, int(zoom)))
+        with catalogue.lock:
+            if self.levels is None:
+                self.build()
+
+            size = cells_per_axis(zoom)
+            x0, y0 = project(north, west)
+            x1, y1 = project(south, east)
+            x0, y0, x1, y1 = int(x0 * size), int(y0 * size), int(x1 * size), int(y1 * size)
+            level = self.levels[zoom]
+
+            # A box crossing the antimeridian (west > east) wraps around
+            x_ranges = [(x0, x1)] if x0 <= x1 else [(x0, size - 1), (0, x1)]
+            visible = sum(hi - lo + 1 for lo, hi in x_ranges) * (y1 - y0 + 1)
+
+            result = []
+            if visible <= len(level):
+                for lo, hi in x_ranges:
+                    for x in range(lo, hi + 1):
+                        for y in range(y0, y1 + 1):
+                            cell = level.get((x, y))
+                            if cell is not None:
+                                result.append(cell.to_dict())
+            else:
+                for (x, y), cell in level.items():
+                    if y0 <= y <= y1 and any(lo <= x <= hi for lo, hi in x_ranges):
+                        result.append(cell.to_dict())
+            return result
+
+# One grid per worker process, on top of the job catalogue
+grid = ClusterGrid(job_catalogue.catalogue)
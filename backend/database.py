@@ -1,117 +1,192 @@
+import contextvars
 import sqlite3
 import os
 import json
+import random
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
-# Get the absolute path to the database file
-DATABASE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'jobapp.db')
+import archive
+import chat_history
+import fieldsets
+import locations
+import migrations
+import salaries
+import serializers
+import sync
+import texts
+import time_slots
+
+try:
+    import fcntl
+except ImportError:  # Windows, where the app only runs as a single dev process
+    fcntl = None
+
+# Get the absolute path to the database file (JOBAPP_DB_PATH overrides it, e.g. for seeded copies)
+DATABASE_PATH = os.environ.get('JOBAPP_DB_PATH') or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'jobapp.db')
+
+# Lock contention settings for multi-process deployments.
+# SQLite's own busy handler waits BUSY_TIMEOUT seconds, after that we retry
+# with jittered exponential backoff so competing workers do not retry in step.
+BUSY_TIMEOUT = float(os.environ.get('JOBAPP_DB_BUSY_TIMEOUT', 0.1))
+LOCK_RETRIES = int(os.environ.get('JOBAPP_DB_LOCK_RETRIES', 8))
+LOCK_BACKOFF_BASE = 0.01  # seconds
+LOCK_BACKOFF_MAX = 1.0  # seconds
+
+def is_lock_error(error):
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and (
+        'database is locked' in message or 'database is busy' in message
+    )
+
+def retry_on_lock(operation, *args):
+    """Run a database operation, retrying with jittered backoff while the database is locked"""
+    for attempt in range(LOCK_RETRIES + 1):
+        try:
+            return operation(*args)
+        except sqlite3.OperationalError as e:
+            if not is_lock_error(e) or attempt == LOCK_RETRIES:
+                raise
+            # Full jitter: sleep a random time up to the exponential backoff ceiling
+            time.sleep(random.uniform(0, min(LOCK_BACKOFF_MAX, LOCK_BACKOFF_BASE * (2 ** attempt))))
+
+class RetryingCursor(sqlite3.Cursor):
+    """Cursor that retries statements failing with SQLITE_BUSY"""
+
+    def execute(self, sql, parameters=()):
+        return retry_on_lock(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return retry_on_lock(super().executemany, sql, seq_of_parameters)
+
+class RetryingConnection(sqlite3.Connection):
+    """Connection whose cursors, shortcuts and commits retry on SQLITE_BUSY"""
+
+    # Set on connections owned by a ConnectionScope, which closes them itself
+    scoped = False
+
+    def cursor(self, factory=RetryingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        return retry_on_lock(super().commit)
+
+    def close(self):
+        if not self.scoped:
+            super().close()
+
+class ConnectionScope:
+    """Connections shared by all get_db_connection() calls inside connection_scope().
+
+    Each thread gets its own connection (SQLite connections must not be used
+    by two threads at once), opened on first use and reused by every later
+    call in that thread until the scope is closed.
+    """
+
+    def __init__(self):
+        self.connections = {}  # thread id -> connection
+        self.lock = threading.Lock()
+
+    def connection(self):
+        key = threading.get_ident()
+        with self.lock:
+            conn = self.connections.get(key)
+        if conn is None:
+            # Closed by close(), possibly from another thread
+            conn = sqlite3.connect(DATABASE_PATH, timeout=BUSY_TIMEOUT, factory=RetryingConnection,
+                                   check_same_thread=False)
+            conn.scoped = True
+            with self.lock:
+                self.connections[key] = conn
+        # Earlier users may have switched to plain tuples
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def release(self):
+        """End whatever transaction the calling thread left open, keeping the connection"""
+        with self.lock:
+            conn = self.connections.get(threading.get_ident())
+        if conn is not None and conn.in_transaction:
+            conn.rollback()
+
+    def close(self):
+        with self.lock:
+            connections, self.connections = list(self.connections.values()), {}
+        for conn in connections:
+            conn.scoped = False
+            conn.close()
+
+_connection_scope = contextvars.ContextVar('connection_scope', default=None)
+
+@contextmanager
+def connection_scope(scope=None):
+    """Share connections between the get_db_connection() calls of the block.
+
+    Without a scope argument a new one is opened and closed with the block.
+    Pass an existing scope to use it from another thread, e.g. a pool worker.
+    """
+    own = scope is None
+    if own:
+        scope = ConnectionScope()
+    token = _connection_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _connection_scope.reset(token)
+        if own:
+            scope.close()
 
 def get_db_connection():
-    """Create a connection to the SQLite database."""
-    conn = sqlite3.connect(DATABASE_PATH)
+    """Create a connection to the SQLite database (or reuse the scoped one, see connection_scope)."""
+    scope = _connection_scope.get()
+    if scope is not None:
+        return scope.connection()
+    conn = sqlite3.connect(DATABASE_PATH, timeout=BUSY_TIMEOUT, factory=RetryingConnection)
     conn.row_factory = sqlite3.Row  # This enables column access by name
     return conn
 
-def init_db():
-    """Initialize the database with tables based on the schema."""
+@contextmanager
+def schema_lock():
+    """Hold an exclusive file lock so only one process initializes the schema"""
+    if fcntl is None:
+        yield
+        return
+
+    with open(DATABASE_PATH + '.init.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def init_db_once(background_indexes=False):
+    """Initialize the database behind a file lock (safe to call from every worker)."""
+    with schema_lock():
+        return init_db(background_indexes)
+
+def init_db(background_indexes=False):
+    """Initialize the database by applying any pending schema migrations.
+
+    When the schema is already current this only reads PRAGMA user_version.
+    """
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Create Employers Table (removing latitude and longitude columns)
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS employers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            company_name TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        # Create index on employers email
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_employers_email ON employers(email)')
-        
-        # Create Employees Table without the age CHECK constraint
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS employees (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            dob DATE NOT NULL,
-            education TEXT NOT NULL,  
-            skills TEXT, -- Store skills as JSON array (["Python", "SQL"])
-            experience INTEGER DEFAULT 0, 
-            latitude REAL,  
-            longitude REAL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        # Create index on employees email
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_employees_email ON employees(email)')
-        
-        # Create Jobs Table - UPDATED with time_slot field
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS jobs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            employer_id INTEGER NOT NULL,
-            title TEXT NOT NULL,
-            description TEXT,
-            salary TEXT,
-            job_type TEXT DEFAULT 'Part-time',
-            time_slot TEXT,
-            latitude REAL,  
-            longitude REAL,
-            status TEXT DEFAULT 'open',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (employer_id) REFERENCES employers(id) ON DELETE CASCADE
-        )
-        ''')
-        
-        # Create index on jobs employer
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_employer ON jobs(employer_id)')
-        
-        # Create Applications Table - UPDATED to ensure cover_letter can be stored properly
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS applications (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            job_id INTEGER NOT NULL,
-            employee_id INTEGER NOT NULL,
-            status TEXT DEFAULT 'waiting',
-            cover_letter TEXT,
-            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (job_id) REFERENCES jobs(id) ON DELETE CASCADE,
-            FOREIGN KEY (employee_id) REFERENCES employees(id) ON DELETE CASCADE
-        )
-        ''')
-        
-        # Create indexes for applications
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_applications_job ON applications(job_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_applications_employee ON applications(employee_id)')
-        
-        # Create Chat Table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS chat (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            employee_id INTEGER NOT NULL,
-            question TEXT NOT NULL,
-            answer TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (employee_id) REFERENCES employees(id) ON DELETE CASCADE
-        )
-        ''')
-        
-        # Create index for chat
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_employee ON chat(employee_id)')
-        
-        conn.commit()
-        conn.close()
+        try:
+            applied = migrations.migrate(conn, background_indexes, get_db_connection)
+        finally:
+            conn.close()
         
-        print(f"Database initialized successfully at {DATABASE_PATH}")
-        return {"success": True, "message": "Database initialized successfully"}
+        if applied:
+            print(f"Database initialized successfully at {DATABASE_PATH}")
+        return {"success": True, "message": "Database initialized successfully", "applied": applied}
     except Exception as e:
         print(f"Error initializing database: {e}")
         return {"success": False, "error": str(e)}
@@ -191,9 +266,10 @@ def register_employee(name, email, password_hash, dob, education, skills, experi
         # Try to insert the new employee
         cursor.execute(
             '''INSERT INTO employees 
-               (name, email, password_hash, dob, education, skills, experience, latitude, longitude) 
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-            (name, email, password_hash, dob, education, skills, experience, latitude, longitude)
+               (name, email, password_hash, dob, education, skills, experience, latitude, longitude, location_id) 
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            (name, email, password_hash, dob, education, skills, experience, latitude, longitude,
+             locations.resolve_location_id(latitude, longitude))
         )
         
         employee_id = cursor.lastrowid
@@ -265,14 +341,24 @@ def create_job(employer_id, title, description, salary=None, job_type='Part-time
         if not cursor.fetchone():
             return {"success": False, "error": "Employer not found", "code": "EMPLOYER_NOT_FOUND"}
         
+        # Structured slot for availability search, NULLs when the text cannot be parsed
+        slot_days, slot_start, slot_end = time_slots.parse_time_slot(time_slot) or (None, None, None)
+        # Hourly salary range for filtering and sorting by pay
+        salary_min, salary_max, salary_period = salaries.parse_salary(salary) or (None, None, None)
+        
         cursor.execute(
             '''INSERT INTO jobs 
-               (employer_id, title, description, salary, job_type, time_slot, latitude, longitude) 
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-            (employer_id, title, description, salary, job_type, time_slot, latitude, longitude)
+               (employer_id, title, summary, salary, job_type, time_slot, latitude, longitude, location_id,
+                slot_days, slot_start, slot_end, salary_min, salary_max, salary_period) 
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            (employer_id, title, texts.summarize(description), salary, job_type, time_slot, latitude, longitude,
+             locations.resolve_location_id(latitude, longitude), slot_days, slot_start, slot_end,
+             salary_min, salary_max, salary_period)
         )
         
         job_id = cursor.lastrowid
+        # The full description lives in job_texts, only the detail page reads it
+        texts.store(cursor, 'job_texts', job_id, description)
         conn.commit()
         
         return {
@@ -295,19 +381,35 @@ def create_job(employer_id, title, description, salary=None, job_type='Part-time
     finally:
         conn.close()
 
+# Columns of jobs in listings: the full description stays in job_texts
+JOB_LISTING_COLUMNS = fieldsets.projection(fieldsets.JOB_COLUMNS)
+
+def open_jobs_sql(fields=None):
+    """Open jobs with their employer, projected to the requested fields (all when None)"""
+    return f'''
+        SELECT {fieldsets.projection(fieldsets.JOB_FIELDS, fields)}
+        FROM jobs j
+        JOIN employers e ON j.employer_id = e.id
+        WHERE j.status = 'open'
+    '''
+
+OPEN_JOBS_SQL = open_jobs_sql()
+
+ALL_JOBS_SQL = OPEN_JOBS_SQL + ' ORDER BY j.created_at DESC'
+
+JOB_SORT_ORDERS = {
+    'newest': ' ORDER BY j.created_at DESC',
+    # Best paid first; NULLs sort lowest, so jobs without a parsed salary come last
+    'salary': ' ORDER BY j.salary_min DESC, j.created_at DESC',
+}
+
 # Function to get all open jobs with detailed company and employer info
 def get_all_jobs():
     conn = get_db_connection()
     cursor = conn.cursor()
     
     try:
-        cursor.execute('''
-            SELECT j.*, e.name AS employer_name, e.company_name
-            FROM jobs j
-            JOIN employers e ON j.employer_id = e.id
-            WHERE j.status = 'open'
-            ORDER BY j.created_at DESC
-        ''')
+        cursor.execute(ALL_JOBS_SQL)
         
         jobs = cursor.fetchall()
         
@@ -327,30 +429,220 @@ def get_all_jobs():
     finally:
         conn.close()
 
-# Function to get details of a specific job
-def get_job_by_id(job_id):
+# Function to get all open jobs as pre-encoded JSON bytes (fast path for /api/jobs)
+def get_all_jobs_json(job_ids=None, min_salary=None, sort='newest', limit=None, offset=0, fields=None):
     conn = get_db_connection()
-    cursor = conn.cursor()
+    conn.row_factory = None  # Plain tuples, serializers zips them with the column names
+    
+    sql = open_jobs_sql(fields)
+    params = []
+    if job_ids is not None:
+        sql += ' AND j.id IN (SELECT value FROM json_each(?))'
+        params.append(json.dumps(sorted(job_ids)))
+    if min_salary is not None:
+        # Hourly rate the job pays at least
+        sql += ' AND j.salary_min >= ?'
+        params.append(min_salary)
+    sql += JOB_SORT_ORDERS[sort]
+    if limit is not None:
+        sql += ' LIMIT ? OFFSET ?'
+        params.extend([limit, offset])
     
     try:
-        cursor.execute('''
-            SELECT j.*, e.name AS employer_name, e.company_name
+        cursor = conn.execute(sql, params)
+        return {"success": True, "jobs": serializers.encode_rows(cursor)}
+    except Exception as e:
+        print(f"Error fetching jobs: {e}")
+        return {"success": False, "error": str(e), "jobs": b'[]'}
+    finally:
+        conn.close()
+
+# Function to get the current delta sync token, taken before the rows it covers are read
+def read_sync_token(conn):
+    row = conn.execute("SELECT value FROM change_counters WHERE name = 'sync'").fetchone()
+    return sync.format_token(row[0])
+
+# Function to get the open jobs changed and the ids of jobs closed or deleted after a sync token
+def get_job_changes_json(since, fields=None):
+    conn = get_db_connection()
+    conn.row_factory = None
+    
+    try:
+        token = read_sync_token(conn)
+        if sync.needs_resync(since, sync.read_floor(conn)):
+            return {"success": False, "error": "Sync token expired, full resync required", "code": "RESYNC_REQUIRED"}
+        # Ranges over idx_jobs_sync: the unary + keeps the planner off the status index
+        cursor = conn.execute(f'''
+            SELECT {fieldsets.projection(fieldsets.JOB_FIELDS, fields, extra=('id',))}
             FROM jobs j
             JOIN employers e ON j.employer_id = e.id
-            WHERE j.id = ?
-        ''', (job_id,))
-        
-        job = cursor.fetchone()
-        if not job:
+            WHERE j.sync_seq > ? AND +j.status = 'open'
+            ORDER BY j.sync_seq
+        ''', (since,))
+        jobs = serializers.encode_rows(cursor)
+        deleted = [row[0] for row in conn.execute('''
+            SELECT id FROM jobs WHERE sync_seq > ? AND +status != 'open'
+            UNION ALL
+            SELECT row_id FROM sync_tombstones WHERE seq > ? AND table_name = 'jobs'
+        ''', (since, since))]
+        return {"success": True, "jobs": jobs, "deleted": serializers.dumps(deleted), "sync_token": token}
+    except Exception as e:
+        print(f"Error fetching job changes: {e}")
+        return {"success": False, "error": str(e)}
+    finally:
+        conn.close()
+
+AVAILABLE_JOBS_SQL = '''
+    SELECT id / 8 FROM job_slot_intervals
+    WHERE week_start < ? AND week_end > ?
+'''
+
+# Function to find the ids of jobs whose time slot overlaps an availability window
+def find_available_job_ids(days, start, end):
+    conn = get_db_connection()
+    conn.row_factory = None
+    
+    try:
+        job_ids = set()
+        for week_start, week_end in time_slots.week_intervals(days, start, end):
+            # Overnight slots on Sunday continue into Monday of the next week
+            for shift in (-time_slots.MINUTES_PER_WEEK, 0, time_slots.MINUTES_PER_WEEK):
+                cursor = conn.execute(AVAILABLE_JOBS_SQL, (week_end + shift, week_start + shift))
+                job_ids.update(row[0] for row in cursor)
+        return job_ids
+    finally:
+        conn.close()
+
+# Function to get the facet counts of all open jobs, maintained by triggers
+def get_job_facet_counts():
+    conn = get_db_connection()
+    
+    try:
+        facets = {}
+        for row in conn.execute('SELECT facet, value, count FROM job_facet_counts WHERE count > 0'):
+            facets.setdefault(row['facet'], {})[row['value']] = row['count']
+        return {"success": True, "facets": facets}
+    except Exception as e:
+        print(f"Error fetching facet counts: {e}")
+        return {"success": False, "error": str(e), "facets": {}}
+    finally:
+        conn.close()
+
+# Talent density rollup (migration 8): cells of 1 / TALENT_GRID_SCALE degrees
+TALENT_GRID_SCALE = 100
+# Cell sizes served, in base cells; a box is coarsened until it fits MAX_DENSITY_CELLS
+DENSITY_CELL_FACTORS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+MAX_DENSITY_CELLS = 4096
+
+# Function to get the number of located employees per grid cell, optionally with a skill
+def get_talent_density(west=-180.0, south=-90.0, east=180.0, north=90.0, skill=None, cell_size=None):
+    x0 = int((west + 180) * TALENT_GRID_SCALE)
+    x1 = int((east + 180) * TALENT_GRID_SCALE)
+    y0 = int((south + 90) * TALENT_GRID_SCALE)
+    y1 = int((north + 90) * TALENT_GRID_SCALE)
+    
+    # Smallest served cell size at least as large as requested that keeps the payload bounded
+    requested = max(1, round((cell_size or 0) * TALENT_GRID_SCALE))
+    factor = DENSITY_CELL_FACTORS[-1]
+    for candidate in DENSITY_CELL_FACTORS:
+        if candidate >= requested and ((x1 - x0) // candidate + 1) * ((y1 - y0) // candidate + 1) <= MAX_DENSITY_CELLS:
+            factor = candidate
+            break
+    
+    conn = get_db_connection()
+    conn.row_factory = None
+    
+    try:
+        rows = conn.execute('''
+            SELECT cell_y / ? AS grid_y, cell_x / ? AS grid_x, SUM(count)
+            FROM talent_density
+            WHERE skill = ? AND cell_y BETWEEN ? AND ? AND cell_x BETWEEN ? AND ? AND count > 0
+            GROUP BY grid_y, grid_x
+        ''', (factor, factor, (skill or '').strip().lower(), y0, y1, x0, x1)).fetchall()
+        
+        size = factor / TALENT_GRID_SCALE
+        cells = [{
+            # Cell centre
+            'latitude': round((grid_y + 0.5) * size - 90, 6),
+            'longitude': round((grid_x + 0.5) * size - 180, 6),
+            'count': count
+        } for grid_y, grid_x, count in rows]
+        return {"success": True, "cell_size": size, "cells": cells}
+    except Exception as e:
+        print(f"Error fetching talent density: {e}")
+        return {"success": False, "error": str(e), "cells": []}
+    finally:
+        conn.close()
+
+# Function to get details of a specific job
+def get_job_by_id(job_id, fields=None):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        # Long-closed jobs have moved to the archive tables
+        for jobs_table, texts_table in (('jobs', 'job_texts'), (archive.TABLES['jobs'], archive.TABLES['job_texts'])):
+            job = cursor.execute(f'''
+                SELECT {fieldsets.projection(fieldsets.JOB_DETAIL_FIELDS, fields, extra=('id',))}
+                FROM {jobs_table} j
+                JOIN employers e ON j.employer_id = e.id
+                WHERE j.id = ?
+            ''', (job_id,)).fetchone()
+            if job:
+                break
+        else:
             return {"success": False, "error": "Job not found", "code": "JOB_NOT_FOUND"}
         
-        return {"success": True, "job": dict(job)}
+        job = dict(job)
+        # The description is only read when asked for
+        if fieldsets.wants(fields, "description"):
+            job["description"] = texts.load(cursor, texts_table, job_id)
+        return {"success": True, "job": fieldsets.pick(job, fields)}
     except Exception as e:
         print(f"Error fetching job: {e}")
         return {"success": False, "error": str(e)}
     finally:
         conn.close()
 
+# Function to add an event for a user to the outbox, inside the caller's transaction.
+# Returns the event for events.hub.publish once the transaction is committed.
+def record_event(cursor, user_type, user_id, event, payload):
+    cursor.execute(
+        "INSERT INTO event_outbox (user_type, user_id, event, payload, origin) VALUES (?, ?, ?, ?, ?)",
+        (user_type, user_id, event, json.dumps(payload), os.getpid())
+    )
+    return {"id": cursor.lastrowid, "user_type": user_type, "user_id": user_id, "event": event, "data": payload}
+
+# Function to get a user's outbox events after an event id (replay after a reconnect)
+def get_events_since(user_type, user_id, last_event_id):
+    conn = get_db_connection()
+    
+    try:
+        return [{
+            "id": row["id"], "user_type": user_type, "user_id": user_id,
+            "event": row["event"], "data": json.loads(row["payload"])
+        } for row in conn.execute('''
+            SELECT id, event, payload FROM event_outbox
+            WHERE user_type = ? AND user_id = ? AND id > ?
+            ORDER BY id
+        ''', (user_type, user_id, last_event_id))]
+    except Exception as e:
+        print(f"Error fetching events: {e}")
+        return []
+    finally:
+        conn.close()
+
+def get_last_event_id():
+    conn = get_db_connection()
+    
+    try:
+        return conn.execute('SELECT COALESCE(MAX(id), 0) FROM event_outbox').fetchone()[0]
+    except Exception as e:
+        print(f"Error fetching the last event id: {e}")
+        return 0
+    finally:
+        conn.close()
+
 # Function to apply for a job with detailed response
 def apply_for_job(job_id, employee_id, cover_letter=None):
     conn = get_db_connection()
@@ -358,7 +650,7 @@ def apply_for_job(job_id, employee_id, cover_letter=None):
     
     try:
         # Check if the job exists and is open
-        cursor.execute("SELECT status FROM jobs WHERE id = ?", (job_id,))
+        cursor.execute("SELECT status, employer_id, title FROM jobs WHERE id = ?", (job_id,))
         job = cursor.fetchone()
         if not job:
             return {"success": False, "error": "Job not found", "code": "JOB_NOT_FOUND"}
@@ -380,17 +672,27 @@ def apply_for_job(job_id, employee_id, cover_letter=None):
         
         # Insert the application with cover letter
         cursor.execute(
-            "INSERT INTO applications (job_id, employee_id, cover_letter) VALUES (?, ?, ?)",
-            (job_id, employee_id, cover_letter)
+            "INSERT INTO applications (job_id, employee_id) VALUES (?, ?)",
+            (job_id, employee_id)
         )
         
         application_id = cursor.lastrowid
+        # Cover letters are only read on the application detail page
+        if cover_letter:
+            texts.store(cursor, 'application_texts', application_id, cover_letter)
+        
+        # Both sides are told, in the same transaction (see events.py)
+        payload = {"application_id": application_id, "job_id": job_id, "job_title": job["title"],
+                   "employee_id": employee_id, "status": "waiting"}
+        events = [record_event(cursor, 'employer', job["employer_id"], 'application_created', payload),
+                  record_event(cursor, 'employee', employee_id, 'application_created', payload)]
         conn.commit()
         
         return {
             "success": True, 
             "application_id": application_id,
-            "message": "Application submitted successfully"
+            "message": "Application submitted successfully",
+            "events": events
         }
     except sqlite3.IntegrityError as e:
         conn.rollback()
@@ -417,19 +719,31 @@ def update_application_status(application_id, new_status):
     
     try:
         # Check if the application exists
-        cursor.execute("SELECT id FROM applications WHERE id = ?", (application_id,))
-        if not cursor.fetchone():
+        cursor.execute('''
+            SELECT a.id, a.job_id, a.employee_id, j.employer_id, j.title
+            FROM applications a
+            JOIN jobs j ON a.job_id = j.id
+            WHERE a.id = ?
+        ''', (application_id,))
+        application = cursor.fetchone()
+        if not application:
             return {"success": False, "error": "Application not found", "code": "APPLICATION_NOT_FOUND"}
         
         cursor.execute(
             "UPDATE applications SET status = ? WHERE id = ?",
             (new_status, application_id)
         )
+        updated = cursor.rowcount
         
+        payload = {"application_id": application_id, "job_id": application["job_id"],
+                   "job_title": application["title"], "status": new_status}
+        events = [record_event(cursor, 'employee', application["employee_id"], 'application_status', payload),
+                  record_event(cursor, 'employer', application["employer_id"], 'application_status', payload)
+                  ] if updated else []
         conn.commit()
         
-        if cursor.rowcount > 0:
-            return {"success": True, "message": f"Application status updated to {new_status}"}
+        if updated > 0:
+            return {"success": True, "message": f"Application status updated to {new_status}", "events": events}
         else:
             return {"success": False, "error": "Application status not updated", "code": "UPDATE_FAILED"}
     except Exception as e:
@@ -440,7 +754,7 @@ def update_application_status(application_id, new_status):
         conn.close()
 
 # Function to get employer's posted jobs
-def get_employer_jobs(employer_id):
+def get_employer_jobs(employer_id, fields=None):
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -450,10 +764,11 @@ def get_employer_jobs(employer_id):
         if not cursor.fetchone():
             return {"success": False, "error": "Employer not found", "code": "EMPLOYER_NOT_FOUND"}
         
-        cursor.execute('''
-            SELECT * FROM jobs
-            WHERE employer_id = ?
-            ORDER BY created_at DESC
+        cursor.execute(f'''
+            SELECT {fieldsets.projection(fieldsets.EMPLOYER_JOB_FIELDS, fields)}
+            FROM jobs j
+            WHERE j.employer_id = ?
+            ORDER BY j.created_at DESC
         ''', (employer_id,))
         
         jobs = cursor.fetchall()
@@ -468,6 +783,96 @@ def get_employer_jobs(employer_id):
     finally:
         conn.close()
 
+EMPLOYER_STATS_COUNTS = ('application_count', 'waiting_count', 'accepted_count', 'rejected_count')
+
+# Function to get per-job and total application counts of an employer (trigger-maintained counters)
+def get_employer_stats(employer_id):
+    conn = get_db_connection()
+    
+    try:
+        jobs = [dict(row) for row in conn.execute('''
+            SELECT id, title, status, application_count, waiting_count, accepted_count, rejected_count
+            FROM jobs
+            WHERE employer_id = ?
+            ORDER BY created_at DESC
+        ''', (employer_id,))]
+        
+        if not jobs and not conn.execute("SELECT id FROM employers WHERE id = ?", (employer_id,)).fetchone():
+            return {"success": False, "error": "Employer not found", "code": "EMPLOYER_NOT_FOUND"}
+        
+        totals = {name: sum(job[name] for job in jobs) for name in EMPLOYER_STATS_COUNTS}
+        totals['job_count'] = len(jobs)
+        totals['open_job_count'] = sum(1 for job in jobs if job['status'] == 'open')
+        return {"success": True, "jobs": jobs, "totals": totals}
+    except Exception as e:
+        print(f"Error fetching employer stats: {e}")
+        return {"success": False, "error": str(e), "jobs": []}
+    finally:
+        conn.close()
+
+# Function to get daily applications and postings of an employer from the rollup tables
+def get_employer_trends(employer_id, first_day, last_day, job_id=None):
+    conn = get_db_connection()
+    
+    try:
+        if not conn.execute("SELECT id FROM employers WHERE id = ?", (employer_id,)).fetchone():
+            return {"success": False, "error": "Employer not found", "code": "EMPLOYER_NOT_FOUND"}
+        
+        sql = '''
+            SELECT day, job_id, applications FROM application_daily
+            WHERE employer_id = ? AND day BETWEEN ? AND ? AND applications > 0
+        '''
+        params = [employer_id, first_day, last_day]
+        if job_id is not None:
+            sql += ' AND job_id = ?'
+            params.append(job_id)
+        per_job = [dict(row) for row in conn.execute(sql + ' ORDER BY day, job_id', params)]
+        
+        # Daily totals over all of the employer's jobs
+        totals = {}
+        for row in per_job:
+            totals[row['day']] = totals.get(row['day'], 0) + row['applications']
+        
+        postings = [dict(row) for row in conn.execute('''
+            SELECT day, postings FROM posting_daily
+            WHERE employer_id = ? AND day BETWEEN ? AND ? AND postings > 0
+            ORDER BY day
+        ''', (employer_id, first_day, last_day))]
+        
+        return {
+            "success": True,
+            "applications": [{"day": day, "applications": count} for day, count in sorted(totals.items())],
+            "job_applications": per_job,
+            "postings": postings
+        }
+    except Exception as e:
+        print(f"Error fetching employer trends: {e}")
+        return {"success": False, "error": str(e)}
+    finally:
+        conn.close()
+
+# Columns of applications in listings: the cover letter stays in application_texts
+APPLICATION_LISTING_COLUMNS = fieldsets.projection(fieldsets.APPLICATION_COLUMNS)
+
+JOB_APPLICATIONS_SQL = f'''
+    SELECT {APPLICATION_LISTING_COLUMNS}, e.name, e.email, e.education, e.skills, e.experience
+    FROM applications a
+    JOIN employees e ON a.employee_id = e.id
+    WHERE a.job_id = ?
+    ORDER BY a.applied_at DESC
+'''
+
+# Same columns for every job of one employer, plus the job title,
+# ordered like the per-job listings were concatenated (job id, newest first)
+EMPLOYER_APPLICATIONS_SQL = '''
+    SELECT {columns}
+    FROM jobs j
+    JOIN applications a ON a.job_id = j.id
+    JOIN employees e ON a.employee_id = e.id
+    WHERE j.employer_id = ?
+    ORDER BY j.id, a.applied_at DESC
+'''
+
 # Function to get applications for a specific job
 def get_job_applications(job_id):
     conn = get_db_connection()
@@ -479,13 +884,7 @@ def get_job_applications(job_id):
         if not cursor.fetchone():
             return {"success": False, "error": "Job not found", "code": "JOB_NOT_FOUND"}
         
-        cursor.execute('''
-            SELECT a.*, e.name, e.email, e.education, e.skills, e.experience
-            FROM applications a
-            JOIN employees e ON a.employee_id = e.id
-            WHERE a.job_id = ?
-            ORDER BY a.applied_at DESC
-        ''', (job_id,))
+        cursor.execute(JOB_APPLICATIONS_SQL, (job_id,))
         
         applications = cursor.fetchall()
         
@@ -510,8 +909,73 @@ def get_job_applications(job_id):
     finally:
         conn.close()
 
+# Function to get applications for a specific job as pre-encoded JSON bytes
+def get_job_applications_json(job_id):
+    conn = get_db_connection()
+    conn.row_factory = None
+    
+    try:
+        if not conn.execute("SELECT id FROM jobs WHERE id = ?", (job_id,)).fetchone():
+            return {"success": False, "error": "Job not found", "code": "JOB_NOT_FOUND"}
+        
+        # Skills are stored as JSON text and embedded without decoding
+        cursor = conn.execute(JOB_APPLICATIONS_SQL, (job_id,))
+        return {"success": True, "applications": serializers.encode_rows(cursor, ('skills',))}
+    except Exception as e:
+        print(f"Error fetching job applications: {e}")
+        return {"success": False, "error": str(e), "applications": b'[]'}
+    finally:
+        conn.close()
+
+# Function to get the applications for all jobs of an employer as pre-encoded JSON bytes
+def get_employer_applications_json(employer_id, fields=None):
+    conn = get_db_connection()
+    conn.row_factory = None
+    
+    try:
+        columns = fieldsets.projection(fieldsets.EMPLOYER_APPLICATION_FIELDS, fields)
+        cursor = conn.execute(EMPLOYER_APPLICATIONS_SQL.format(columns=columns), (employer_id,))
+        return {"success": True, "applications": serializers.encode_rows(cursor, ('skills',))}
+    except Exception as e:
+        print(f"Error fetching employer applications: {e}")
+        return {"success": False, "error": str(e), "applications": b'[]'}
+    finally:
+        conn.close()
+
+# Function to get an employer's applications changed and the ids of those deleted after a sync token
+def get_employer_application_changes_json(employer_id, since, fields=None):
+    conn = get_db_connection()
+    conn.row_factory = None
+    
+    try:
+        token = read_sync_token(conn)
+        if sync.needs_resync(since, sync.read_floor(conn)):
+            return {"success": False, "error": "Sync token expired, full resync required", "code": "RESYNC_REQUIRED"}
+        columns = fieldsets.projection(fieldsets.EMPLOYER_APPLICATION_FIELDS, fields, extra=('id',))
+        # Ranges over idx_applications_sync, not over all applications of the employer
+        cursor = conn.execute(f'''
+            SELECT {columns}
+            FROM applications a
+            JOIN jobs j ON a.job_id = j.id
+            JOIN employees e ON a.employee_id = e.id
+            WHERE a.sync_seq > ? AND +j.employer_id = ?
+            ORDER BY a.sync_seq
+        ''', (since, employer_id))
+        applications = serializers.encode_rows(cursor, ('skills',))
+        deleted = [row[0] for row in conn.execute('''
+            SELECT row_id FROM sync_tombstones
+            WHERE seq > ? AND table_name = 'applications' AND employer_id = ?
+        ''', (since, employer_id))]
+        return {"success": True, "applications": applications, "deleted": serializers.dumps(deleted),
+                "sync_token": token}
+    except Exception as e:
+        print(f"Error fetching application changes: {e}")
+        return {"success": False, "error": str(e)}
+    finally:
+        conn.close()
+
 # Function to get all applications submitted by an employee
-def get_employee_applications(employee_id):
+def get_employee_applications(employee_id, fields=None):
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -522,8 +986,8 @@ def get_employee_applications(employee_id):
             return {"success": False, "error": "Employee not found", "code": "EMPLOYEE_NOT_FOUND"}
         
         # Join with jobs table to get job title and time_slot
-        cursor.execute('''
-            SELECT a.*, j.title AS job_title, j.time_slot, e.company_name 
+        cursor.execute(f'''
+            SELECT {fieldsets.projection(fieldsets.EMPLOYEE_APPLICATION_FIELDS, fields)}
             FROM applications a
             JOIN jobs j ON a.job_id = j.id
             JOIN employers e ON j.employer_id = e.id
@@ -580,8 +1044,23 @@ def save_chat_qa(employee_id, question, answer):
     finally:
         conn.close()
 
-# Function to get an employee's chat history
-def get_employee_chat_history(employee_id):
+# Function to get the latest answered questions of all employees, oldest first (warms the answer cache)
+def get_recent_chat_answers(limit):
+    conn = get_db_connection()
+    conn.row_factory = None
+    
+    try:
+        rows = conn.execute('SELECT question, answer FROM chat ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+        return rows[::-1]
+    except Exception as e:
+        print(f"Error fetching recent chat answers: {e}")
+        return []
+    finally:
+        conn.close()
+
+# Function to get a page of an employee's chat history, newest first, with the summary of compacted exchanges.
+# before is the (created_at, id) position the page continues after.
+def get_employee_chat_history(employee_id, before=None, limit=chat_history.PAGE_SIZE):
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -591,17 +1070,33 @@ def get_employee_chat_history(employee_id):
         if not cursor.fetchone():
             return {"success": False, "error": "Employee not found", "code": "EMPLOYEE_NOT_FOUND"}
         
-        cursor.execute('''
-            SELECT * FROM chat
-            WHERE employee_id = ?
-            ORDER BY created_at ASC
-        ''', (employee_id,))
-        
-        chat_history = cursor.fetchall()
+        sql = 'SELECT id, employee_id, question, answer, created_at FROM chat WHERE employee_id = ?'
+        params = [employee_id]
+        if before is not None:
+            sql += ' AND (created_at, id) < (?, ?)'
+            params.extend(before)
+        # One extra row tells whether there is a next page
+        sql += ' ORDER BY created_at DESC, id DESC LIMIT ?'
+        params.append(limit + 1)
+        
+        chat = [dict(entry) for entry in cursor.execute(sql, params)]
+        next_cursor = None
+        if len(chat) > limit:
+            chat = chat[:limit]
+            next_cursor = chat_history.encode_cursor(chat[-1]["created_at"], chat[-1]["id"])
+        
+        summary = cursor.execute('''
+            SELECT exchanges, first_at, last_at, recent_questions FROM chat_summaries WHERE employee_id = ?
+        ''', (employee_id,)).fetchone()
+        if summary:
+            summary = dict(summary)
+            summary["recent_questions"] = json.loads(summary["recent_questions"])
         
         return {
             "success": True, 
-            "chat_history": [dict(entry) for entry in chat_history]
+            "chat_history": chat,
+            "next_cursor": next_cursor,
+            "summary": summary
         }
     except Exception as e:
         print(f"Error fetching chat history: {e}")
@@ -0,0 +1,140 @@
+"""
+Per-location buckets of employee ids for /api/employees/nearby.
+
+Employees who registered on one of the predefined residential locations have
+a location_id. For a radius query from a predefined location the matching
+employees are the union of the buckets of every location within the radius
+(distances from the precomputed matrix); only employees with custom
+coordinates still need a haversine computation.
+"""
+import json
+import threading
+import time
+
+import database as db
+import fieldsets
+import locations
+
+# Seconds between change-counter checks
+POLL_INTERVAL = 1.0
+
+# Keep IN (...) lists below SQLite's host parameter limit
+ID_CHUNK_SIZE = 500
+
+# Always read: the id keys the distances, the coordinates place custom locations
+TALENT_KEY_COLUMNS = ('id', 'latitude', 'longitude')
+
+def read_counter(conn):
+    row = conn.execute("SELECT value FROM change_counters WHERE name = 'employees'").fetchone()
+    return row[0] if row else 0
+
+def talent_dict(row, distance):
+    employee = dict(row)
+    # Parse skills JSON
+    if employee.get('skills'):
+        try:
+            employee['skills'] = json.loads(employee['skills'])
+        except json.JSONDecodeError:
+            employee['skills'] = []
+    elif 'skills' in employee:
+        employee['skills'] = []
+    employee['distance'] = round(distance, 2)  # Distance in km
+    return employee
+
+class EmployeeLocationIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = locations.LocationBuckets()
+        self.seen_counter = None
+        self.last_poll = 0.0
+
+    def load(self):
+        conn = db.get_db_connection()
+        try:
+            with self.lock:
+                counter = read_counter(conn)
+                self.buckets.clear()
+                for employee_id, location_id in conn.execute(
+                        'SELECT id, location_id FROM employees WHERE location_id IS NOT NULL'):
+                    self.buckets.add(location_id, employee_id)
+                self.seen_counter = counter
+                self.last_poll = time.monotonic()
+        finally:
+            conn.close()
+
+    def refresh(self):
+        """Reload when the employees change counter moved since the last check"""
+        now = time.monotonic()
+        if self.seen_counter is not None and now - self.last_poll < POLL_INTERVAL:
+            return
+        if self.seen_counter is None:
+            self.load()
+            return
+        conn = db.get_db_connection()
+        try:
+            counter = read_counter(conn)
+        finally:
+            conn.close()
+        self.last_poll = now
+        if counter != self.seen_counter:
+            self.load()
+
+    def invalidate(self):
+        """Check the change counter on the next query (after a write in this process)"""
+        self.last_poll = 0.0
+
+    def find_nearby(self, latitude, longitude, radius, location_id=None, fields=None):
+        """Employees within radius km of a predefined location, nearest first.
+
+        Returns None when the query point is not a predefined location, the
+        caller then falls back to scanning every located employee. With
+        fields, only those keys are read and returned (see fieldsets.TALENT_FIELDS).
+        """
+        if location_id is None:
+            location_id = locations.resolve_location_id(latitude, longitude)
+        location = locations.LOCATIONS_BY_ID.get(location_id)
+        if location is None:
+            return None
+
+        self.refresh()
+        with self.lock:
+            located = self.buckets.within(location_id, radius)
+
+        distances = {employee_id: distance for distance, employee_id in located}
+        columns = fieldsets.projection(fieldsets.TALENT_FIELDS, fields, TALENT_KEY_COLUMNS)
+        found = []
+        conn = db.get_db_connection()
+        try:
+            ids = list(distances)
+            for start in range(0, len(ids), ID_CHUNK_SIZE):
+                chunk = ids[start:start + ID_CHUNK_SIZE]
+                rows = conn.execute(
+                    f"SELECT {columns} FROM employees WHERE id IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                for row in rows:
+                    found.append(talent_dict(row, distances[row['id']]))
+
+            # Employees with custom coordinates still need the haversine formula
+            rows = conn.execute(f'''
+                SELECT {columns} FROM employees
+                WHERE location_id IS NULL AND latitude IS NOT NULL AND longitude IS NOT NULL
+            ''').fetchall()
+        finally:
+            conn.close()
+
+        for row in rows:
+            if not row['latitude'] or not row['longitude']:
+                continue
+            distance = locations.haversine_distance(
+                location['latitude'], location['longitude'],
+                float(row['latitude']), float(row['longitude'])
+            )
+            if distance <= radius:
+                found.append(talent_dict(row, distance))
+
+        found.sort(key=lambda employee: (employee['distance'], employee['id']))
+        return [fieldsets.pick(employee, fields) for employee in found] if fields else found
+
+# One index per worker process
+index = EmployeeLocationIndex()
@@ -0,0 +1,143 @@
+"""
+Server-Sent Events for application changes.
+
+    GET /api/employees/<id>/events    text/event-stream
+    GET /api/employers/<id>/events
+
+apply_for_job and update_application_status add their events to the
+event_outbox table in the same transaction as the change (migration 12) and
+return them; the routes then publish them to the in-process hub, which hands
+them to the open streams of the affected users at once.
+
+Other worker processes learn about them through the outbox: every process
+with open streams polls it every POLL_INTERVAL seconds for ids above the
+last one it has seen, skipping the events it wrote itself. Event ids are the
+outbox ids, so a reconnecting EventSource sends Last-Event-ID and gets what
+it missed replayed from the table. Rows older than RETENTION are pruned.
+
+A stream ends after STREAM_LIFETIME seconds and the browser reconnects after
+RETRY_MS with its Last-Event-ID, so a stream never holds a server worker for
+longer than that. The first message carries the latest outbox id, which
+gives even a client that saw no events a Last-Event-ID to resume from.
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+import database as db
+
+POLL_INTERVAL = 0.5  # seconds
+KEEPALIVE_INTERVAL = 15  # seconds between comment lines on idle streams
+RETRY_MS = 3000  # EventSource reconnect delay
+PRUNE_INTERVAL = 60  # seconds
+RETENTION = '-1 hour'  # SQLite datetime modifier
+QUEUE_SIZE = 100  # events buffered per stream before a slow client misses some
+STREAM_LIFETIME = 300  # seconds before a stream ends and the client reconnects
+
+def format_event(event):
+    """One SSE message"""
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+class EventHub:
+    """In-process pub/sub of user events, bridged across processes by the outbox"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}  # (user_type, user_id) -> set of queues
+        self.poller = None
+
+    def subscribe(self, user_type, user_id):
+        events = queue.Queue(QUEUE_SIZE)
+        with self.lock:
+            self.subscribers.setdefault((user_type, user_id), set()).add(events)
+            if self.poller is None:
+                self.poller = threading.Thread(target=self.poll, name='event-outbox', daemon=True)
+                self.poller.start()
+        return events
+
+    def unsubscribe(self, user_type, user_id, events):
+        with self.lock:
+            streams = self.subscribers.get((user_type, user_id))
+            if streams is not None:
+                streams.discard(events)
+                if not streams:
+                    del self.subscribers[(user_type, user_id)]
+
+    def publish(self, events):
+        """Hand events to the open streams of their users in this process"""
+        for event in events:
+            with self.lock:
+                streams = list(self.subscribers.get((event['user_type'], event['user_id']), ()))
+            for stream in streams:
+                try:
+                    stream.put_nowait(event)
+                except queue.Full:
+                    pass  # The client catches up with Last-Event-ID when it reconnects
+
+    def poll(self):
+        """Publish the events other processes add to the outbox"""
+        conn = db.get_db_connection()
+        conn.row_factory = None
+        try:
+            last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM event_outbox').fetchone()[0]
+            last_prune = 0.0
+            while True:
+                time.sleep(POLL_INTERVAL)
+                try:
+                    rows = conn.execute('''
+                        SELECT id, user_type, user_id, event, payload, origin FROM event_outbox
+                        WHERE id > ? ORDER BY id
+                    ''', (last_id,)).fetchall()
+                    if rows:
+                        last_id = rows[-1][0]
+                        pid = os.getpid()
+                        self.publish([
+                            {'id': event_id, 'user_type': user_type, 'user_id': user_id,
+                             'event': event, 'data': json.loads(payload)}
+                            for event_id, user_type, user_id, event, payload, origin in rows if origin != pid
+                        ])
+                    if time.monotonic() - last_prune > PRUNE_INTERVAL:
+                        last_prune = time.monotonic()
+                        # The retrying cursor and commit wait out other writers (index builds, compactions)
+                        conn.execute("DELETE FROM event_outbox WHERE created_at < datetime('now', ?)",
+                                     (RETENTION,))
+                        conn.commit()
+                except sqlite3.Error as e:
+                    if conn.in_transaction:
+                        conn.rollback()
+                    print(f"Error polling the event outbox: {e}")
+        finally:
+            conn.close()
+
+    def stream(self, user_type, user_id, last_event_id=None):
+        """SSE text of a user's events for STREAM_LIFETIME seconds, replaying the ones after last_event_id first"""
+        events = self.subscribe(user_type, user_id)
+        try:
+            deadline = time.monotonic() + STREAM_LIFETIME
+            replayed = 0
+            if last_event_id is None:
+                yield f"retry: {RETRY_MS}\nid: {db.get_last_event_id()}\n\n"
+            else:
+                yield f"retry: {RETRY_MS}\n\n"
+                for event in db.get_events_since(user_type, user_id, last_event_id):
+                    replayed = event['id']
+                    yield format_event(event)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    event = events.get(timeout=min(KEEPALIVE_INTERVAL, remaining))
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if event['id'] > replayed:
+                    yield format_event(event)
+        finally:
+            self.unsubscribe(user_type, user_id, events)
+
+# One hub per worker process
+hub = EventHub()
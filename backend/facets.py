@@ -0,0 +1,225 @@
+"""
+Faceted job search.
+
+Every open job falls into one value of each facet (job type, time slot
+bucket, salary band, predefined location). The unfiltered counts are kept
+in the job_facet_counts table by triggers (migration 6). For a filter
+combination the counts come from in-memory bitsets: one Python int per
+facet value with bit <job id> set for every open job in it, kept in step
+with the job catalogue. Counting is then an AND plus a popcount.
+
+Distance rings depend on the query point, so their bitsets are built per
+request from the per-location bitsets (one haversine per predefined
+location) plus a scan of the jobs with custom coordinates.
+
+Counts are disjunctive: the counts of a facet apply every filter except
+the one on that facet, so selecting a value does not hide its siblings.
+"""
+import math
+
+import database as db
+import job_catalogue
+import locations
+
+UNSPECIFIED = 'unspecified'
+
+# Facets answered from the bitsets; 'location' only feeds the distance rings
+SEARCH_FACETS = ('job_type', 'time_slot', 'salary_band', 'distance')
+STORED_FACETS = ('job_type', 'time_slot', 'salary_band', 'location')
+
+# Upper bounds of the hourly salary bands (salary_min)
+SALARY_BANDS = [(15, 'under_15'), (20, '15_20'), (25, '20_25'), (30, '25_30'), (math.inf, '30_plus')]
+
+# Upper bounds in km of the distance rings
+DISTANCE_RINGS = [(2, '0_2'), (5, '2_5'), (10, '5_10'), (25, '10_25')]
+
+# The bucket functions mirror the SQL in migrations.job_facet_values
+
+def job_type_value(job_type):
+    return job_type or UNSPECIFIED
+
+def time_slot_bucket(slot_days, slot_start):
+    if slot_days is None:
+        return UNSPECIFIED
+    if slot_days & 0b11111 == 0:
+        return 'weekend'
+    if slot_start < 720:
+        return 'morning'
+    if slot_start < 1020:
+        return 'afternoon'
+    if slot_start < 1260:
+        return 'evening'
+    return 'night'
+
+def salary_band(salary_min):
+    if salary_min is None:
+        return UNSPECIFIED
+    for bound, name in SALARY_BANDS:
+        if salary_min < bound:
+            return name
+
+def location_value(location_id):
+    return str(location_id) if location_id else 'custom'
+
+def distance_ring(distance):
+    for bound, name in DISTANCE_RINGS:
+        if distance <= bound:
+            return name
+    return None
+
+def bitset(ids):
+    """Python int with the bit of every id set"""
+    if not ids:
+        return 0
+    buffer = bytearray((max(ids) >> 3) + 1)
+    for i in ids:
+        buffer[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buffer, 'little')
+
+def bit_ids(bits):
+    """Ids of the set bits, lowest first"""
+    digits = bin(bits)[:1:-1]  # least significant bit first
+    ids = []
+    i = digits.find('1')
+    while i != -1:
+        ids.append(i)
+        i = digits.find('1', i + 1)
+    return ids
+
+class FacetIndex:
+    def __init__(self, catalogue):
+        self.catalogue = catalogue
+        self.bitsets = None  # {facet: {value: int}}, None until built or after a reload
+        self.all_bits = 0
+        self.job_values = {}  # job id -> facet values, to clear its bits on removal
+        catalogue.subscribe(self.job_changed)
+
+    def job_changed(self, event, job_id):
+        # Called by the catalogue with its lock held
+        if self.bitsets is None:
+            return
+        if event == 'add':
+            self.add(job_id, self.catalogue.positions[job_id])
+        elif event == 'remove':
+            self.remove(job_id)
+        else:
+            self.bitsets = None
+
+    def values_at(self, position):
+        record = self.catalogue.records[position]
+        return (
+            job_type_value(record.job_type),
+            time_slot_bucket(record.slot_days, record.slot_start),
+            salary_band(record.salary_min),
+            location_value(self.catalogue.location_ids[position]),
+        )
+
+    def build(self):
+        members = {facet: {} for facet in STORED_FACETS}
+        self.job_values = {}
+        for position in range(len(self.catalogue)):
+            job_id = self.catalogue.ids[position]
+            values = self.values_at(position)
+            self.job_values[job_id] = values
+            for facet, value in zip(STORED_FACETS, values):
+                members[facet].setdefault(value, []).append(job_id)
+        self.bitsets = {
+            facet: {value: bitset(ids) for value, ids in values.items()}
+            for facet, values in members.items()
+        }
+        self.all_bits = bitset(list(self.job_values))
+
+    def add(self, job_id, position):
+        values = self.values_at(position)
+        self.job_values[job_id] = values
+        bit = 1 << job_id
+        for facet, value in zip(STORED_FACETS, values):
+            facet_bits = self.bitsets[facet]
+            facet_bits[value] = facet_bits.get(value, 0) | bit
+        self.all_bits |= bit
+
+    def remove(self, job_id):
+        values = self.job_values.pop(job_id, None)
+        if values is None:
+            return
+        mask = ~(1 << job_id)
+        for facet, value in zip(STORED_FACETS, values):
+            self.bitsets[facet][value] &= mask
+        self.all_bits &= mask
+
+    def distance_rings(self, latitude, longitude):
+        """{ring: bitset} of open jobs around a query point"""
+        ring_ids = {name: [] for _, name in DISTANCE_RINGS}
+        rings = {name: 0 for _, name in DISTANCE_RINGS}
+
+        # Jobs on a predefined location share its distance
+        for location in locations.ALL_LOCATIONS:
+            bits = self.bitsets['location'].get(location_value(location["id"]))
+            if not bits:
+                continue
+            ring = distance_ring(round(locations.haversine_distance(
+                latitude, longitude, location["latitude"], location["longitude"]), 2))
+            if ring:
+                rings[ring] |= bits
+
+        catalogue = self.catalogue
+        unlocated = [catalogue.positions[job_id] for job_id in catalogue.unlocated]
+        for distance, job_id, _ in catalogue.scan(unlocated, latitude, longitude, DISTANCE_RINGS[-1][0]):
+            ring_ids[distance_ring(distance)].append(job_id)
+        for name, ids in ring_ids.items():
+            rings[name] |= bitset(ids)
+        return rings
+
+    def search(self, filters, latitude=None, longitude=None, limit=50, offset=0):
+        """Open jobs matching {facet: [values]} (values OR-ed, facets AND-ed), newest first.
+
+        Returns (jobs, total, counts) with counts {facet: {value: count}}.
+        """
+        catalogue = self.catalogue
+        catalogue.refresh()
+
+        # Unfiltered counts are maintained by triggers, no popcounts needed
+        stored = {}
+        if not filters:
+            result = db.get_job_facet_counts()
+            if result['success']:
+                stored = {facet: counts for facet, counts in result['facets'].items() if facet in SEARCH_FACETS}
+
+        with catalogue.lock:
+            if self.bitsets is None:
+                self.build()
+
+            facet_bits = {facet: self.bitsets[facet] for facet in SEARCH_FACETS if facet in self.bitsets}
+            if latitude is not None and longitude is not None:
+                facet_bits['distance'] = self.distance_rings(latitude, longitude)
+
+            selected = {}
+            for facet, values in filters.items():
+                bits = 0
+                for value in values:
+                    bits |= facet_bits[facet].get(value, 0)
+                selected[facet] = bits
+
+            def combined(skip=None):
+                bits = self.all_bits
+                for facet, facet_selection in selected.items():
+                    if facet != skip:
+                        bits &= facet_selection
+                return bits
+
+            counts = {}
+            for facet, values in facet_bits.items():
+                if facet in stored:
+                    counts[facet] = stored[facet]
+                    continue
+                base = combined(facet)
+                counts[facet] = {value: (base & bits).bit_count() for value, bits in values.items()}
+
+            matches = set(bit_ids(combined()))
+            ids = catalogue.ids
+            positions = [position for position in catalogue.sorted_positions() if ids[position] in matches]
+            jobs = [catalogue.job_dict(position) for position in positions[offset:offset + limit]]
+            return jobs, len(positions), counts
+
+# One index per worker process, on top of the job catalogue
+index = FacetIndex(job_catalogue.catalogue)
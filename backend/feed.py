@@ -0,0 +1,364 @@
+"""
+Personalized job feed for employees.
+
+Each employee's top FEED_SIZE open jobs are stored in employee_feed, scored
+by distance from the employee's location and by how many of their skills
+appear in the job title and description. Serving /api/employees/<id>/feed
+is then one read of the (employee_id, score) index.
+
+Feeds are computed in a background thread pool:
+    - the whole feed when the employee registers or changes their profile
+    - incrementally when a job is created: the new job is scored for every
+      employee with a feed and inserted where it beats their lowest entry
+Closed and deleted jobs leave the feeds through triggers (migration 18),
+which queue the employees concerned in feed_refills; reopened jobs are
+queued in feed_reopened_jobs. The Refiller thread of every worker drains
+both queues every JOBAPP_FEED_REFILL_INTERVAL seconds, recomputing those
+feeds and scoring the reopened jobs like new ones, so feeds never shrink
+away as jobs close.
+
+    python feed.py rebuild    recompute the feeds of all employees
+    python feed.py refill     drain the queues once
+"""
+import json
+import math
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import database as db
+import fieldsets
+import serializers
+import texts
+
+FEED_SIZE = 20
+FEED_WORKERS = int(os.environ.get('JOBAPP_FEED_WORKERS', 2))
+
+# Queued feeds recomputed per transaction when refilling
+REFILL_BATCH_SIZE = 200
+
+# Jobs further away than this get no distance score
+FEED_RADIUS_KM = 25.0
+
+SKILL_WEIGHT = 0.6
+DISTANCE_WEIGHT = 0.4
+
+EARTH_RADIUS_KM = 6371
+
+OPEN_JOBS_SQL = '''
+    SELECT j.id, j.title, t.description, t.compressed, j.latitude, j.longitude
+    FROM jobs j
+    LEFT JOIN job_texts t ON t.job_id = j.id
+    WHERE j.status = 'open'
+'''
+
+def parse_skills(text):
+    try:
+        skills = json.loads(text) if text else []
+    except json.JSONDecodeError:
+        return []
+    return [skill.lower() for skill in skills if isinstance(skill, str) and skill.strip()]
+
+class JobProfile:
+    """What the scorer needs of one open job"""
+    __slots__ = ('id', 'text', 'lat_rad', 'lng_rad', 'cos_lat')
+
+    def __init__(self, row):
+        self.id = row[0]
+        self.text = f"{row[1] or ''} {texts.unpack(row[2], row[3]) or ''}".lower()
+        if row[4] and row[5]:
+            self.lat_rad = math.radians(float(row[4]))
+            self.lng_rad = math.radians(float(row[5]))
+            self.cos_lat = math.cos(self.lat_rad)
+        else:
+            self.lat_rad = None
+
+class EmployeeProfile:
+    __slots__ = ('id', 'skills', 'lat_rad', 'lng_rad', 'cos_lat')
+
+    def __init__(self, employee_id, latitude, longitude, skills):
+        self.id = employee_id
+        self.skills = parse_skills(skills)
+        if latitude and longitude:
+            self.lat_rad = math.radians(float(latitude))
+            self.lng_rad = math.radians(float(longitude))
+            self.cos_lat = math.cos(self.lat_rad)
+        else:
+            self.lat_rad = None
+
+def score_job(employee, job):
+    """(score, distance_km or None) of a job for an employee, score 0 when unrelated"""
+    skill_score = 0.0
+    if employee.skills:
+        matched = sum(1 for skill in employee.skills if skill in job.text)
+        skill_score = matched / len(employee.skills)
+
+    distance = None
+    distance_score = 0.0
+    if employee.lat_rad is not None and job.lat_rad is not None:
+        a = (math.sin((job.lat_rad - employee.lat_rad) / 2) ** 2 +
+             employee.cos_lat * job.cos_lat * math.sin((job.lng_rad - employee.lng_rad) / 2) ** 2)
+        distance = 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+        distance_score = max(0.0, 1 - distance / FEED_RADIUS_KM)
+
+    score = SKILL_WEIGHT * skill_score + DISTANCE_WEIGHT * distance_score
+    return score, (round(distance, 2) if distance is not None else None)
+
+def rank_jobs(employee, jobs):
+    """Top FEED_SIZE (score, job_id, distance) for an employee"""
+    scored = []
+    for job in jobs:
+        score, distance = score_job(employee, job)
+        if score > 0:
+            scored.append((round(score, 4), job.id, distance))
+    scored.sort(key=lambda entry: (-entry[0], -entry[1]))
+    return scored[:FEED_SIZE]
+
+def load_employee(conn, employee_id):
+    row = conn.execute('SELECT id, latitude, longitude, skills FROM employees WHERE id = ?', (employee_id,)).fetchone()
+    return EmployeeProfile(*row) if row else None
+
+def load_open_jobs(conn):
+    return [JobProfile(row) for row in conn.execute(OPEN_JOBS_SQL)]
+
+def store_feed(conn, employee_id, entries):
+    """Replace an employee's feed in one transaction"""
+    with conn:
+        conn.execute('DELETE FROM employee_feed WHERE employee_id = ?', (employee_id,))
+        conn.executemany(
+            'INSERT INTO employee_feed (employee_id, job_id, score, distance) VALUES (?, ?, ?, ?)',
+            [(employee_id, job_id, score, distance) for score, job_id, distance in entries]
+        )
+        conn.execute(
+            'INSERT OR REPLACE INTO employee_feed_state (employee_id, computed_at) VALUES (?, CURRENT_TIMESTAMP)',
+            (employee_id,)
+        )
+
+def compute_feed(employee_id, jobs=None, conn=None):
+    """Recompute and store one employee's feed, returns the number of entries (None for unknown employees)"""
+    own_conn = conn is None
+    if own_conn:
+        conn = db.get_db_connection()
+        conn.row_factory = None
+    try:
+        employee = load_employee(conn, employee_id)
+        if employee is None:
+            return None
+        if jobs is None:
+            jobs = load_open_jobs(conn)
+        entries = rank_jobs(employee, jobs)
+        store_feed(conn, employee_id, entries)
+        return len(entries)
+    finally:
+        if own_conn:
+            conn.close()
+
+def add_job(job_id):
+    """Insert a new job into every computed feed it qualifies for"""
+    conn = db.get_db_connection()
+    conn.row_factory = None
+    try:
+        row = conn.execute(OPEN_JOBS_SQL + ' AND j.id = ?', (job_id,)).fetchone()
+        if not row:
+            return 0
+        job = JobProfile(row)
+        employees = conn.execute('''
+            SELECT e.id, e.latitude, e.longitude, e.skills, COUNT(f.job_id), MIN(f.score)
+            FROM employee_feed_state s
+            JOIN employees e ON e.id = s.employee_id
+            LEFT JOIN employee_feed f ON f.employee_id = s.employee_id
+            GROUP BY s.employee_id
+        ''').fetchall()
+
+        updates = []
+        for employee_id, latitude, longitude, skills, size, lowest in employees:
+            score, distance = score_job(EmployeeProfile(employee_id, latitude, longitude, skills), job)
+            score = round(score, 4)
+            if score > 0 and (size < FEED_SIZE or score > lowest):
+                updates.append((employee_id, job_id, score, distance))
+
+        with conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO employee_feed (employee_id, job_id, score, distance) VALUES (?, ?, ?, ?)',
+                updates
+            )
+            # Drop whatever fell out of the top FEED_SIZE
+            conn.executemany('''
+                DELETE FROM employee_feed WHERE employee_id = ? AND job_id IN (
+                    SELECT job_id FROM employee_feed WHERE employee_id = ?
+                    ORDER BY score DESC, job_id DESC LIMIT -1 OFFSET ?
+                )
+            ''', [(employee_id, employee_id, FEED_SIZE) for employee_id, _, _, _ in updates])
+        return len(updates)
+    finally:
+        conn.close()
+
+class FeedWorker:
+    """Background pool running feed computations, one pending task per employee"""
+
+    def __init__(self, workers=FEED_WORKERS):
+        self.workers = workers
+        self.executor = None
+        self.lock = threading.Lock()
+        self.pending = set()
+
+    def submit(self, function, *args):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='feed')
+            return self.executor.submit(self.run, function, *args)
+
+    def run(self, function, *args):
+        try:
+            return function(*args)
+        except Exception as e:
+            print(f"Error updating feeds: {e}")
+
+    def employee_changed(self, employee_id):
+        """Recompute an employee's feed after registration or a profile update"""
+        with self.lock:
+            if employee_id in self.pending:
+                return None
+            self.pending.add(employee_id)
+        return self.submit(self.recompute, employee_id)
+
+    def recompute(self, employee_id):
+        with self.lock:
+            self.pending.discard(employee_id)
+        return compute_feed(employee_id)
+
+    def job_created(self, job_id):
+        return self.submit(add_job, job_id)
+
+def claim(conn, sql, batch_size):
+    """Take up to batch_size ids off a queue table, other workers never get the same ones"""
+    try:
+        ids = [row[0] for row in conn.execute(sql, (batch_size,)).fetchall()]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return ids
+
+CLAIM_REOPENED_SQL = '''
+    DELETE FROM feed_reopened_jobs WHERE job_id IN (SELECT job_id FROM feed_reopened_jobs LIMIT ?)
+    RETURNING job_id
+'''
+CLAIM_REFILLS_SQL = '''
+    DELETE FROM feed_refills WHERE employee_id IN (SELECT employee_id FROM feed_refills LIMIT ?)
+    RETURNING employee_id
+'''
+
+def refill(batch_size=REFILL_BATCH_SIZE):
+    """Score reopened jobs into the feeds and recompute the feeds that lost jobs, returns the feeds recomputed"""
+    conn = db.get_db_connection()
+    conn.row_factory = None
+    try:
+        while True:
+            job_ids = claim(conn, CLAIM_REOPENED_SQL, batch_size)
+            for job_id in job_ids:
+                add_job(job_id)
+            if len(job_ids) < batch_size:
+                break
+
+        total = 0
+        jobs = None
+        while True:
+            employee_ids = claim(conn, CLAIM_REFILLS_SQL, batch_size)
+            if employee_ids and jobs is None:
+                jobs = load_open_jobs(conn)
+            for employee_id in employee_ids:
+                # Only feeds that were computed before, the others are computed on first read
+                if conn.execute('SELECT 1 FROM employee_feed_state WHERE employee_id = ?', (employee_id,)).fetchone():
+                    compute_feed(employee_id, jobs, conn)
+                    total += 1
+            if len(employee_ids) < batch_size:
+                return total
+    finally:
+        conn.close()
+
+class Refiller:
+    """Daemon thread draining the feed queues every `interval` seconds"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None and self.interval > 0:
+            self.thread = threading.Thread(target=self.run, name='feed-refiller', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                refilled = refill()
+                if refilled:
+                    print(f"Refilled {refilled} feeds")
+            except Exception as e:
+                print(f"Error refilling feeds: {e}")
+
+def get_feed_json(employee_id, fields=None):
+    """The stored feed with current job data as JSON bytes, computing it on first use"""
+    conn = db.get_db_connection()
+    conn.row_factory = None
+    try:
+        if not conn.execute('SELECT 1 FROM employee_feed_state WHERE employee_id = ?', (employee_id,)).fetchone():
+            # Never computed (registered before feeds existed), do it once inline
+            if compute_feed(employee_id, conn=conn) is None:
+                return {"success": False, "error": "Employee not found", "code": "EMPLOYEE_NOT_FOUND", "jobs": b'[]'}
+        cursor = conn.execute(f'''
+            SELECT {fieldsets.projection(fieldsets.FEED_JOB_FIELDS, fields)}
+            FROM employee_feed f
+            JOIN jobs j ON j.id = f.job_id
+            JOIN employers e ON j.employer_id = e.id
+            WHERE f.employee_id = ? AND j.status = 'open'
+            ORDER BY f.score DESC, f.job_id DESC
+        ''', (employee_id,))
+        return {"success": True, "jobs": serializers.encode_rows(cursor)}
+    except Exception as e:
+        print(f"Error fetching feed: {e}")
+        return {"success": False, "error": str(e), "jobs": b'[]'}
+    finally:
+        conn.close()
+
+def rebuild_all(workers=FEED_WORKERS):
+    """Recompute every employee's feed against one snapshot of the open jobs"""
+    conn = db.get_db_connection()
+    conn.row_factory = None
+    try:
+        jobs = load_open_jobs(conn)
+        employee_ids = [row[0] for row in conn.execute('SELECT id FROM employees')]
+    finally:
+        conn.close()
+
+    def run(chunk):
+        chunk_conn = db.get_db_connection()
+        chunk_conn.row_factory = None
+        try:
+            for employee_id in chunk:
+                compute_feed(employee_id, jobs, chunk_conn)
+        finally:
+            chunk_conn.close()
+
+    chunk_size = max(1, len(employee_ids) // (workers * 4) + 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(run, [employee_ids[i:i + chunk_size] for i in range(0, len(employee_ids), chunk_size)]))
+    return len(employee_ids)
+
+# One worker pool per process
+worker = FeedWorker()
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    if command == 'rebuild':
+        print(f"Rebuilt feeds of {rebuild_all()} employees")
+    elif command == 'refill':
+        print(f"Refilled {refill()} feeds")
+    else:
+        raise SystemExit("usage: python feed.py rebuild|refill")
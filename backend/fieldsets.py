@@ -0,0 +1,147 @@
+"""
+Sparse fieldsets for the GET endpoints: ?fields=id,title,company_name
+
+Every resource has an allow-list mapping the field names a client may ask
+for to the SQL expression that produces them. None marks fields computed
+outside the projection (distances, texts from the side tables). Routes
+parse the parameter with parse(), SQL listings build their SELECT list with
+projection() so unrequested columns are never read, and in-memory listings
+drop the other keys with pick() before encoding.
+
+Without ?fields= every endpoint returns its full records as before.
+"""
+
+class InvalidFields(Exception):
+    """A ?fields= value naming fields the resource does not have"""
+
+JOB_COLUMNS = {
+    'id': 'j.id',
+    'employer_id': 'j.employer_id',
+    'title': 'j.title',
+    'summary': 'j.summary',
+    'salary': 'j.salary',
+    'job_type': 'j.job_type',
+    'time_slot': 'j.time_slot',
+    'latitude': 'j.latitude',
+    'longitude': 'j.longitude',
+    'status': 'j.status',
+    'created_at': 'j.created_at',
+    'location_id': 'j.location_id',
+    'slot_days': 'j.slot_days',
+    'slot_start': 'j.slot_start',
+    'slot_end': 'j.slot_end',
+    'salary_min': 'j.salary_min',
+    'salary_max': 'j.salary_max',
+    'salary_period': 'j.salary_period',
+}
+
+JOB_COUNTS = {
+    'application_count': 'j.application_count',
+    'waiting_count': 'j.waiting_count',
+    'accepted_count': 'j.accepted_count',
+    'rejected_count': 'j.rejected_count',
+}
+
+# Open job listings (/api/jobs, search, nearby)
+JOB_FIELDS = {**JOB_COLUMNS, 'employer_name': 'e.name', 'company_name': 'e.company_name'}
+NEARBY_JOB_FIELDS = {**JOB_FIELDS, 'distance': None}
+FEED_JOB_FIELDS = {**JOB_FIELDS, 'score': 'f.score', 'distance': 'f.distance'}
+EMPLOYER_JOB_FIELDS = {**JOB_COLUMNS, **JOB_COUNTS}
+JOB_DETAIL_FIELDS = {**JOB_FIELDS, **JOB_COUNTS, 'description': None}
+
+APPLICATION_COLUMNS = {
+    'id': 'a.id',
+    'job_id': 'a.job_id',
+    'employee_id': 'a.employee_id',
+    'status': 'a.status',
+    'applied_at': 'a.applied_at',
+}
+
+APPLICANT_COLUMNS = {
+    'name': 'e.name',
+    'email': 'e.email',
+    'education': 'e.education',
+    'skills': 'e.skills',
+    'experience': 'e.experience',
+}
+
+# Applications received by an employer, with the applicant
+EMPLOYER_APPLICATION_FIELDS = {**APPLICATION_COLUMNS, **APPLICANT_COLUMNS, 'job_title': 'j.title'}
+# Applications sent by an employee, with the job
+EMPLOYEE_APPLICATION_FIELDS = {
+    **APPLICATION_COLUMNS,
+    'job_title': 'j.title',
+    'time_slot': 'j.time_slot',
+    'company_name': 'e.company_name',
+}
+APPLICATION_DETAIL_FIELDS = {
+    **APPLICATION_COLUMNS,
+    **APPLICANT_COLUMNS,
+    'job_title': 'j.title',
+    'company_name': 'emp.company_name',
+    'cover_letter': None,
+    'job_description': None,
+}
+
+# Nearby talent never exposes email addresses
+TALENT_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'education': 'education',
+    'skills': 'skills',
+    'experience': 'experience',
+    'latitude': 'latitude',
+    'longitude': 'longitude',
+    'distance': None,
+}
+
+EMPLOYER_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'email': 'email',
+    'company_name': 'company_name',
+}
+
+EMPLOYEE_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'email': 'email',
+    'dob': 'dob',
+    'education': 'education',
+    'skills': 'skills',
+    'experience': 'experience',
+    'latitude': 'latitude',
+    'longitude': 'longitude',
+    'created_at': 'created_at',
+}
+
+def parse(text, allowed):
+    """?fields= value -> tuple of field names in the requested order, None when absent"""
+    if text is None:
+        return None
+    fields = []
+    for name in text.split(','):
+        name = name.strip()
+        if not name or name in fields:
+            continue
+        if name not in allowed:
+            raise InvalidFields(f"Unknown field '{name}', expected some of: {', '.join(allowed)}")
+        fields.append(name)
+    if not fields:
+        raise InvalidFields('fields must name at least one field')
+    return tuple(fields)
+
+def projection(allowed, fields=None, extra=()):
+    """SELECT list of the requested fields (all when None) plus extra ones the caller needs"""
+    names = list(allowed) if fields is None else list(fields)
+    names.extend(name for name in extra if name not in names)
+    return ', '.join(f'{allowed[name]} AS {name}' for name in names if allowed[name] is not None)
+
+def wants(fields, name):
+    return fields is None or name in fields
+
+def pick(record, fields):
+    """Only the requested keys of a record, in the requested order"""
+    if fields is None:
+        return record
+    return {name: record[name] for name in fields if name in record}
@@ -0,0 +1,404 @@
+"""
+Process-resident catalogue of open jobs.
+
+/api/jobs and /api/jobs/nearby read the same set of open jobs on every
+request. The catalogue keeps them in memory, column-wise:
+
+    ids, latitude, longitude, created_at,  array-backed columns (one slot per job)
+    location_id
+    job_type, time_slot, company_name ...   interned strings on __slots__ records
+
+Jobs on a predefined location are also kept in per-location buckets, so a
+radius query from a known location is a distance-matrix lookup plus a bucket
+union; only jobs with custom coordinates need the haversine computation.
+
+It is built at startup, updated incrementally by create_job/delete_job in
+this process, and polls the change_counters row maintained by triggers so
+writes from other worker processes are picked up too. Those are applied as
+deltas: the jobs with a sync_seq above the last one seen and the tombstones
+after it (see sync.py). Only a gap (tombstones pruned since) reloads it all.
+"""
+import calendar
+import math
+import sys
+import threading
+import time
+from array import array
+
+import database as db
+import fieldsets
+import locations
+import serializers
+import sync
+
+# Seconds between change-counter checks
+POLL_INTERVAL = 1.0
+
+# Encoded listings kept per catalogue generation, one per distinct ?fields=
+JSON_CACHE_SIZE = 16
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE = 111.195
+
+# Same columns, in the same order, as database.OPEN_JOBS_SQL (descriptions stay in job_texts)
+CATALOGUE_COLUMNS_SQL = '''
+    SELECT j.id, j.employer_id, j.title, j.summary, j.salary, j.job_type, j.time_slot,
+           j.latitude, j.longitude, j.status, j.created_at, j.location_id,
+           j.slot_days, j.slot_start, j.slot_end, j.salary_min, j.salary_max, j.salary_period,
+           e.name AS employer_name, e.company_name
+    FROM jobs j
+    JOIN employers e ON j.employer_id = e.id
+'''
+CATALOGUE_SQL = CATALOGUE_COLUMNS_SQL + " WHERE j.status = 'open'"
+
+# Jobs of any status written after a sync sequence number, over idx_jobs_sync
+CHANGED_JOBS_SQL = CATALOGUE_COLUMNS_SQL + ' WHERE j.sync_seq > ?'
+DELETED_JOBS_SQL = "SELECT row_id FROM sync_tombstones WHERE seq > ? AND table_name = 'jobs'"
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def intern_text(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+def parse_timestamp(value):
+    """Convert a SQLite CURRENT_TIMESTAMP string to epoch seconds (UTC)"""
+    try:
+        return float(calendar.timegm(time.strptime(value, TIMESTAMP_FORMAT)))
+    except (TypeError, ValueError):
+        return math.nan
+
+class JobRecord:
+    """The non-numeric columns of one open job"""
+    __slots__ = ('id', 'employer_id', 'title', 'summary', 'salary', 'job_type',
+                 'salary_min', 'salary_max', 'salary_period',
+                 'time_slot', 'slot_days', 'slot_start', 'slot_end', 'status',
+                 'employer_name', 'company_name', 'created_text')
+
+    def __init__(self, row):
+        self.id = row[0]
+        self.employer_id = row[1]
+        self.title = row[2]
+        self.summary = row[3]
+        self.salary = intern_text(row[4])
+        self.job_type = intern_text(row[5])
+        self.time_slot = intern_text(row[6])
+        self.slot_days = row[12]
+        self.slot_start = row[13]
+        self.slot_end = row[14]
+        self.salary_min = row[15]
+        self.salary_max = row[16]
+        self.salary_period = intern_text(row[17])
+        self.status = intern_text(row[9])
+        self.employer_name = intern_text(row[18])
+        self.company_name = intern_text(row[19])
+        # Only kept when created_at is not in the standard format
+        self.created_text = row[10] if math.isnan(parse_timestamp(row[10])) else None
+
+class JobCatalogue:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.generation = 0
+        self.seen_counter = None
+        self.seen_seq = None  # sync sequence number the catalogue is current with
+        self.last_poll = 0.0
+        self.listeners = []
+        self.reset()
+
+    def reset(self):
+        self.ids = array('q')
+        self.latitude = array('d')
+        self.longitude = array('d')
+        self.created_at = array('d')
+        self.location_ids = array('q')  # 0 when the job is not on a predefined location
+        self.records = []
+        self.positions = {}  # job id -> slot in the columns
+        self.buckets = locations.LocationBuckets()
+        self.unlocated = set()  # ids of jobs with custom coordinates
+        self.sorted_cache = None
+        self.json_cache = {}  # requested fields (None for all) -> encoded listing
+
+    # Loading
+
+    def load(self):
+        """(Re)build the catalogue from the database"""
+        conn = db.get_db_connection()
+        conn.row_factory = None
+        try:
+            with self.lock:
+                counter = read_counter(conn)
+                seq = read_sync_seq(conn)
+                rows = conn.execute(CATALOGUE_SQL).fetchall()
+                self.reset()
+                for row in rows:
+                    self.append(row)
+                self.seen_counter = counter
+                self.seen_seq = seq
+                self.last_poll = time.monotonic()
+                self.changed('reset', None)
+        finally:
+            conn.close()
+
+    def append(self, row):
+        self.positions[row[0]] = len(self.records)
+        self.ids.append(row[0])
+        self.latitude.append(math.nan if row[7] is None else float(row[7]))
+        self.longitude.append(math.nan if row[8] is None else float(row[8]))
+        self.created_at.append(parse_timestamp(row[10]))
+        self.location_ids.append(row[11] or 0)
+        self.records.append(JobRecord(row))
+        if row[11]:
+            self.buckets.add(row[11], row[0])
+        else:
+            self.unlocated.add(row[0])
+
+    def apply_changes(self):
+        """Apply the jobs written and deleted after seen_seq, reload when tombstones are missing"""
+        conn = db.get_db_connection()
+        conn.row_factory = None
+        try:
+            with self.lock:
+                # Read first: writes landing during the queries are applied again next time
+                counter = read_counter(conn)
+                seq = read_sync_seq(conn)
+                if self.seen_seq is None or self.seen_seq < sync.read_floor(conn):
+                    self.load()
+                    return
+                deleted = conn.execute(DELETED_JOBS_SQL, (self.seen_seq,)).fetchall()
+                rows = conn.execute(CHANGED_JOBS_SQL, (self.seen_seq,)).fetchall()
+                # Tombstones first: a current row is newer than any deletion of its id
+                for (job_id,) in deleted:
+                    self.discard(job_id)
+                for row in rows:
+                    self.discard(row[0])
+                    if row[9] == 'open':
+                        self.append(row)
+                        self.changed('add', row[0])
+                self.seen_counter = counter
+                self.seen_seq = seq
+        finally:
+            conn.close()
+
+    def discard(self, job_id):
+        position = self.positions.get(job_id)
+        if position is not None:
+            self.remove_position(position)
+            self.changed('remove', job_id)
+
+    def remove_position(self, position):
+        """Remove a slot by moving the last slot into it, keeping the columns dense"""
+        last = len(self.records) - 1
+        removed = self.records[position]
+        self.buckets.remove(self.location_ids[position], removed.id)
+        self.unlocated.discard(removed.id)
+        columns = (self.ids, self.latitude, self.longitude, self.created_at, self.location_ids)
+        if position != last:
+            for column in columns:
+                column[position] = column[last]
+            self.records[position] = self.records[last]
+            self.positions[self.records[position].id] = position
+        for column in columns:
+            column.pop()
+        self.records.pop()
+        del self.positions[removed.id]
+        return removed
+
+    def changed(self, event, job_id):
+        self.generation += 1
+        self.sorted_cache = None
+        self.json_cache = {}
+        for listener in self.listeners:
+            listener(event, job_id)
+
+    def subscribe(self, listener):
+        """Call listener(event, job_id) on 'add', 'remove' and 'reset'"""
+        self.listeners.append(listener)
+
+    # Incremental updates from this process
+
+    def job_created(self, job_id):
+        conn = db.get_db_connection()
+        conn.row_factory = None
+        try:
+            row = conn.execute(CATALOGUE_SQL + ' AND j.id = ?', (job_id,)).fetchone()
+            with self.lock:
+                if row and job_id not in self.positions:
+                    self.append(row)
+                    self.changed('add', job_id)
+                self.note_own_write(read_counter(conn))
+        finally:
+            conn.close()
+
+    def job_deleted(self, job_id):
+        with self.lock:
+            self.discard(job_id)
+            self.note_own_write(self.current_counter())
+
+    def note_own_write(self, counter):
+        # Our own write bumped the counter by exactly one; anything more means
+        # another process wrote too and the next poll has to apply its changes
+        if self.seen_counter is not None and counter == self.seen_counter + 1:
+            self.seen_counter = counter
+
+    def current_counter(self):
+        conn = db.get_db_connection()
+        try:
+            return read_counter(conn)
+        finally:
+            conn.close()
+
+    def refresh(self):
+        """Apply the changes of other processes when the change counter moved since the last check"""
+        now = time.monotonic()
+        if self.seen_counter is not None and now - self.last_poll < POLL_INTERVAL:
+            return
+        with self.lock:
+            if self.seen_counter is None:
+                self.load()
+                return
+            self.last_poll = now
+            if self.current_counter() != self.seen_counter:
+                self.apply_changes()
+
+    # Queries
+
+    def sorted_positions(self):
+        """Slots ordered by created_at, newest first (cached until the next change)"""
+        if self.sorted_cache is None:
+            created_at = self.created_at
+            self.sorted_cache = sorted(range(len(self.records)), key=lambda i: created_at[i], reverse=True)
+        return self.sorted_cache
+
+    def job_dict(self, position):
+        record = self.records[position]
+        latitude = self.latitude[position]
+        longitude = self.longitude[position]
+        created_at = self.created_at[position]
+        location_id = self.location_ids[position]
+        return {
+            'id': record.id,
+            'employer_id': record.employer_id,
+            'title': record.title,
+            'summary': record.summary,
+            'salary': record.salary,
+            'job_type': record.job_type,
+            'time_slot': record.time_slot,
+            'latitude': None if math.isnan(latitude) else latitude,
+            'longitude': None if math.isnan(longitude) else longitude,
+            'status': record.status,
+            'created_at': record.created_text if math.isnan(created_at) else
+                          time.strftime(TIMESTAMP_FORMAT, time.gmtime(created_at)),
+            'location_id': location_id or None,
+            'slot_days': record.slot_days,
+            'slot_start': record.slot_start,
+            'slot_end': record.slot_end,
+            'salary_min': record.salary_min,
+            'salary_max': record.salary_max,
+            'salary_period': record.salary_period,
+            'employer_name': record.employer_name,
+            'company_name': record.company_name,
+        }
+
+    def list_jobs(self):
+        """All open jobs, newest first"""
+        self.refresh()
+        with self.lock:
+            return [self.job_dict(position) for position in self.sorted_positions()]
+
+    def list_jobs_json(self, job_ids=None, fields=None):
+        """All open jobs as JSON bytes, encoded once per catalogue generation and fieldset.
+
+        With job_ids, only those jobs (still newest first, not cached).
+        With fields, only those keys of every job (see fieldsets.JOB_FIELDS).
+        """
+        self.refresh()
+        with self.lock:
+            if job_ids is not None:
+                ids = self.ids
+                return serializers.dumps(
+                    [fieldsets.pick(self.job_dict(position), fields)
+                     for position in self.sorted_positions() if ids[position] in job_ids]
+                )
+            encoded = self.json_cache.get(fields)
+            if encoded is None:
+                if len(self.json_cache) >= JSON_CACHE_SIZE:
+                    self.json_cache.clear()
+                encoded = self.json_cache[fields] = serializers.dumps(
+                    [fieldsets.pick(self.job_dict(position), fields) for position in self.sorted_positions()]
+                )
+            return encoded
+
+    def nearby(self, latitude, longitude, radius, location_id=None):
+        """Open jobs within radius km, nearest first, with a 'distance' key.
+
+        When the query point is a predefined location (given as location_id or
+        by its exact coordinates) distances come from the location matrix.
+        """
+        self.refresh()
+        if location_id is None:
+            location_id = locations.resolve_location_id(latitude, longitude)
+        elif location_id in locations.LOCATIONS_BY_ID:
+            latitude = locations.LOCATIONS_BY_ID[location_id]["latitude"]
+            longitude = locations.LOCATIONS_BY_ID[location_id]["longitude"]
+        else:
+            location_id = None
+
+        with self.lock:
+            if location_id is not None:
+                # Located jobs: table lookup and bucket union, no trigonometry
+                matches = [(round(distance, 2), job_id, self.positions[job_id])
+                           for distance, job_id in self.buckets.within(location_id, radius)]
+                candidates = [self.positions[job_id] for job_id in self.unlocated]
+            else:
+                matches = []
+                candidates = range(len(self.records))
+
+            matches.extend(self.scan(candidates, latitude, longitude, radius))
+
+            # Ties (e.g. jobs at the same predefined location) keep job id order
+            matches.sort()
+            result = []
+            for distance, _, position in matches:
+                job = self.job_dict(position)
+                job['distance'] = distance
+                result.append(job)
+            return result
+
+    def scan(self, positions, latitude, longitude, radius):
+        """Haversine over the given slots, with a bounding box prefilter"""
+        lat_rad = math.radians(latitude)
+        cos_lat = math.cos(lat_rad)
+        lat_margin = radius / KM_PER_DEGREE
+        lng_margin = radius / (KM_PER_DEGREE * max(cos_lat, 1e-6))
+
+        latitudes = self.latitude
+        longitudes = self.longitude
+        matches = []
+        for position in positions:
+            job_lat = latitudes[position]
+            job_lng = longitudes[position]
+            # NaN (no location) fails these comparisons and is skipped
+            if not (abs(job_lat - latitude) <= lat_margin and abs(job_lng - longitude) <= lng_margin):
+                continue
+            if not job_lat or not job_lng:
+                continue
+            job_lat_rad = math.radians(job_lat)
+            a = (math.sin((job_lat_rad - lat_rad) / 2) ** 2 +
+                 cos_lat * math.cos(job_lat_rad) * math.sin(math.radians(job_lng - longitude) / 2) ** 2)
+            distance = 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+            if distance <= radius:
+                matches.append((round(distance, 2), self.ids[position], position))
+        return matches
+
+    def __len__(self):
+        return len(self.records)
+
+def read_counter(conn):
+    row = conn.execute("SELECT value FROM change_counters WHERE name = 'jobs'").fetchone()
+    return row[0] if row else 0
+
+def read_sync_seq(conn):
+    row = conn.execute("SELECT value FROM change_counters WHERE name = 'sync'").fetchone()
+    return row[0] if row else 0
+
+# One catalogue per worker process
+catalogue = JobCatalogue()
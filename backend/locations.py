@@ -0,0 +1,123 @@
+"""
+Predefined locations for the backend.
+Mirrors src/utils/locations.js so the server knows the same neighborhoods
+that users pick from in the UI, and precomputes the distance between every
+pair of them so radius queries from a known location are table lookups.
+"""
+import math
+
+# Residential locations where employees might live
+RESIDENTIAL_LOCATIONS = [
+    {"id": 1, "name": "Westside Residential", "latitude": 40.7686, "longitude": -74.0423},
+    {"id": 2, "name": "Uptown Heights", "latitude": 40.8175, "longitude": -73.9526},
+    {"id": 3, "name": "Midtown Apartments", "latitude": 40.7649, "longitude": -73.9940},
+    {"id": 4, "name": "Eastside Homes", "latitude": 40.7559, "longitude": -73.9401},
+    {"id": 5, "name": "Southside Community", "latitude": 40.6682, "longitude": -73.9542},
+    {"id": 6, "name": "Northeast Neighborhood", "latitude": 40.7778, "longitude": -73.9123},
+]
+
+# Commercial/business locations where jobs might be located
+BUSINESS_LOCATIONS = [
+    {"id": 101, "name": "Downtown Business District", "latitude": 40.7128, "longitude": -74.0060},
+    {"id": 102, "name": "Uptown Commercial", "latitude": 40.8075, "longitude": -73.9626},
+    {"id": 103, "name": "Midtown Corporate Center", "latitude": 40.7549, "longitude": -73.9840},
+    {"id": 104, "name": "Westside Business Park", "latitude": 40.7586, "longitude": -74.0223},
+    {"id": 105, "name": "Eastside Commerce Hub", "latitude": 40.7659, "longitude": -73.9501},
+    {"id": 106, "name": "Southside Industrial", "latitude": 40.6782, "longitude": -73.9442},
+    {"id": 107, "name": "Northwest Tech Campus", "latitude": 40.7829, "longitude": -73.9654},
+    {"id": 108, "name": "Northeast Business Center", "latitude": 40.7678, "longitude": -73.9223},
+]
+
+# All locations combined
+ALL_LOCATIONS = RESIDENTIAL_LOCATIONS + BUSINESS_LOCATIONS
+
+# Allow for some small variance in the coordinates for matching (same as the UI)
+COORDINATE_VARIANCE = 0.001
+
+# Rows only get a location_id when they sit exactly on a predefined location,
+# so distances taken from the matrix equal the per-row haversine result
+EXACT_MATCH_VARIANCE = 1e-6
+
+LOCATIONS_BY_ID = {location["id"]: location for location in ALL_LOCATIONS}
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """Calculate the great circle distance in kilometers between two points"""
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * math.asin(math.sqrt(a)) * 6371
+
+def build_distance_matrix():
+    """Pairwise distances {from_id: [(km, to_id), ...]} sorted nearest first"""
+    matrix = {}
+    for origin in ALL_LOCATIONS:
+        row = [
+            (haversine_distance(origin["latitude"], origin["longitude"], target["latitude"], target["longitude"]),
+             target["id"])
+            for target in ALL_LOCATIONS
+        ]
+        row.sort()
+        matrix[origin["id"]] = row
+    return matrix
+
+DISTANCE_MATRIX = build_distance_matrix()
+
+def get_location_by_id(location_id):
+    """Find a location by its ID"""
+    return LOCATIONS_BY_ID.get(int(location_id))
+
+def get_location_by_coordinates(latitude, longitude, variance=COORDINATE_VARIANCE):
+    """Find a predefined location matching the given coordinates"""
+    if latitude is None or longitude is None:
+        return None
+
+    try:
+        latitude = float(latitude)
+        longitude = float(longitude)
+    except (TypeError, ValueError):
+        return None
+
+    for location in ALL_LOCATIONS:
+        if (abs(location["latitude"] - latitude) < variance and
+                abs(location["longitude"] - longitude) < variance):
+            return location
+    return None
+
+def resolve_location_id(latitude, longitude):
+    """location_id for coordinates exactly on a predefined location, otherwise None"""
+    location = get_location_by_coordinates(latitude, longitude, EXACT_MATCH_VARIANCE)
+    return location["id"] if location else None
+
+def locations_within(location_id, radius):
+    """[(km, location_id), ...] of predefined locations within radius, from the matrix"""
+    result = []
+    for distance, target_id in DISTANCE_MATRIX.get(location_id, []):
+        if distance > radius:
+            break
+        result.append((distance, target_id))
+    return result
+
+class LocationBuckets:
+    """Ids of rows grouped by the predefined location they sit on"""
+
+    def __init__(self):
+        self.buckets = {}
+
+    def clear(self):
+        self.buckets = {}
+
+    def add(self, location_id, row_id):
+        if location_id:
+            self.buckets.setdefault(location_id, set()).add(row_id)
+
+    def remove(self, location_id, row_id):
+        bucket = self.buckets.get(location_id)
+        if bucket:
+            bucket.discard(row_id)
+
+    def within(self, location_id, radius):
+        """[(km, row_id), ...] for every row within radius of a predefined location"""
+        result = []
+        for distance, target_id in locations_within(location_id, radius):
+            for row_id in self.buckets.get(target_id, ()):
+                result.append((distance, row_id))
+        return result
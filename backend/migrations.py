@@ -0,0 +1,1143 @@
+"""
+Versioned schema migrations.
+
+PRAGMA user_version holds the version the database is fully migrated to, so
+startup costs a single PRAGMA read when the schema is current.
+
+Each migration has:
+    version      increasing integer
+    description  short text shown when it is applied
+    statements   SQL strings, or callables taking a cursor (for Python backfills).
+                 All pending statements run in one transaction.
+    indexes      (name, sql) index builds run after that transaction commits,
+                 each in its own short transaction. With WAL, readers keep being
+                 served while an index is built, and builds can run in a
+                 background thread so workers start immediately.
+
+Applied migrations are recorded in schema_migrations; user_version is only
+raised once the index builds have finished, so interrupted builds resume on
+the next start. The process building the indexes holds the row of
+schema_index_builds (claimed under BEGIN IMMEDIATE), so workers starting
+while a background build runs leave it to that process. A claim whose
+process is gone, or older than BUILD_CLAIM_TIMEOUT, is taken over.
+"""
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import archive
+import locations
+import rollups
+import salaries
+import sync
+import texts
+import time_slots
+
+def backfill_location_ids(cursor):
+    """Set location_id on jobs and employees sitting exactly on a predefined location"""
+    for table in ('jobs', 'employees'):
+        for location in locations.ALL_LOCATIONS:
+            cursor.execute(
+                f'''UPDATE {table} SET location_id = ?
+                    WHERE latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?''',
+                (location["id"],
+                 location["latitude"] - locations.EXACT_MATCH_VARIANCE,
+                 location["latitude"] + locations.EXACT_MATCH_VARIANCE,
+                 location["longitude"] - locations.EXACT_MATCH_VARIANCE,
+                 location["longitude"] + locations.EXACT_MATCH_VARIANCE)
+            )
+
+def create_slot_index(cursor):
+    """Interval index over job time slots, one row per job and weekday.
+
+    Row ids are job_id * 8 + weekday so a job's rows form one id range.
+    Uses an integer R*Tree when SQLite has the module, otherwise a plain
+    table with a B-tree index on the interval start.
+    """
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS job_slot_intervals
+            USING rtree_i32(id, week_start, week_end)
+        ''')
+    except sqlite3.OperationalError:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS job_slot_intervals (
+                id INTEGER PRIMARY KEY,
+                week_start INTEGER NOT NULL,
+                week_end INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_job_slot_intervals_start ON job_slot_intervals(week_start, week_end)')
+
+def backfill_time_slots(cursor):
+    """Parse the time_slot text of existing jobs into the structured columns"""
+    cursor.execute('SELECT DISTINCT time_slot FROM jobs WHERE time_slot IS NOT NULL')
+    for (text,) in cursor.fetchall():
+        slot = time_slots.parse_time_slot(text)
+        if slot:
+            cursor.execute(
+                'UPDATE jobs SET slot_days = ?, slot_start = ?, slot_end = ? WHERE time_slot = ?',
+                slot + (text,)
+            )
+
+def backfill_salaries(cursor):
+    """Parse the salary text of existing jobs into hourly salary_min/salary_max"""
+    cursor.execute('SELECT DISTINCT salary FROM jobs WHERE salary IS NOT NULL')
+    for (text,) in cursor.fetchall():
+        salary = salaries.parse_salary(text) or (None, None, None)
+        # Rows already holding these values are left alone (no sync or counter bump)
+        cursor.execute('''
+            UPDATE jobs SET salary_min = ?, salary_max = ?, salary_period = ?
+            WHERE salary = ? AND (salary_min IS NOT ? OR salary_max IS NOT ? OR salary_period IS NOT ?)
+        ''', salary + (text,) + salary)
+
+def job_facet_values(row, source=''):
+    """Facet values of a jobs row as (facet, value) rows, mirrored by facets.py"""
+    return f'''
+        SELECT 'job_type' AS facet, COALESCE(NULLIF({row}.job_type, ''), 'unspecified') AS value {source}
+        UNION ALL
+        SELECT 'time_slot', CASE
+            WHEN {row}.slot_days IS NULL THEN 'unspecified'
+            WHEN {row}.slot_days & 31 = 0 THEN 'weekend'
+            WHEN {row}.slot_start < 720 THEN 'morning'
+            WHEN {row}.slot_start < 1020 THEN 'afternoon'
+            WHEN {row}.slot_start < 1260 THEN 'evening'
+            ELSE 'night' END {source}
+        UNION ALL
+        SELECT 'salary_band', CASE
+            WHEN {row}.salary_min IS NULL THEN 'unspecified'
+            WHEN {row}.salary_min < 15 THEN 'under_15'
+            WHEN {row}.salary_min < 20 THEN '15_20'
+            WHEN {row}.salary_min < 25 THEN '20_25'
+            WHEN {row}.salary_min < 30 THEN '25_30'
+            ELSE '30_plus' END {source}
+        UNION ALL
+        SELECT 'location', COALESCE(CAST({row}.location_id AS TEXT), 'custom') {source}
+    '''
+
+def facet_count_change(row, delta):
+    """Trigger body adding delta to the facet counts of an open jobs row"""
+    return f'''
+        INSERT INTO job_facet_counts (facet, value, count)
+        SELECT facet, value, {delta} FROM ({job_facet_values(row)}) WHERE {row}.status = 'open'
+        ON CONFLICT (facet, value) DO UPDATE SET count = count + excluded.count;
+    '''
+
+# Talent density grid: 0.01 degree cells, indexes offset so they are never negative
+# (a CAST truncates, which is then the same as floor). database.TALENT_GRID_SCALE matches.
+TALENT_CELL_Y = 'CAST(({row}.latitude + 90) * 100 AS INTEGER)'
+TALENT_CELL_X = 'CAST(({row}.longitude + 180) * 100 AS INTEGER)'
+TALENT_LOCATED = '{row}.latitude IS NOT NULL AND {row}.longitude IS NOT NULL AND {row}.latitude != 0 AND {row}.longitude != 0'
+# Skills as a JSON array, anything else counts as no skills
+TALENT_SKILLS = "json_each(CASE WHEN json_valid({row}.skills) AND json_type({row}.skills) = 'array' THEN {row}.skills ELSE '[]' END)"
+
+def talent_density_change(row, delta):
+    """Trigger body adding delta to the density cells of an employees row.
+
+    Every located employee counts under skill '' (everyone) and once under
+    each distinct skill, lowercased.
+    """
+    cell_y, cell_x = TALENT_CELL_Y.format(row=row), TALENT_CELL_X.format(row=row)
+    return f'''
+        INSERT INTO talent_density (skill, cell_y, cell_x, count)
+        SELECT skill, {cell_y}, {cell_x}, {delta} FROM (
+            SELECT '' AS skill
+            UNION
+            SELECT lower(trim(value)) FROM {TALENT_SKILLS.format(row=row)}
+            WHERE type = 'text' AND trim(value) != ''
+        )
+        WHERE {TALENT_LOCATED.format(row=row)}
+        ON CONFLICT (skill, cell_y, cell_x) DO UPDATE SET count = count + excluded.count;
+    '''
+
+TALENT_DENSITY_BACKFILL = f'''
+    INSERT OR REPLACE INTO talent_density (skill, cell_y, cell_x, count)
+    SELECT skill, cell_y, cell_x, COUNT(*) FROM (
+        SELECT e.id, '' AS skill, {TALENT_CELL_Y.format(row='e')} AS cell_y, {TALENT_CELL_X.format(row='e')} AS cell_x
+        FROM employees e WHERE {TALENT_LOCATED.format(row='e')}
+        UNION
+        SELECT e.id, lower(trim(s.value)), {TALENT_CELL_Y.format(row='e')}, {TALENT_CELL_X.format(row='e')}
+        FROM employees e, {TALENT_SKILLS.format(row='e')} s
+        WHERE {TALENT_LOCATED.format(row='e')} AND s.type = 'text' AND trim(s.value) != ''
+    )
+    GROUP BY skill, cell_y, cell_x
+'''
+
+def application_count_change(row, sign):
+    """Trigger body applying an applications row to its job's counters"""
+    return f'''
+        UPDATE jobs SET
+            application_count = application_count {sign} 1,
+            waiting_count = waiting_count {sign} ({row}.status = 'waiting'),
+            accepted_count = accepted_count {sign} ({row}.status = 'accepted'),
+            rejected_count = rejected_count {sign} ({row}.status = 'rejected')
+        WHERE id = {row}.job_id;
+    '''
+
+# One interval per weekday in the mask, in minutes of the week (none when slot_days is NULL)
+SLOT_INTERVALS_INSERT = '''
+    INSERT INTO job_slot_intervals (id, week_start, week_end)
+    SELECT NEW.id * 8 + day, day * 1440 + NEW.slot_start, day * 1440 + NEW.slot_end
+    FROM (SELECT 0 AS day UNION ALL SELECT 1 UNION ALL SELECT 2 UNION ALL SELECT 3
+          UNION ALL SELECT 4 UNION ALL SELECT 5 UNION ALL SELECT 6)
+    WHERE NEW.slot_days & (1 << day);
+'''
+
+MIGRATIONS = [
+    {
+        "version": 1,
+        "description": "Initial schema",
+        "statements": [
+            # Employers Table
+            '''
+            CREATE TABLE IF NOT EXISTS employers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                email TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                company_name TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            'CREATE INDEX IF NOT EXISTS idx_employers_email ON employers(email)',
+            # Employees Table, skills are stored as a JSON array (["Python", "SQL"])
+            '''
+            CREATE TABLE IF NOT EXISTS employees (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                email TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                dob DATE NOT NULL,
+                education TEXT NOT NULL,
+                skills TEXT,
+                experience INTEGER DEFAULT 0,
+                latitude REAL,
+                longitude REAL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            'CREATE INDEX IF NOT EXISTS idx_employees_email ON employees(email)',
+            # Jobs Table
+            '''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                employer_id INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                description TEXT,
+                salary TEXT,
+                job_type TEXT DEFAULT 'Part-time',
+                time_slot TEXT,
+                latitude REAL,
+                longitude REAL,
+                status TEXT DEFAULT 'open',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (employer_id) REFERENCES employers(id) ON DELETE CASCADE
+            )
+            ''',
+            'CREATE INDEX IF NOT EXISTS idx_jobs_employer ON jobs(employer_id)',
+            # Applications Table
+            '''
+            CREATE TABLE IF NOT EXISTS applications (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id INTEGER NOT NULL,
+                employee_id INTEGER NOT NULL,
+                status TEXT DEFAULT 'waiting',
+                cover_letter TEXT,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (job_id) REFERENCES jobs(id) ON DELETE CASCADE,
+                FOREIGN KEY (employee_id) REFERENCES employees(id) ON DELETE CASCADE
+            )
+            ''',
+            'CREATE INDEX IF NOT EXISTS idx_applications_job ON applications(job_id)',
+            'CREATE INDEX IF NOT EXISTS idx_applications_employee ON applications(employee_id)',
+            # Chat Table
+            '''
+            CREATE TABLE IF NOT EXISTS chat (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                employee_id INTEGER NOT NULL,
+                question TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (employee_id) REFERENCES employees(id) ON DELETE CASCADE
+            )
+            ''',
+            'CREATE INDEX IF NOT EXISTS idx_chat_employee ON chat(employee_id)',
+        ],
+        "indexes": [],
+    },
+    {
+        "version": 2,
+        "description": "Change counter for the in-memory job catalogue",
+        "statements": [
+            '''
+            CREATE TABLE IF NOT EXISTS change_counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0
+            )
+            ''',
+            "INSERT OR IGNORE INTO change_counters (name, value) VALUES ('jobs', 0)",
+            # Only columns the catalogue holds count as a change
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_jobs_counter_insert AFTER INSERT ON jobs
+            BEGIN
+                UPDATE change_counters SET value = value + 1 WHERE name = 'jobs';
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_jobs_counter_update
+            AFTER UPDATE OF employer_id, title, description, salary, job_type, time_slot,
+                            latitude, longitude, status, created_at ON jobs
+            BEGIN
+                UPDATE change_counters SET value = value + 1 WHERE name = 'jobs';
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_jobs_counter_delete AFTER DELETE ON jobs
+            BEGIN
+                UPDATE change_counters SET value = value + 1 WHERE name = 'jobs';
+            END
+            ''',
+            # Listings include the employer and company name
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_employers_counter_update
+            AFTER UPDATE OF name, company_name ON employers
+            BEGIN
+                UPDATE change_counters SET value = value + 1 WHERE name = 'jobs';
+            END
+            ''',
+        ],
+        "indexes": [
+            ("idx_jobs_status_created", "CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs(status, created_at)"),
+        ],
+    },
+    {
+        "version": 3,
+        "description": "Predefined location ids on jobs and employees",
+        "statements": [
+            'ALTER TABLE jobs ADD COLUMN location_id INTEGER',
+            'ALTER TABLE employees ADD COLUMN location_id INTEGER',
+            backfill_location_ids,
+            "INSERT OR IGNORE INTO change_counters (name, value) VALUES ('employees', 0)",
+            # Location changes of employees invalidate the per-location buckets in other processes
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_employees_counter_insert AFTER INSERT ON employees
+            BEGIN
+                UPDATE change_counters SET value = value + 1 WHERE name = 'employees';
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_employees_counter_update
+            AFTER UPDATE OF latitude, longitude, location_id ON employees
+            BEGIN
+                UPDATE change_counters SET value = value + 1 WHERE name = 'employees';
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_employees_counter_delete AFTER DELETE ON employees
+            BEGIN
+                UPDATE change_counters SET value = value + 1 WHERE name = 'employees';
+            END
+            ''',
+            # The catalogue holds location_id as well
+            'DROP TRIGGER IF EXISTS trg_jobs_counter_update',
+            '''
+            CREATE TRIGGER trg_jobs_counter_update
+            AFTER UPDATE OF employer_id, title, description, salary, job_type, time_slot,
+                            latitude, longitude, location_id, status, created_at ON jobs
+            BEGIN
+                UPDATE change_counters SET value = value + 1 WHERE name = 'jobs';
+            END
+            ''',
+        ],
+        "indexes": [
+            ("idx_jobs_location", "CREATE INDEX IF NOT EXISTS idx_jobs_location ON jobs(location_id)"),
+            ("idx_employees_location", "CREATE INDEX IF NOT EXISTS idx_employees_location ON employees(location_id)"),
+        ],
+    },
+    {
+        "version": 4,
+        "description": "Structured time slots with an interval index",
+        "statements": [
+            'ALTER TABLE jobs ADD COLUMN slot_days INTEGER',
+            'ALTER TABLE jobs ADD COLUMN slot_start INTEGER',
+            'ALTER TABLE jobs ADD COLUMN slot_end INTEGER',
+            create_slot_index,
+            # The intervals follow the structured columns
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_jobs_slot_insert AFTER INSERT ON jobs
+            WHEN NEW.slot_days IS NOT NULL
+            BEGIN
+            ''' + SLOT_INTERVALS_INSERT + '''
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_jobs_slot_update
+            AFTER UPDATE OF slot_days, slot_start, slot_end ON jobs
+            BEGIN
+                DELETE FROM job_slot_intervals WHERE id BETWEEN OLD.id * 8 AND OLD.id * 8 + 7;
+            ''' + SLOT_INTERVALS_INSERT + '''
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_jobs_slot_delete AFTER DELETE ON jobs
+            BEGIN
+                DELETE FROM job_slot_intervals WHERE id BETWEEN OLD.id * 8 AND OLD.id * 8 + 7;
+            END
+            ''',
+            backfill_time_slots,
+            # The catalogue holds the structured slot as well
+            'DROP TRIGGER IF EXISTS trg_jobs_counter_update',
+            '''
+            CREATE TRIGGER trg_jobs_counter_update
+            AFTER UPDATE OF employer_id, title, description, salary, job_type, time_slot,
+                            slot_days, slot_start, slot_end,
+                            latitude, longitude, location_id, status, created_at ON jobs
+            BEGIN
+                UPDATE change_counters SET value = value + 1 WHERE name = 'jobs';
+            END
+            ''',
+        ],
+        "indexes": [],
+    },
+    {
+        "version": 5,
+        "description": "Numeric hourly salary ranges",
+        "statements": [
+            'ALTER TABLE jobs ADD COLUMN salary_min REAL',
+            'ALTER TABLE jobs ADD COLUMN salary_max REAL',
+            'ALTER TABLE jobs ADD COLUMN salary_period TEXT',
+            backfill_salaries,
+            'DROP TRIGGER IF EXISTS trg_jobs_counter_update',
+            '''
+            CREATE TRIGGER trg_jobs_counter_update
+            AFTER UPDATE OF employer_id, title, description, salary, salary_min, salary_max, salary_period,
+                            job_type, time_slot, slot_days, slot_start, slot_end,
+                            latitude, longitude, location_id, status, created_at ON jobs
+            BEGIN
+                UPDATE change_counters SET value = value + 1 WHERE name = 'jobs';
+            END
+            ''',
+        ],
+        "indexes": [
+            # min_salary= filters and sort=salary over open jobs walk this index
+            ("idx_jobs_status_salary",
+             "CREATE INDEX IF NOT EXISTS idx_jobs_status_salary ON jobs(status, salary_min, created_at)"),
+        ],
+    },
+    {
+        "version": 6,
+        "description": "Facet counts of open jobs",
+        "statements": [
+            '''
+            CREATE TABLE IF NOT EXISTS job_facet_counts (
+                facet TEXT NOT NULL,
+                value TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (facet, value)
+            ) WITHOUT ROWID
+            ''',
+            '''
+            INSERT OR REPLACE INTO job_facet_counts (facet, value, count)
+            SELECT facet, value, COUNT(*) FROM (''' + job_facet_values('jobs', "FROM jobs WHERE status = 'open'") + ''')
+            GROUP BY facet, value
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_jobs_facets_insert AFTER INSERT ON jobs
+            BEGIN
+            ''' + facet_count_change('NEW', 1) + '''
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_jobs_facets_update
+            AFTER UPDATE OF status, job_type, slot_days, slot_start, salary_min, location_id ON jobs
+            BEGIN
+            ''' + facet_count_change('OLD', -1) + facet_count_change('NEW', 1) + '''
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_jobs_facets_delete AFTER DELETE ON jobs
+            BEGIN
+            ''' + facet_count_change('OLD', -1) + '''
+            END
+            ''',
+        ],
+        "indexes": [],
+    },
+    {
+        "version": 7,
+        "description": "Precomputed employee job feeds",
+        "statements": [
+            '''
+            CREATE TABLE IF NOT EXISTS employee_feed (
+                employee_id INTEGER NOT NULL,
+                job_id INTEGER NOT NULL,
+                score REAL NOT NULL,
+                distance REAL,
+                PRIMARY KEY (employee_id, job_id)
+            ) WITHOUT ROWID
+            ''',
+            # Serving a feed reads this index in order
+            'CREATE INDEX IF NOT EXISTS idx_employee_feed_score ON employee_feed(employee_id, score DESC, job_id DESC)',
+            'CREATE INDEX IF NOT EXISTS idx_employee_feed_job ON employee_feed(job_id)',
+            # Employees whose feed has been computed (an empty feed is still computed)
+            '''
+            CREATE TABLE IF NOT EXISTS employee_feed_state (
+                employee_id INTEGER PRIMARY KEY,
+                computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_jobs_feed_delete AFTER DELETE ON jobs
+            BEGIN
+                DELETE FROM employee_feed WHERE job_id = OLD.id;
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_employees_feed_delete AFTER DELETE ON employees
+            BEGIN
+                DELETE FROM employee_feed WHERE employee_id = OLD.id;
+                DELETE FROM employee_feed_state WHERE employee_id = OLD.id;
+            END
+            ''',
+        ],
+        "indexes": [],
+    },
+    {
+        "version": 8,
+        "description": "Talent density rollup",
+        "statements": [
+            '''
+            CREATE TABLE IF NOT EXISTS talent_density (
+                skill TEXT NOT NULL,
+                cell_y INTEGER NOT NULL,
+                cell_x INTEGER NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (skill, cell_y, cell_x)
+            ) WITHOUT ROWID
+            ''',
+            TALENT_DENSITY_BACKFILL,
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_employees_density_insert AFTER INSERT ON employees
+            BEGIN
+            ''' + talent_density_change('NEW', 1) + '''
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_employees_density_update
+            AFTER UPDATE OF latitude, longitude, skills ON employees
+            BEGIN
+            ''' + talent_density_change('OLD', -1) + talent_density_change('NEW', 1) + '''
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_employees_density_delete AFTER DELETE ON employees
+            BEGIN
+            ''' + talent_density_change('OLD', -1) + '''
+            END
+            ''',
+        ],
+        "indexes": [],
+    },
+    {
+        "version": 9,
+        "description": "Application counters on jobs",
+        "statements": [
+            'ALTER TABLE jobs ADD COLUMN application_count INTEGER NOT NULL DEFAULT 0',
+            'ALTER TABLE jobs ADD COLUMN waiting_count INTEGER NOT NULL DEFAULT 0',
+            'ALTER TABLE jobs ADD COLUMN accepted_count INTEGER NOT NULL DEFAULT 0',
+            'ALTER TABLE jobs ADD COLUMN rejected_count INTEGER NOT NULL DEFAULT 0',
+            '''
+            UPDATE jobs SET
+                application_count = c.total,
+                waiting_count = c.waiting,
+                accepted_count = c.accepted,
+                rejected_count = c.rejected
+            FROM (
+                SELECT job_id, COUNT(*) AS total,
+                       SUM(status = 'waiting') AS waiting,
+                       SUM(status = 'accepted') AS accepted,
+                       SUM(status = 'rejected') AS rejected
+                FROM applications GROUP BY job_id
+            ) AS c
+            WHERE jobs.id = c.job_id
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_applications_counts_insert AFTER INSERT ON applications
+            BEGIN
+            ''' + application_count_change('NEW', '+') + '''
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_applications_counts_update
+            AFTER UPDATE OF status, job_id ON applications
+            BEGIN
+            ''' + application_count_change('OLD', '-') + application_count_change('NEW', '+') + '''
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_applications_counts_delete AFTER DELETE ON applications
+            BEGIN
+            ''' + application_count_change('OLD', '-') + '''
+            END
+            ''',
+        ],
+        "indexes": [
+            # Covers the employer stats read, no table lookups
+            ("idx_jobs_employer_stats",
+             '''CREATE INDEX IF NOT EXISTS idx_jobs_employer_stats ON jobs(employer_id, created_at, id, title, status,
+                application_count, waiting_count, accepted_count, rejected_count)'''),
+        ],
+    },
+    {
+        "version": 10,
+        "description": "Daily application and posting rollups",
+        "statements": [
+            '''
+            CREATE TABLE IF NOT EXISTS application_daily (
+                job_id INTEGER NOT NULL,
+                day TEXT NOT NULL,
+                employer_id INTEGER NOT NULL,
+                applications INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (job_id, day)
+            ) WITHOUT ROWID
+            ''',
+            'CREATE INDEX IF NOT EXISTS idx_application_daily_employer ON application_daily(employer_id, day)',
+            '''
+            CREATE TABLE IF NOT EXISTS posting_daily (
+                employer_id INTEGER NOT NULL,
+                day TEXT NOT NULL,
+                postings INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (employer_id, day)
+            ) WITHOUT ROWID
+            ''',
+            rollups.rebuild,
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_applications_daily_insert AFTER INSERT ON applications
+            BEGIN
+            ''' + rollups.application_change('NEW', 1) + '''
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_applications_daily_update
+            AFTER UPDATE OF job_id, applied_at ON applications
+            BEGIN
+            ''' + rollups.application_change('OLD', -1) + rollups.application_change('NEW', 1) + '''
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_applications_daily_delete AFTER DELETE ON applications
+            BEGIN
+            ''' + rollups.application_change('OLD', -1) + '''
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_jobs_daily_insert AFTER INSERT ON jobs
+            BEGIN
+            ''' + rollups.posting_change('NEW', 1) + '''
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_jobs_daily_update
+            AFTER UPDATE OF employer_id, created_at ON jobs
+            BEGIN
+            ''' + rollups.posting_change('OLD', -1) + rollups.posting_change('NEW', 1) + '''
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_jobs_daily_delete AFTER DELETE ON jobs
+            BEGIN
+            ''' + rollups.posting_change('OLD', -1) + '''
+                DELETE FROM application_daily WHERE job_id = OLD.id;
+            END
+            ''',
+        ],
+        "indexes": [],
+    },
+    {
+        "version": 11,
+        "description": "Descriptions and cover letters in compressed side tables",
+        "statements": [
+            'ALTER TABLE jobs ADD COLUMN summary TEXT',
+            '''
+            CREATE TABLE IF NOT EXISTS job_texts (
+                job_id INTEGER PRIMARY KEY,
+                description BLOB,
+                compressed INTEGER NOT NULL DEFAULT 0
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS application_texts (
+                application_id INTEGER PRIMARY KEY,
+                cover_letter BLOB,
+                compressed INTEGER NOT NULL DEFAULT 0
+            )
+            ''',
+            # The moved columns stay (NULL from now on): the older triggers still name description
+            'DROP TRIGGER IF EXISTS trg_jobs_counter_update',
+            texts.move_texts,
+            '''
+            CREATE TRIGGER trg_jobs_counter_update
+            AFTER UPDATE OF employer_id, title, summary, salary, salary_min, salary_max, salary_period,
+                            job_type, time_slot, slot_days, slot_start, slot_end,
+                            latitude, longitude, location_id, status, created_at ON jobs
+            BEGIN
+                UPDATE change_counters SET value = value + 1 WHERE name = 'jobs';
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_jobs_texts_delete AFTER DELETE ON jobs
+            BEGIN
+                DELETE FROM job_texts WHERE job_id = OLD.id;
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_applications_texts_delete AFTER DELETE ON applications
+            BEGIN
+                DELETE FROM application_texts WHERE application_id = OLD.id;
+            END
+            ''',
+        ],
+        "indexes": [],
+    },
+    {
+        "version": 12,
+        "description": "Event outbox for server-sent events",
+        "statements": [
+            '''
+            CREATE TABLE IF NOT EXISTS event_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_type TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                event TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                origin INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            # Replays after a reconnect (Last-Event-ID)
+            'CREATE INDEX IF NOT EXISTS idx_event_outbox_user ON event_outbox(user_type, user_id, id)',
+        ],
+        "indexes": [],
+    },
+    {
+        "version": 13,
+        "description": "Sync sequence, updated_at and tombstones for delta sync",
+        "statements": [
+            # Existing rows share sequence 1, so since=0 returns all of them
+            "INSERT OR IGNORE INTO change_counters (name, value) VALUES ('sync', 1)",
+            'ALTER TABLE jobs ADD COLUMN sync_seq INTEGER NOT NULL DEFAULT 1',
+            'ALTER TABLE jobs ADD COLUMN updated_at TIMESTAMP',
+            'UPDATE jobs SET updated_at = created_at',
+            'ALTER TABLE applications ADD COLUMN sync_seq INTEGER NOT NULL DEFAULT 1',
+            'ALTER TABLE applications ADD COLUMN updated_at TIMESTAMP',
+            'UPDATE applications SET updated_at = applied_at',
+            '''
+            CREATE TABLE IF NOT EXISTS sync_tombstones (
+                seq INTEGER PRIMARY KEY,
+                table_name TEXT NOT NULL,
+                row_id INTEGER NOT NULL,
+                employer_id INTEGER,
+                deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_jobs_sync_insert AFTER INSERT ON jobs
+            BEGIN
+            ''' + sync.next_seq_sql('jobs', 'id = NEW.id') + '''
+            END
+            ''',
+            # Listed columns only: the application counters and sync_seq itself are not a change
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_jobs_sync_update
+            AFTER UPDATE OF employer_id, title, summary, salary, salary_min, salary_max, salary_period,
+                            job_type, time_slot, slot_days, slot_start, slot_end,
+                            latitude, longitude, location_id, status, created_at ON jobs
+            BEGIN
+            ''' + sync.next_seq_sql('jobs', 'id = NEW.id') + '''
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_jobs_sync_delete AFTER DELETE ON jobs
+            BEGIN
+            ''' + sync.tombstone_sql('jobs', 'OLD.id', 'OLD.employer_id') + '''
+            END
+            ''',
+            # Job listings include the employer and company name
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_employers_sync_update
+            AFTER UPDATE OF name, company_name ON employers
+            BEGIN
+            ''' + sync.next_seq_sql('jobs', 'employer_id = NEW.id') + '''
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_applications_sync_insert AFTER INSERT ON applications
+            BEGIN
+            ''' + sync.next_seq_sql('applications', 'id = NEW.id') + '''
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_applications_sync_update
+            AFTER UPDATE OF job_id, employee_id, status, applied_at ON applications
+            BEGIN
+            ''' + sync.next_seq_sql('applications', 'id = NEW.id') + '''
+            END
+            ''',
+            # delete_job removes the applications before the job, so the employer is still known
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_applications_sync_delete AFTER DELETE ON applications
+            BEGIN
+            ''' + sync.tombstone_sql('applications', 'OLD.id',
+                                      '(SELECT employer_id FROM jobs WHERE id = OLD.job_id)') + '''
+            END
+            ''',
+        ],
+        "indexes": [
+            ("idx_jobs_sync", "CREATE INDEX IF NOT EXISTS idx_jobs_sync ON jobs(sync_seq)"),
+            ("idx_applications_sync", "CREATE INDEX IF NOT EXISTS idx_applications_sync ON applications(sync_seq)"),
+        ],
+    },
+    {
+        "version": 14,
+        "description": "Archive tables for long-closed jobs and their applications",
+        "statements": [
+            # Same column names as the hot tables, so lookups only swap the table name
+            '''
+            CREATE TABLE IF NOT EXISTS archived_jobs (
+                id INTEGER PRIMARY KEY,
+                employer_id INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                summary TEXT,
+                salary TEXT,
+                job_type TEXT,
+                time_slot TEXT,
+                latitude REAL,
+                longitude REAL,
+                status TEXT,
+                created_at TIMESTAMP,
+                updated_at TIMESTAMP,
+                location_id INTEGER,
+                slot_days INTEGER,
+                slot_start INTEGER,
+                slot_end INTEGER,
+                salary_min REAL,
+                salary_max REAL,
+                salary_period TEXT,
+                application_count INTEGER NOT NULL DEFAULT 0,
+                waiting_count INTEGER NOT NULL DEFAULT 0,
+                accepted_count INTEGER NOT NULL DEFAULT 0,
+                rejected_count INTEGER NOT NULL DEFAULT 0,
+                archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS archived_applications (
+                id INTEGER PRIMARY KEY,
+                job_id INTEGER NOT NULL,
+                employee_id INTEGER NOT NULL,
+                status TEXT,
+                applied_at TIMESTAMP,
+                updated_at TIMESTAMP,
+                archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS archived_job_texts (
+                job_id INTEGER PRIMARY KEY,
+                description BLOB,
+                compressed INTEGER NOT NULL DEFAULT 0
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS archived_application_texts (
+                application_id INTEGER PRIMARY KEY,
+                cover_letter BLOB,
+                compressed INTEGER NOT NULL DEFAULT 0
+            )
+            ''',
+            # Ids of the batch being archived, empty outside an archive transaction
+            'CREATE TABLE IF NOT EXISTS archive_batch (job_id INTEGER PRIMARY KEY)',
+            # Archived rows still count in the daily trends
+            'DROP TRIGGER IF EXISTS trg_applications_daily_delete',
+            '''
+            CREATE TRIGGER trg_applications_daily_delete AFTER DELETE ON applications
+            WHEN OLD.job_id NOT IN (SELECT job_id FROM archive_batch)
+            BEGIN
+            ''' + rollups.application_change('OLD', -1) + '''
+            END
+            ''',
+            'DROP TRIGGER IF EXISTS trg_jobs_daily_delete',
+            '''
+            CREATE TRIGGER trg_jobs_daily_delete AFTER DELETE ON jobs
+            WHEN OLD.id NOT IN (SELECT job_id FROM archive_batch)
+            BEGIN
+            ''' + rollups.posting_change('OLD', -1) + '''
+                DELETE FROM application_daily WHERE job_id = OLD.id;
+            END
+            ''',
+        ],
+        # The archive candidates index is built by migration 17 (closed_at)
+        "indexes": [],
+    },
+    {
+        "version": 15,
+        "description": "Chat history pages and per-employee summaries",
+        "statements": [
+            '''
+            CREATE TABLE IF NOT EXISTS chat_summaries (
+                employee_id INTEGER PRIMARY KEY,
+                exchanges INTEGER NOT NULL DEFAULT 0,
+                first_at TIMESTAMP,
+                last_at TIMESTAMP,
+                recent_questions TEXT NOT NULL DEFAULT '[]',
+                compacted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_employees_chat_summary_delete AFTER DELETE ON employees
+            BEGIN
+                DELETE FROM chat_summaries WHERE employee_id = OLD.id;
+            END
+            ''',
+        ],
+        "indexes": [
+            # Newest-first pages with a (created_at, id) cursor, no sorting
+            ("idx_chat_employee_created",
+             "CREATE INDEX IF NOT EXISTS idx_chat_employee_created ON chat(employee_id, created_at, id)"),
+        ],
+    },
+    {
+        "version": 16,
+        "description": "Salaries re-parsed, only currency amounts and ranges paired",
+        "statements": [
+            backfill_salaries,
+        ],
+        "indexes": [],
+    },
+    {
+        "version": 17,
+        "description": "Closing time of jobs for the archive",
+        "statements": [
+            'ALTER TABLE jobs ADD COLUMN closed_at TIMESTAMP',
+            'ALTER TABLE archived_jobs ADD COLUMN closed_at TIMESTAMP',
+            # When already closed jobs were closed is unknown: their archive clock starts now
+            "UPDATE jobs SET closed_at = CURRENT_TIMESTAMP WHERE status != 'open'",
+            # Set when a job stops being open, cleared when it reopens; moves between closed statuses keep it
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_jobs_closed_insert AFTER INSERT ON jobs
+            WHEN NEW.status != 'open'
+            BEGIN
+                UPDATE jobs SET closed_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_jobs_closed_update AFTER UPDATE OF status ON jobs
+            WHEN (OLD.status = 'open') != (NEW.status = 'open')
+            BEGIN
+                UPDATE jobs SET closed_at = CASE WHEN NEW.status = 'open' THEN NULL ELSE CURRENT_TIMESTAMP END
+                WHERE id = NEW.id;
+            END
+            ''',
+            # Replaced by idx_jobs_closed (databases migrated before this version)
+            'DROP INDEX IF EXISTS idx_jobs_archivable',
+        ],
+        "indexes": [
+            # Only closed jobs are candidates, the open ones stay out of the index
+            ("idx_jobs_closed",
+             "CREATE INDEX IF NOT EXISTS idx_jobs_closed ON jobs(closed_at) WHERE status != 'open'"),
+        ],
+    },
+    {
+        "version": 18,
+        "description": "Feeds drop closed jobs and are refilled from a queue",
+        "statements": [
+            # Employees whose feed lost a job, recomputed by feed.refill()
+            'CREATE TABLE IF NOT EXISTS feed_refills (employee_id INTEGER PRIMARY KEY)',
+            # Reopened jobs, scored into the feeds like new ones
+            'CREATE TABLE IF NOT EXISTS feed_reopened_jobs (job_id INTEGER PRIMARY KEY)',
+            'DROP TRIGGER IF EXISTS trg_jobs_feed_delete',
+            '''
+            CREATE TRIGGER trg_jobs_feed_delete AFTER DELETE ON jobs
+            BEGIN
+                INSERT OR IGNORE INTO feed_refills (employee_id)
+                SELECT employee_id FROM employee_feed WHERE job_id = OLD.id;
+                DELETE FROM employee_feed WHERE job_id = OLD.id;
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_jobs_feed_closed AFTER UPDATE OF status ON jobs
+            WHEN OLD.status = 'open' AND NEW.status != 'open'
+            BEGIN
+                INSERT OR IGNORE INTO feed_refills (employee_id)
+                SELECT employee_id FROM employee_feed WHERE job_id = NEW.id;
+                DELETE FROM employee_feed WHERE job_id = NEW.id;
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_jobs_feed_reopened AFTER UPDATE OF status ON jobs
+            WHEN OLD.status != 'open' AND NEW.status = 'open'
+            BEGIN
+                INSERT OR IGNORE INTO feed_reopened_jobs (job_id) VALUES (NEW.id);
+            END
+            ''',
+            # Closed jobs already sitting in feeds
+            '''
+            INSERT OR IGNORE INTO feed_refills (employee_id)
+            SELECT f.employee_id FROM employee_feed f JOIN jobs j ON j.id = f.job_id WHERE j.status != 'open'
+            ''',
+            "DELETE FROM employee_feed WHERE job_id IN (SELECT id FROM jobs WHERE status != 'open')",
+        ],
+        "indexes": [],
+    },
+]
+
+LATEST_VERSION = MIGRATIONS[-1]["version"]
+
+def get_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def applied_versions(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    return {row[0] for row in conn.execute('SELECT version FROM schema_migrations')}
+
+def apply_statements(conn, pending):
+    """Run the statements of all pending migrations in a single transaction"""
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        for migration in pending:
+            for statement in migration["statements"]:
+                if callable(statement):
+                    statement(cursor)
+                else:
+                    cursor.execute(statement)
+            cursor.execute(
+                'INSERT INTO schema_migrations (version, description) VALUES (?, ?)',
+                (migration["version"], migration["description"])
+            )
+        cursor.execute('COMMIT')
+    except Exception:
+        cursor.execute('ROLLBACK')
+        raise
+
+# Seconds after which the index build claim of a process counts as abandoned
+BUILD_CLAIM_TIMEOUT = 3600
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def claim_index_builds(conn):
+    """Make this process the one building the pending indexes, False when another live process is"""
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_index_builds (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                pid INTEGER NOT NULL,
+                claimed_at REAL NOT NULL
+            )
+        ''')
+        row = cursor.execute('SELECT pid, claimed_at FROM schema_index_builds').fetchone()
+        if row and row[0] != os.getpid() and process_alive(row[0]) and time.time() - row[1] < BUILD_CLAIM_TIMEOUT:
+            cursor.execute('ROLLBACK')
+            return False
+        cursor.execute('INSERT OR REPLACE INTO schema_index_builds (id, pid, claimed_at) VALUES (1, ?, ?)',
+                       (os.getpid(), time.time()))
+        cursor.execute('COMMIT')
+        return True
+    except Exception:
+        cursor.execute('ROLLBACK')
+        raise
+
+def release_index_builds(conn):
+    conn.execute('DELETE FROM schema_index_builds WHERE pid = ?', (os.getpid(),))
+    conn.commit()
+
+def build_indexes(conn, migrations, target_version):
+    """Build the online indexes of the given migrations, then mark the schema current and release the claim"""
+    try:
+        for migration in migrations:
+            for name, sql in migration["indexes"]:
+                # One short write transaction per index, readers continue under WAL
+                conn.execute(sql)
+                # Keep the claim fresh while builds go on
+                conn.execute('UPDATE schema_index_builds SET claimed_at = ? WHERE pid = ?', (time.time(), os.getpid()))
+                conn.commit()
+                print(f"Built index {name}")
+        conn.execute(f'PRAGMA user_version = {int(target_version)}')
+        conn.commit()
+    finally:
+        # Also after a failure, so the next start retries
+        release_index_builds(conn)
+
+def migrate(conn, background_indexes=False, connect=None):
+    """Bring the database schema up to LATEST_VERSION.
+
+    Returns the list of migration versions applied in this call (empty when the
+    schema was already current). With background_indexes, index builds run in a
+    daemon thread on a new connection from `connect`.
+    """
+    current = get_version(conn)
+    if current >= LATEST_VERSION:
+        return []
+
+    # WAL lets readers in other worker processes continue while one process writes
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.commit()
+
+    done = applied_versions(conn)
+    pending = [m for m in MIGRATIONS if m["version"] not in done]
+    if pending:
+        apply_statements(conn, pending)
+        for migration in pending:
+            print(f"Applied migration {migration['version']}: {migration['description']}")
+
+    unindexed = [m for m in MIGRATIONS if m["version"] > current]
+    if not claim_index_builds(conn):
+        print("Indexes are being built by another process")
+        return [m["version"] for m in pending]
+    if background_indexes and connect and any(m["indexes"] for m in unindexed):
+        def run():
+            index_conn = connect()
+            try:
+                build_indexes(index_conn, unindexed, LATEST_VERSION)
+            except sqlite3.Error as e:
+                print(f"Error building indexes: {e}")
+            finally:
+                index_conn.close()
+        threading.Thread(target=run, name='index-builder', daemon=True).start()
+    else:
+        build_indexes(conn, unindexed, LATEST_VERSION)
+
+    return [m["version"] for m in pending]
+
+if __name__ == "__main__":
+    # python migrations.py [status|migrate]
+    import database as db
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'status'
+    conn = db.get_db_connection()
+    try:
+        if command == 'migrate':
+            applied = migrate(conn)
+            print(f"Applied migrations: {applied}" if applied else "Schema is current")
+        else:
+            print(f"Database: {db.DATABASE_PATH}")
+            print(f"Schema version: {get_version(conn)} (latest {LATEST_VERSION})")
+    finally:
+        conn.close()
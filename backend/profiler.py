@@ -0,0 +1,155 @@
+import cProfile
+import hashlib
+import hmac
+import os
+import re
+import sys
+import time
+
+# Header that carries the request signature for on-demand profiling
+PROFILE_HEADER = 'HTTP_X_PROFILE_SIGNATURE'
+
+# Longest validity of a signature in seconds, so a leaked header soon stops working
+SIGNATURE_TTL = 300
+
+def sign_request(secret_key, method, path, expires=None):
+    """Create the value expected in the X-Profile-Signature header.
+
+    The value is "<expires>:<signature>", where the signature is an
+    HMAC-SHA256 of "METHOD /path expires" keyed with the app's SECRET_KEY.
+    Only someone holding the key can profile a request, and only until the
+    expiry time (epoch seconds, at most SIGNATURE_TTL ahead).
+    """
+    if expires is None:
+        expires = int(time.time()) + SIGNATURE_TTL
+    message = f"{method.upper()} {path} {int(expires)}".encode('utf-8')
+    signature = hmac.new(secret_key.encode('utf-8'), message, hashlib.sha256).hexdigest()
+    return f"{int(expires)}:{signature}"
+
+def verify_signature(secret_key, method, path, value, now=None):
+    """Check an X-Profile-Signature value: valid HMAC and an expiry within the next SIGNATURE_TTL seconds"""
+    expires, _, signature = value.partition(':')
+    if not (expires.isascii() and expires.isdigit()) or not signature:
+        return False
+    now = time.time() if now is None else now
+    if not now <= int(expires) <= now + SIGNATURE_TTL:
+        return False
+    return hmac.compare_digest(value, sign_request(secret_key, method, path, int(expires)))
+
+def is_event_stream(headers):
+    return any(name.lower() == 'content-type' and value.startswith('text/event-stream')
+               for name, value in headers)
+
+class ProfilerMiddleware:
+    """WSGI middleware that profiles single requests with cProfile.
+
+    A request is profiled when it carries a valid X-Profile-Signature header
+    or when the PROFILE_ALL_REQUESTS admin flag is switched on in app.config.
+    Each profile is written as a pstats file into the spool directory and the
+    oldest files are removed once the spool holds more than the limit.
+    Server-Sent Event streams are passed through unprofiled.
+    """
+
+    def __init__(self, wsgi_app, flask_app, spool_dir, limit=50):
+        self.wsgi_app = wsgi_app
+        self.flask_app = flask_app
+        self.spool_dir = spool_dir
+        self.limit = limit
+        os.makedirs(spool_dir, exist_ok=True)
+
+    def __call__(self, environ, start_response):
+        if not self.should_profile(environ):
+            return self.wsgi_app(environ, start_response)
+
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        headers = []
+
+        def capture_start_response(status, response_headers, exc_info=None):
+            headers.extend(response_headers)
+            return start_response(status, response_headers, exc_info)
+
+        response = profile.runcall(self.wsgi_app, environ, capture_start_response)
+        if is_event_stream(headers):
+            # Event streams run for minutes, consuming one here would block the worker
+            return response
+        # Consume the response body inside the profiler so streamed work is included
+        try:
+            body = profile.runcall(list, response)
+        finally:
+            if hasattr(response, 'close'):
+                response.close()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        try:
+            self.write_profile(profile, environ, elapsed_ms)
+        except OSError as e:
+            print(f"Error writing request profile: {e}")
+
+        return body
+
+    def should_profile(self, environ):
+        if self.flask_app.config.get('PROFILE_ALL_REQUESTS'):
+            return True
+
+        signature = environ.get(PROFILE_HEADER)
+        if not signature:
+            return False
+
+        return verify_signature(
+            self.flask_app.config['SECRET_KEY'],
+            environ.get('REQUEST_METHOD', 'GET'),
+            environ.get('PATH_INFO', '/'),
+            signature
+        )
+
+    def write_profile(self, profile, environ, elapsed_ms):
+        path_slug = re.sub(r'[^A-Za-z0-9]+', '_', environ.get('PATH_INFO', '/')).strip('_') or 'root'
+        filename = '{:.6f}-{}-{}-{:.0f}ms.prof'.format(
+            time.time(),
+            environ.get('REQUEST_METHOD', 'GET'),
+            path_slug[:80],
+            elapsed_ms
+        )
+        profile.dump_stats(os.path.join(self.spool_dir, filename))
+        self.rotate()
+
+    def rotate(self):
+        """Keep only the newest `limit` profiles in the spool directory."""
+        profiles = sorted(
+            name for name in os.listdir(self.spool_dir) if name.endswith('.prof')
+        )
+        # File names start with the timestamp, so lexical order is age order
+        for name in profiles[:-self.limit] if self.limit > 0 else profiles:
+            try:
+                os.remove(os.path.join(self.spool_dir, name))
+            except FileNotFoundError:
+                pass
+
+def init_app(app):
+    """Install the profiler on a Flask app when a spool directory is configured.
+
+    Nothing is wrapped when PROFILE_SPOOL_DIR is unset, so requests pay no
+    overhead at all unless profiling has been enabled for the deployment.
+    """
+    spool_dir = app.config.get('PROFILE_SPOOL_DIR')
+    if not spool_dir:
+        return False
+
+    app.wsgi_app = ProfilerMiddleware(
+        app.wsgi_app,
+        app,
+        spool_dir,
+        app.config.get('PROFILE_SPOOL_LIMIT', 50)
+    )
+    print(f"Request profiling enabled, writing profiles to {spool_dir}")
+    return True
+
+if __name__ == "__main__":
+    # Print a signature for profiling one request within the next SIGNATURE_TTL seconds, e.g.
+    #   python profiler.py SECRET GET /api/employers/3/applications
+    # Inspect the output with: python -m pstats <file>.prof
+    if len(sys.argv) != 4:
+        print("Usage: python profiler.py <secret_key> <method> <path>")
+        sys.exit(1)
+    print(sign_request(sys.argv[1], sys.argv[2], sys.argv[3]))
@@ -0,0 +1,117 @@
+"""
+Daily rollups of applications and job postings.
+
+    application_daily  (job_id, day) -> applications, with the job's employer_id
+    posting_daily      (employer_id, day) -> postings
+
+Triggers (migration 10) keep both current on every insert and delete, so
+trend queries read a few rollup rows instead of grouping the whole history.
+Rows are keyed by the UTC day of applied_at / created_at.
+
+The rebuild job recomputes a day range from the base tables, including the
+archive tables once they exist (archived jobs keep counting in the trends,
+see archive.py). It backfills the tables when the migration runs and repairs
+drift (for instance application rows of a job moved to another employer). Compaction drops rows
+whose count went back to zero after deletes:
+
+    python rollups.py rebuild [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+    python rollups.py compact
+"""
+import argparse
+
+def application_rollup_sql(sources):
+    """Day counts of applications from (applications, jobs) table pairs"""
+    rows = ' UNION ALL '.join(f'''
+        SELECT a.job_id, a.applied_at, j.employer_id FROM {applications} a JOIN {jobs} j ON j.id = a.job_id
+        WHERE date(a.applied_at) BETWEEN ? AND ?''' for applications, jobs in sources)
+    return f'''
+        INSERT INTO application_daily (job_id, day, employer_id, applications)
+        SELECT job_id, date(applied_at), employer_id, COUNT(*)
+        FROM ({rows})
+        GROUP BY job_id, date(applied_at)
+    '''
+
+def posting_rollup_sql(tables):
+    """Day counts of postings from jobs tables"""
+    rows = ' UNION ALL '.join(f'''
+        SELECT employer_id, created_at FROM {jobs} WHERE date(created_at) BETWEEN ? AND ?''' for jobs in tables)
+    return f'''
+        INSERT INTO posting_daily (employer_id, day, postings)
+        SELECT employer_id, date(created_at), COUNT(*)
+        FROM ({rows})
+        GROUP BY employer_id, date(created_at)
+    '''
+
+HOT_SOURCES = [('applications', 'jobs')]
+# Archived jobs keep counting (migration 14 created their tables)
+ARCHIVE_SOURCES = HOT_SOURCES + [('archived_applications', 'archived_jobs')]
+
+# Covers every date SQLite's date() can produce
+FIRST_DAY = '0000-01-01'
+LAST_DAY = '9999-12-31'
+
+def rebuild(cursor, first_day=FIRST_DAY, last_day=LAST_DAY):
+    """Recompute the rollup rows of a day range, inside the caller's transaction"""
+    archived = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'archived_jobs'"
+    ).fetchone()
+    sources = ARCHIVE_SOURCES if archived else HOT_SOURCES
+    days = (first_day, last_day) * len(sources)
+    cursor.execute('DELETE FROM application_daily WHERE day BETWEEN ? AND ?', (first_day, last_day))
+    cursor.execute('DELETE FROM posting_daily WHERE day BETWEEN ? AND ?', (first_day, last_day))
+    cursor.execute(application_rollup_sql(sources), days)
+    cursor.execute(posting_rollup_sql([jobs for _, jobs in sources]), days)
+
+def compact(cursor):
+    """Drop rows whose count went back to zero after deletes"""
+    cursor.execute('DELETE FROM application_daily WHERE applications <= 0')
+    cursor.execute('DELETE FROM posting_daily WHERE postings <= 0')
+
+def application_change(row, delta):
+    """Trigger body adding delta to the day of an applications row"""
+    if delta < 0:
+        # The row exists already, and the job may be gone by now
+        return f'''
+            UPDATE application_daily SET applications = applications - {-delta}
+            WHERE job_id = {row}.job_id AND day = date({row}.applied_at);
+        '''
+    return f'''
+        INSERT INTO application_daily (job_id, day, employer_id, applications)
+        SELECT {row}.job_id, date({row}.applied_at), employer_id, {delta} FROM jobs
+        WHERE id = {row}.job_id AND date({row}.applied_at) IS NOT NULL
+        ON CONFLICT (job_id, day) DO UPDATE SET applications = applications + excluded.applications;
+    '''
+
+def posting_change(row, delta):
+    """Trigger body adding delta to the day of a jobs row"""
+    return f'''
+        INSERT INTO posting_daily (employer_id, day, postings)
+        SELECT {row}.employer_id, date({row}.created_at), {delta} WHERE date({row}.created_at) IS NOT NULL
+        ON CONFLICT (employer_id, day) DO UPDATE SET postings = postings + excluded.postings;
+    '''
+
+if __name__ == "__main__":
+    import database as db
+
+    parser = argparse.ArgumentParser(description="Rebuild and compact the daily rollup tables")
+    parser.add_argument('command', choices=['rebuild', 'compact'])
+    parser.add_argument('--from', dest='first_day', default=FIRST_DAY, help="First day to rebuild (YYYY-MM-DD)")
+    parser.add_argument('--to', dest='last_day', default=LAST_DAY, help="Last day to rebuild (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    conn = db.get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            if args.command == 'rebuild':
+                rebuild(cursor, args.first_day, args.last_day)
+            compact(cursor)
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+        print(f"{args.command} done for {args.first_day} .. {args.last_day}" if args.command == 'rebuild'
+              else "compact done")
+    finally:
+        conn.close()
@@ -0,0 +1,91 @@
+"""
+Numeric salaries.
+
+jobs.salary is free text ("$15/hr", "$18-24/hour", "$45000", "$600 per week").
+parse_salary turns it into (salary_min, salary_max, salary_period) where the
+amounts are normalized to an hourly rate, so jobs paid per hour, week or
+year can be filtered and sorted together, and salary_period keeps the unit
+the employer used.
+
+Only amounts that carry a currency sign or are joined by a range separator
+("-", "to") are paired. A bare number is only used when there is nothing
+else, and counts such as "2 shifts a week" or "40 hours" are never amounts.
+"""
+import re
+
+# Hours used to convert a period's pay to an hourly rate (full-time basis)
+HOURS_PER_PERIOD = {
+    'hour': 1,
+    'day': 8,
+    'week': 40,
+    'month': 40 * 52 / 12,
+    'year': 40 * 52,
+}
+
+PERIOD_WORDS = {
+    'h': 'hour', 'hr': 'hour', 'hrs': 'hour', 'hour': 'hour', 'hourly': 'hour',
+    'd': 'day', 'day': 'day', 'daily': 'day',
+    'w': 'week', 'wk': 'week', 'week': 'week', 'weekly': 'week',
+    'mo': 'month', 'month': 'month', 'monthly': 'month',
+    'y': 'year', 'yr': 'year', 'year': 'year', 'yearly': 'year', 'annual': 'year', 'annually': 'year',
+}
+
+# Amounts without a unit at or above this are taken as yearly salaries
+YEARLY_THRESHOLD = 1000
+
+AMOUNT = r'([$£€])?\s*(\d[\d,]*(?:\.\d+)?)\s*(k\b)?'
+# One amount or a range of two: currency, number, thousands for each side
+SALARY_PATTERN = re.compile(AMOUNT + r'(?:\s*(?:-|–|\bto\b)\s*' + AMOUNT + ')?')
+PERIOD_PATTERN = re.compile(r'(?:/|\bper\b|\ba\b|\ban\b)\s*([a-z]+)|\b(hourly|daily|weekly|monthly|yearly|annual|annually)\b')
+# Bare counts ("2 shifts a week", "40 hours/week"), removed before looking for amounts
+COUNT_PATTERN = re.compile(
+    r'(?<![$£€\d.,\-–])\d+\s*(?:shifts?|days?|nights?|hours?|weeks?|months?|years?|times?)\b'
+    r'(?:\s*(?:/|\bper\b|\ban?\b)\s*[a-z]+)?'
+)
+
+def parse_amount(number, thousands):
+    value = float(number.replace(',', ''))
+    return value * 1000 if thousands else value
+
+def find_amounts(text):
+    """(amounts, end) of the salary in text: the first with a currency sign, else the first range, else any number"""
+    best = None
+    for match in SALARY_PATTERN.finditer(text):
+        currency, number, thousands, high_currency, high_number, high_thousands = match.groups()
+        if high_number:
+            # "$40-50k" is 40k to 50k
+            amounts = [parse_amount(number, thousands or high_thousands), parse_amount(high_number, high_thousands)]
+        else:
+            amounts = [parse_amount(number, thousands)]
+        rank = 0 if currency or high_currency else 1 if high_number else 2
+        if best is None or rank < best[0]:
+            best = (rank, amounts, match.end())
+        if rank == 0:
+            break
+    return best[1:] if best else (None, 0)
+
+def find_period(text, start=0):
+    for match in PERIOD_PATTERN.finditer(text, start):
+        period = PERIOD_WORDS.get(match.group(1) or match.group(2))
+        if period:
+            return period
+    return None
+
+def parse_salary(text):
+    """Free-form salary -> (hourly_min, hourly_max, period), or None when it cannot be parsed"""
+    if not text or not isinstance(text, str):
+        return None
+    text = COUNT_PATTERN.sub(' ', text.lower())
+
+    amounts, end = find_amounts(text)
+    if not amounts:
+        return None
+
+    # The unit right after the amounts, else anywhere ("hourly: $15")
+    period = find_period(text, end) or find_period(text)
+    if period is None:
+        period = 'year' if max(amounts) >= YEARLY_THRESHOLD else 'hour'
+
+    hours = HOURS_PER_PERIOD[period]
+    low, high = min(amounts), max(amounts)
+    return round(low / hours, 2), round(high / hours, 2), period
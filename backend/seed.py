@@ -0,0 +1,284 @@
+"""
+Synthetic data generator for load testing.
+
+Creates a database with N employers, employees, jobs, applications and chat
+rows. Locations cluster around the predefined neighborhoods, skills are stored
+the same way register_employee writes them, and applications follow a
+power-law distribution across jobs (a few popular jobs get most applicants).
+
+Usage:
+    python seed.py --db /tmp/jobapp_large.db --employees 100000 --jobs 20000 \\
+        --applications 1000000 --seed 42
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sqlite3
+import time
+
+import database as db
+import locations
+import migrations
+import texts
+
+SKILLS = [
+    "Customer Service", "Cashier", "Cooking", "Cleaning", "Driving", "Delivery",
+    "Retail", "Barista", "Tutoring", "Data Entry", "Python", "SQL", "Excel",
+    "Babysitting", "Pet Care", "Warehouse", "Inventory", "Sales", "Photography",
+    "Social Media", "First Aid", "Bartending", "Event Staff", "Reception",
+]
+
+EDUCATION = ["High School", "Some College", "Associate Degree", "Bachelor's Degree", "Master's Degree"]
+
+JOB_TITLES = [
+    "Barista", "Cashier", "Delivery Driver", "Line Cook", "Retail Associate",
+    "Warehouse Associate", "Tutor", "Receptionist", "Event Staff", "Dog Walker",
+    "Data Entry Clerk", "Server", "Bartender", "Stock Clerk", "Babysitter",
+]
+
+COMPANY_WORDS = ["Urban", "Metro", "Green", "Sunrise", "Harbor", "Summit", "Pioneer", "Bright", "Central", "Union"]
+COMPANY_KINDS = ["Cafe", "Logistics", "Market", "Foods", "Retail", "Learning", "Events", "Services", "Kitchen", "Supply"]
+
+TIME_SLOTS = ["Morning", "Evening", "Weekend"]
+
+CHAT_QUESTIONS = [
+    "When do I get paid?",
+    "How do I swap a shift?",
+    "How do I apply for a job?",
+    "Can I change my availability?",
+    "What should I wear on my first day?",
+    "How do I update my skills?",
+    "Who do I contact if I am running late?",
+    "Is there a break during my shift?",
+]
+
+# Share of rows placed exactly on a predefined location (the UI only offers those)
+EXACT_LOCATION_SHARE = 0.8
+# Standard deviation in degrees for rows scattered around a neighborhood (~0.5 km)
+LOCATION_JITTER = 0.005
+
+# The bulk inserts bypass create_job/register_employee, so derived columns are
+# filled afterwards with the same backfills the migrations use
+DERIVED_COLUMN_BACKFILLS = [
+    migrations.backfill_location_ids,
+    migrations.backfill_time_slots,
+    migrations.backfill_salaries,
+]
+
+def format_timestamp(epoch):
+    # Same UTC format SQLite uses for CURRENT_TIMESTAMP
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(epoch))
+
+def random_epoch(rng, start, span_seconds):
+    return start + int(rng.random() * span_seconds)
+
+def clustered_coordinates(rng, location_list):
+    location = rng.choice(location_list)
+    if rng.random() < EXACT_LOCATION_SHARE:
+        return location["latitude"], location["longitude"]
+    return (round(rng.gauss(location["latitude"], LOCATION_JITTER), 6),
+            round(rng.gauss(location["longitude"], LOCATION_JITTER), 6))
+
+def random_salary(rng):
+    kind = rng.random()
+    if kind < 0.6:
+        return f"${rng.randint(14, 30)}/hr"
+    if kind < 0.85:
+        low = rng.randint(14, 25)
+        return f"${low}-{low + rng.randint(2, 8)}/hour"
+    if kind < 0.95:
+        return f"${rng.randint(25, 90) * 1000}"
+    return None
+
+def power_law_weights(n, exponent):
+    """Cumulative Zipf weights so rank 1 is chosen far more often than rank n"""
+    return list(itertools.accumulate(1.0 / (rank ** exponent) for rank in range(1, n + 1)))
+
+def prepare_database(path, force=False):
+    if os.path.exists(path):
+        if not force:
+            raise SystemExit(f"{path} already exists, pass --force to overwrite it")
+        os.remove(path)
+
+    # Create the schema through the normal initialization path
+    db.DATABASE_PATH = path
+    result = db.init_db()
+    if not result["success"]:
+        raise SystemExit(f"Failed to initialize database: {result['error']}")
+
+def seed_database(path, employers=50, employees=1000, jobs=500, applications=5000, chats=1000,
+                  seed=None, exponent=1.1, days=180, force=False):
+    """Fill a fresh database with synthetic rows and return the row counts."""
+    rng = random.Random(seed)
+    prepare_database(path, force)
+
+    conn = sqlite3.connect(path)
+    # Bulk load settings, the file is disposable until the load has finished
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA journal_mode = MEMORY')
+    conn.execute('PRAGMA cache_size = -200000')
+
+    now = int(time.time())
+    span = days * 24 * 60 * 60
+    history_start = now - span
+
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT INTO employers (id, name, email, password_hash, company_name, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                ((i, f"Employer {i}", f"employer{i}@example.com", "password123",
+                  f"{rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_KINDS)} {i}",
+                  format_timestamp(random_epoch(rng, history_start, span)))
+                 for i in range(1, employers + 1))
+            )
+
+            def employee_rows():
+                for i in range(1, employees + 1):
+                    latitude, longitude = clustered_coordinates(rng, locations.RESIDENTIAL_LOCATIONS)
+                    age_days = rng.randint(18 * 366, 60 * 365)
+                    yield (
+                        i, f"Employee {i}", f"employee{i}@example.com", "password123",
+                        time.strftime('%Y-%m-%d', time.gmtime(now - age_days * 86400)),
+                        rng.choice(EDUCATION),
+                        # Same encoding as register_employee (json.dumps of a list)
+                        json.dumps(rng.sample(SKILLS, rng.randint(0, 5))),
+                        rng.randint(0, 10), latitude, longitude,
+                        format_timestamp(random_epoch(rng, history_start, span))
+                    )
+
+            conn.executemany(
+                '''INSERT INTO employees
+                   (id, name, email, password_hash, dob, education, skills, experience, latitude, longitude, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                employee_rows()
+            )
+
+            # Employers also follow a power law: a few large companies post most jobs
+            employer_weights = power_law_weights(employers, exponent)
+            job_employers = rng.choices(range(1, employers + 1), cum_weights=employer_weights, k=jobs) if employers else []
+            job_created = {}
+            # Descriptions go straight to the side table, jobs only keep the summary
+            job_texts = []
+
+            def job_rows():
+                for i, employer_id in enumerate(job_employers, start=1):
+                    latitude, longitude = clustered_coordinates(rng, locations.BUSINESS_LOCATIONS)
+                    created_at = random_epoch(rng, history_start, span)
+                    job_created[i] = created_at
+                    title = rng.choice(JOB_TITLES)
+                    description = f"We are looking for a reliable {title.lower()} to join our team. " * rng.randint(1, 4)
+                    job_texts.append((i, *texts.pack(description)))
+                    yield (
+                        i, employer_id, title, texts.summarize(description),
+                        random_salary(rng), 'Part-time', rng.choice(TIME_SLOTS),
+                        latitude, longitude,
+                        'open' if rng.random() < 0.9 else 'closed',
+                        format_timestamp(created_at)
+                    )
+
+            conn.executemany(
+                '''INSERT INTO jobs
+                   (id, employer_id, title, summary, salary, job_type, time_slot, latitude, longitude, status, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                job_rows()
+            )
+            conn.executemany("INSERT INTO job_texts (job_id, description, compressed) VALUES (?, ?, ?)", job_texts)
+
+            # Cap applications at half the distinct (job, employee) pairs: closer to all of
+            # them, rejection sampling would keep drawing pairs that are already taken
+            applications = min(applications, jobs * employees // 2)
+            job_weights = power_law_weights(jobs, exponent)
+
+            def application_batches():
+                """Batches of (application rows, cover letter rows)"""
+                seen = set()
+                count = 0
+                while count < applications:
+                    batch = min(10000, applications - count)
+                    rows, letters = [], []
+                    job_ids = rng.choices(range(1, jobs + 1), cum_weights=job_weights, k=batch)
+                    for job_id in job_ids:
+                        employee_id = int(rng.random() * employees) + 1
+                        key = job_id * (employees + 1) + employee_id
+                        if key in seen:
+                            continue  # Same pair as apply_for_job's ALREADY_APPLIED check
+                        seen.add(key)
+                        count += 1
+                        created = job_created[job_id]
+                        roll = rng.random()
+                        status = 'waiting' if roll < 0.7 else ('accepted' if roll < 0.8 else 'rejected')
+                        cover_letter = "I would love to work with you. " * rng.randint(0, 6)
+                        if cover_letter:
+                            letters.append((count, *texts.pack(cover_letter)))
+                        rows.append((
+                            count, job_id, employee_id, status,
+                            # Applications always arrive after the job was posted
+                            format_timestamp(random_epoch(rng, created, now - created))
+                        ))
+                    yield rows, letters
+
+            for rows, letters in application_batches():
+                conn.executemany(
+                    "INSERT INTO applications (id, job_id, employee_id, status, applied_at) VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+                conn.executemany(
+                    "INSERT INTO application_texts (application_id, cover_letter, compressed) VALUES (?, ?, ?)",
+                    letters
+                )
+
+            # Chat usage is skewed too, heavy users ask most questions
+            chat_weights = power_law_weights(employees, exponent)
+            chat_employees = rng.choices(range(1, employees + 1), cum_weights=chat_weights, k=chats) if employees else []
+            conn.executemany(
+                "INSERT INTO chat (employee_id, question, answer, created_at) VALUES (?, ?, ?, ?)",
+                ((employee_id, rng.choice(CHAT_QUESTIONS), "Please check with your employer for details.",
+                  format_timestamp(random_epoch(rng, history_start, span)))
+                 for employee_id in chat_employees)
+            )
+
+            # Derived columns the app fills on insert (location ids, time slots, salaries)
+            cursor = conn.cursor()
+            for backfill in DERIVED_COLUMN_BACKFILLS:
+                backfill(cursor)
+
+        # Back to the journal mode init_db set up for the app
+        conn.execute('PRAGMA journal_mode = WAL')
+
+        counts = {}
+        for table in ('employers', 'employees', 'jobs', 'applications', 'chat'):
+            counts[table] = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        conn.execute('ANALYZE')
+        return counts
+    finally:
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic job app database")
+    parser.add_argument('--db', required=True, help="Path of the database file to create")
+    parser.add_argument('--employers', type=int, default=50)
+    parser.add_argument('--employees', type=int, default=1000)
+    parser.add_argument('--jobs', type=int, default=500)
+    parser.add_argument('--applications', type=int, default=5000)
+    parser.add_argument('--chats', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=None, help="Random seed for reproducible data")
+    parser.add_argument('--exponent', type=float, default=1.1, help="Power-law exponent for popularity skew")
+    parser.add_argument('--days', type=int, default=180, help="Days of history to spread timestamps over")
+    parser.add_argument('--force', action='store_true', help="Overwrite the database file if it exists")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    counts = seed_database(
+        args.db, args.employers, args.employees, args.jobs, args.applications, args.chats,
+        seed=args.seed, exponent=args.exponent, days=args.days, force=args.force
+    )
+    elapsed = time.perf_counter() - started
+
+    print(f"Seeded {args.db} in {elapsed:.2f}s")
+    for table, count in counts.items():
+        print(f"  {table}: {count}")
+
+if __name__ == "__main__":
+    main()
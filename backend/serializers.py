@@ -0,0 +1,94 @@
+"""
+Fast JSON serialization for listing endpoints.
+
+Listings normally go sqlite3.Row -> dict -> json.loads(skills) -> jsonify,
+which copies every row several times. The helpers here read plain tuples,
+zip them with the column names of the query and encode the whole list in one
+encoder call (orjson when installed, the C-accelerated stdlib encoder
+otherwise). Columns that already hold JSON text, such as employees.skills,
+are embedded as raw fragments instead of being decoded and re-encoded.
+"""
+import functools
+import json
+import os
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+# Raw JSON columns are swapped for marker strings while encoding, then the
+# markers are replaced by the stored JSON text. Markers carry a random nonce
+# drawn per call, and a nonce that occurs anywhere else in the output is
+# replaced by a fresh one, so stored text can never pass for a marker.
+_NONCE_BYTES = 8
+
+def dumps(value):
+    """Encode a value to JSON bytes with the fastest available encoder"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return _encoder.encode(value).encode('utf-8')
+
+@functools.lru_cache(maxsize=4096)
+def is_json_text(text):
+    """Check once per distinct value that stored text is valid JSON"""
+    try:
+        json.loads(text, parse_constant=_reject_constant)
+        return True
+    except ValueError:
+        return False
+
+def _reject_constant(name):
+    # NaN and Infinity are accepted by json.loads but are not JSON
+    raise ValueError(f'Invalid JSON constant {name}')
+
+def encode_rows(cursor, raw_json_columns=(), fallback='[]'):
+    """Encode all remaining rows of an executed cursor as a JSON array (bytes).
+
+    The cursor must come from a connection whose row_factory is None so rows
+    are plain tuples. Values of `raw_json_columns` that hold valid JSON text
+    are embedded verbatim; invalid text is replaced by `fallback`, matching
+    the JSONDecodeError handling of the dict based functions.
+    """
+    columns = [column[0] for column in cursor.description]
+    raw_indexes = [i for i, name in enumerate(columns) if name in raw_json_columns]
+
+    rows = cursor.fetchall()
+    if not raw_indexes:
+        return dumps([dict(zip(columns, row)) for row in rows])
+
+    records = [dict(zip(columns, row)) for row in rows]
+    while True:
+        nonce = os.urandom(_NONCE_BYTES).hex()
+        fragments = []
+        for record in records:
+            for i in raw_indexes:
+                name = columns[i]
+                text = record[name]
+                if text:
+                    record[name] = f'{nonce}:{len(fragments)}'
+                    fragments.append(text if is_json_text(text) else fallback)
+
+        encoded = dumps(records)
+        if not fragments:
+            return encoded
+        # Every occurrence of the nonce has to be one of our markers
+        if encoded.count(nonce.encode('ascii')) == len(fragments):
+            break
+        for record, row in zip(records, rows):
+            for i in raw_indexes:
+                record[columns[i]] = row[i]
+
+    pattern = re.compile(rb'"' + nonce.encode('ascii') + rb':(\d+)"')
+    return pattern.sub(lambda match: fragments[int(match.group(1))].encode('utf-8'), encoded)
+
+def envelope(status='success', **arrays):
+    """Build a {"status": ..., "<name>": [...]} body from pre-encoded arrays (or other JSON values)"""
+    parts = [b'{"status":', dumps(status)]
+    for name, encoded in arrays.items():
+        parts.append(b',' + dumps(name) + b':' + encoded)
+    parts.append(b'}')
+    return b''.join(parts)
@@ -0,0 +1,135 @@
+"""
+Delta sync for job and application listings: ?since=<token>
+
+    GET /api/jobs?since=<token>
+    GET /api/employers/<id>/applications?since=<token>
+
+Every insert or update of a job or an application takes the next value of
+the 'sync' row of change_counters and stores it in the row's sync_seq, with
+updated_at set to the time of the change. Deletes leave a tombstone carrying
+their sequence number. All of it is kept by triggers (migration 13), so rows
+written by any code path or process are covered.
+
+A since= response holds the rows changed after the token, the ids removed
+after it and the token to send next time:
+
+    {"status": "success", "jobs": [...], "deleted": [4, 17], "sync_token": "5120"}
+
+Tokens are opaque to clients. since=0 returns every current row, which is
+how a client gets its first token. Both queries range over an index on
+sync_seq, so polling costs what changed, not the size of the tables.
+
+Tombstones older than TOMBSTONE_RETENTION_DAYS are pruned by the Pruner
+thread of every worker (JOBAPP_TOMBSTONE_PRUNE_INTERVAL seconds, 0 turns it
+off) or from cron with `python sync.py prune`. The highest
+pruned sequence number is kept as the 'sync_floor' row of change_counters:
+a token below it may have missed deletions, so it is answered with
+410 Gone and the client starts over with since=0.
+"""
+import argparse
+import threading
+
+class InvalidSyncToken(ValueError):
+    """A since= value this server did not hand out"""
+
+def parse_token(text):
+    """?since= value -> sequence number, None when absent"""
+    if text is None:
+        return None
+    if not (text.isascii() and text.isdigit()):
+        raise InvalidSyncToken('Invalid sync token')
+    return int(text)
+
+def format_token(seq):
+    return str(seq)
+
+TOMBSTONE_RETENTION_DAYS = 30
+
+def read_floor(conn):
+    """Highest pruned tombstone sequence number, tokens below it need a full resync"""
+    row = conn.execute("SELECT value FROM change_counters WHERE name = 'sync_floor'").fetchone()
+    return row[0] if row else 0
+
+def needs_resync(since, floor):
+    return 0 < since < floor
+
+def prune_tombstones(conn, days=TOMBSTONE_RETENTION_DAYS):
+    """Delete tombstones older than `days` days and raise the floor, returns the number removed"""
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        floor = cursor.execute("SELECT MAX(seq) FROM sync_tombstones WHERE deleted_at < datetime('now', ?)",
+                               (f'-{int(days)} days',)).fetchone()[0]
+        removed = 0
+        if floor is not None:
+            cursor.execute('''
+                INSERT INTO change_counters (name, value) VALUES ('sync_floor', ?)
+                ON CONFLICT (name) DO UPDATE SET value = max(value, excluded.value)
+            ''', (floor,))
+            removed = cursor.execute('DELETE FROM sync_tombstones WHERE seq <= ?', (floor,)).rowcount
+        cursor.execute('COMMIT')
+    except Exception:
+        cursor.execute('ROLLBACK')
+        raise
+    return removed
+
+class Pruner:
+    """Daemon thread pruning tombstones every `interval` seconds on connections from `connect`"""
+
+    def __init__(self, connect, interval, days=TOMBSTONE_RETENTION_DAYS):
+        self.connect = connect
+        self.interval = interval
+        self.days = days
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None and self.interval > 0:
+            self.thread = threading.Thread(target=self.run, name='tombstone-pruner', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            conn = self.connect()
+            try:
+                removed = prune_tombstones(conn, self.days)
+                if removed:
+                    print(f"Pruned {removed} sync tombstones")
+            except Exception as e:
+                print(f"Error pruning sync tombstones: {e}")
+            finally:
+                conn.close()
+
+def next_seq_sql(table, where):
+    """Trigger body: give the changed rows of `table` the next sequence number"""
+    return f'''
+        UPDATE change_counters SET value = value + 1 WHERE name = 'sync';
+        UPDATE {table} SET sync_seq = (SELECT value FROM change_counters WHERE name = 'sync'),
+                           updated_at = CURRENT_TIMESTAMP
+        WHERE {where};
+    '''
+
+def tombstone_sql(table, key, employer_id):
+    """Trigger body: record the deletion of a row of `table`"""
+    return f'''
+        UPDATE change_counters SET value = value + 1 WHERE name = 'sync';
+        INSERT INTO sync_tombstones (seq, table_name, row_id, employer_id)
+        VALUES ((SELECT value FROM change_counters WHERE name = 'sync'), '{table}', {key}, {employer_id});
+    '''
+
+if __name__ == "__main__":
+    import database as db
+
+    parser = argparse.ArgumentParser(description="Prune old delta sync tombstones")
+    parser.add_argument('command', choices=['prune'])
+    parser.add_argument('--days', type=int, default=TOMBSTONE_RETENTION_DAYS, help="Keep tombstones of this many days")
+    args = parser.parse_args()
+
+    conn = db.get_db_connection()
+    try:
+        print(f"Pruned {prune_tombstones(conn, args.days)} tombstones")
+    finally:
+        conn.close()
@@ -0,0 +1,113 @@
+"""
+Large text columns kept out of the hot tables.
+
+Job descriptions and cover letters are only shown on the detail pages, so
+they live in side tables (migration 11) keyed by the owning row:
+
+    job_texts          job_id         -> description
+    application_texts  application_id -> cover_letter
+
+Listings never touch them, which keeps the jobs and applications pages in
+the page cache small. Texts longer than COMPRESS_THRESHOLD bytes are stored
+zlib-compressed with compressed = 1; load() and unpack() undo it, so callers
+only ever see str. Jobs keep a short summary for the listing cards.
+"""
+import zlib
+
+# Shorter texts do not shrink enough to pay for the decompression
+COMPRESS_THRESHOLD = 512
+COMPRESS_LEVEL = 6
+
+# Length of jobs.summary, the description preview on the dashboards
+SUMMARY_LENGTH = 150
+
+# Side table -> (key column, text column)
+TABLES = {
+    'job_texts': ('job_id', 'description'),
+    'application_texts': ('application_id', 'cover_letter'),
+    # Texts of archived rows (see archive.py)
+    'archived_job_texts': ('job_id', 'description'),
+    'archived_application_texts': ('application_id', 'cover_letter'),
+}
+
+def pack(text):
+    """str -> (stored value, compressed flag)"""
+    data = text.encode('utf-8')
+    if len(data) > COMPRESS_THRESHOLD:
+        packed = zlib.compress(data, COMPRESS_LEVEL)
+        if len(packed) < len(data):
+            return packed, 1
+    return text, 0
+
+def unpack(value, compressed):
+    """Stored value -> str (None stays None)"""
+    if value is None:
+        return None
+    if compressed:
+        return zlib.decompress(value).decode('utf-8')
+    return value
+
+def summarize(text):
+    """Listing preview of a description"""
+    if not text:
+        return text
+    return text if len(text) <= SUMMARY_LENGTH else text[:SUMMARY_LENGTH] + '...'
+
+def store(cursor, table, key, text):
+    """Write the text of one row, inside the caller's transaction (None removes it)"""
+    key_column, text_column = TABLES[table]
+    if text is None:
+        cursor.execute(f'DELETE FROM {table} WHERE {key_column} = ?', (key,))
+        return
+    value, compressed = pack(text)
+    cursor.execute(
+        f'INSERT OR REPLACE INTO {table} ({key_column}, {text_column}, compressed) VALUES (?, ?, ?)',
+        (key, value, compressed)
+    )
+
+def load(cursor, table, key):
+    """The text of one row, or None"""
+    key_column, text_column = TABLES[table]
+    row = cursor.execute(f'SELECT {text_column}, compressed FROM {table} WHERE {key_column} = ?', (key,)).fetchone()
+    return unpack(row[0], row[1]) if row else None
+
+# Long texts compressed per page while moving them
+MOVE_BATCH_SIZE = 1000
+
+def move_texts(cursor, batch_size=MOVE_BATCH_SIZE):
+    """Move descriptions and cover letters still in the base tables to the side tables.
+
+    Texts stored as they are (up to COMPRESS_THRESHOLD bytes) are copied by one
+    INSERT ... SELECT per table. Only the long ones pass through Python to be
+    compressed, batch_size rows at a time in id order.
+    """
+    for table, side_table in (('jobs', 'job_texts'), ('applications', 'application_texts')):
+        key_column, text_column = TABLES[side_table]
+        short = f'length(CAST({text_column} AS BLOB)) <= {COMPRESS_THRESHOLD}'
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO {side_table} ({key_column}, {text_column}, compressed)
+            SELECT id, {text_column}, 0 FROM {table} WHERE {text_column} IS NOT NULL AND {short}
+        ''')
+        last_id = 0
+        while True:
+            rows = cursor.execute(f'''
+                SELECT id, {text_column} FROM {table}
+                WHERE id > ? AND {text_column} IS NOT NULL AND NOT {short}
+                ORDER BY id LIMIT ?
+            ''', (last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            cursor.executemany(
+                f'INSERT OR REPLACE INTO {side_table} ({key_column}, {text_column}, compressed) VALUES (?, ?, ?)',
+                [(key, *pack(text)) for key, text in rows]
+            )
+            last_id = rows[-1][0]
+
+    # Same preview as summarize()
+    cursor.execute(f'''
+        UPDATE jobs SET description = NULL,
+            summary = CASE WHEN length(description) <= {SUMMARY_LENGTH} THEN description
+                           ELSE substr(description, 1, {SUMMARY_LENGTH}) || '...' END
+        WHERE description IS NOT NULL
+    ''')
+    cursor.execute('UPDATE applications SET cover_letter = NULL WHERE cover_letter IS NOT NULL')
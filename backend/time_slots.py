@@ -0,0 +1,124 @@
+"""
+Structured time slots.
+
+jobs.time_slot is free text ("Morning", "Weekend", "Mon-Fri 09:00-17:00").
+parse_time_slot turns it into (days, start, end):
+
+    days   bitmask of weekdays, bit 0 = Monday ... bit 6 = Sunday
+    start  minute of the day the slot starts (0-1439)
+    end    minute of the day the slot ends; above 1440 for overnight slots
+
+For the interval index every day in the mask becomes one interval in
+minutes of the week (Monday 00:00 = 0), see week_intervals.
+"""
+import re
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+DAY_NAMES = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+
+WEEKDAYS = 0b0011111
+WEEKEND = 0b1100000
+EVERY_DAY = 0b1111111
+
+DAY_GROUPS = {
+    'weekdays': WEEKDAYS,
+    'weekday': WEEKDAYS,
+    'weekends': WEEKEND,
+    'weekend': WEEKEND,
+    'daily': EVERY_DAY,
+    'everyday': EVERY_DAY,
+}
+
+# The shifts offered by the job form, matching what they mean in the UI
+NAMED_SLOTS = {
+    'morning': (WEEKDAYS, 6 * 60, 12 * 60),
+    'afternoon': (WEEKDAYS, 12 * 60, 17 * 60),
+    'evening': (WEEKDAYS, 17 * 60, 22 * 60),
+    'night': (WEEKDAYS, 22 * 60, 30 * 60),
+    'weekend': (WEEKEND, 9 * 60, 17 * 60),
+}
+
+TIME_PATTERN = re.compile(r'^(\d{1,2})(?::(\d{2}))?\s*(am|pm)?$')
+SLOT_PATTERN = re.compile(r'^(?P<days>[a-z,\s-]*?)\s*(?P<times>\d[\d:apm\s]*-\s*\d[\d:apm\s]*)?$')
+
+def parse_time(text):
+    """'18:00', '9', '6pm', '24:00' -> minute of the day, or None"""
+    match = TIME_PATTERN.match(text.strip())
+    if not match:
+        return None
+    hour = int(match.group(1))
+    minute = int(match.group(2) or 0)
+    suffix = match.group(3)
+    if suffix:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if suffix == 'pm' else 0)
+    if minute > 59 or hour > 24 or (hour == 24 and minute):
+        return None
+    return hour * 60 + minute
+
+def parse_day(text):
+    text = text.strip()[:3]
+    return DAY_NAMES.index(text) if text in DAY_NAMES else None
+
+def parse_days(text):
+    """'Mon-Fri', 'Sat,Sun', 'Weekdays' -> bitmask, or None"""
+    days = 0
+    for part in text.replace(' ', '').split(','):
+        if not part:
+            continue
+        if part in DAY_GROUPS:
+            days |= DAY_GROUPS[part]
+        elif '-' in part:
+            first, _, last = part.partition('-')
+            first, last = parse_day(first), parse_day(last)
+            if first is None or last is None:
+                return None
+            # Ranges may wrap around the week (Sat-Mon)
+            day = first
+            while True:
+                days |= 1 << day
+                if day == last:
+                    break
+                day = (day + 1) % 7
+        else:
+            day = parse_day(part)
+            if day is None:
+                return None
+            days |= 1 << day
+    return days or None
+
+def parse_time_slot(text):
+    """Free-form time slot -> (days, start, end), or None when it cannot be parsed"""
+    if not text or not isinstance(text, str):
+        return None
+    text = ' '.join(text.lower().replace('shift', ' ').split())
+    if text in NAMED_SLOTS:
+        return NAMED_SLOTS[text]
+
+    match = SLOT_PATTERN.match(text)
+    if not match or not (match.group('days') or match.group('times')):
+        return None
+
+    days_text = match.group('days').strip()
+    days = parse_days(days_text) if days_text else EVERY_DAY
+    if days is None:
+        return None
+
+    if match.group('times') is None:
+        return days, 0, MINUTES_PER_DAY
+
+    start_text, _, end_text = match.group('times').partition('-')
+    start, end = parse_time(start_text), parse_time(end_text)
+    if start is None or end is None or start == MINUTES_PER_DAY:
+        return None
+    if end <= start:
+        end += MINUTES_PER_DAY  # Overnight, e.g. 22:00-02:00
+    return days, start, end
+
+def week_intervals(days, start, end):
+    """[(week_start, week_end), ...] in minutes of the week, one per day in the mask"""
+    return [(day * MINUTES_PER_DAY + start, day * MINUTES_PER_DAY + end)
+            for day in range(7) if days & (1 << day)]
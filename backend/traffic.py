@@ -0,0 +1,321 @@
+"""
+Traffic capture and replay.
+
+The capture middleware records every API request (method, path, query and the
+shape of the JSON body) as one JSON line per request. Captures must not hold
+personal data, so values are redacted by default: only the structural fields
+replay needs (ids, enum-like values, pagination and sorting) are kept as they
+are. Coordinates are rounded to about 10 km, email addresses become salted
+hashes (equal within one capture, so a replayed login finds the replayed
+registration), other strings keep only their length and other numbers become
+zero. The sequence can then be replayed against a local copy of the database.
+Server-Sent Event streams are not captured: they stay open for minutes and
+replay measures request latency.
+
+Replay:
+    python traffic.py replay capture.jsonl --db jobapp_copy.db --speed 4 --workers 8
+"""
+import argparse
+import collections
+import contextlib
+import hashlib
+import hmac
+import io
+import json
+import math
+import os
+import queue
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode
+
+from benchmark import percentile
+import profiler
+
+# Body and query fields whose values are written as they are: structure, not personal data.
+# Fields named id or ending in _id are kept too.
+KEPT_FIELDS = {
+    'userType', 'status', 'job_type', 'time_slot', 'salary_band', 'distance', 'skills', 'skill',
+    'sort', 'fields', 'limit', 'offset', 'radius', 'zoom', 'cell', 'since', 'before', 'last_event_id',
+    'from', 'to', 'available', 'min_salary', 'requests', 'parallel', 'path', 'method',
+}
+# Rounded to COORDINATE_DECIMALS places (about 10 km)
+COORDINATE_FIELDS = {'latitude', 'longitude', 'lat', 'lng'}
+COORDINATE_DECIMALS = 1
+# Replaced by a salted hash, so equal values stay equal within one capture
+HASHED_FIELDS = {'email'}
+# Values replay uses for redacted fields that are validated by the app
+PLACEHOLDERS = {'dob': '1990-01-01'}
+
+def is_kept(key):
+    return key in KEPT_FIELDS or key == 'id' or (key or '').endswith('_id')
+
+def coarse(value):
+    return round(value, COORDINATE_DECIMALS)
+
+def body_shape(value, key=None, salt=b''):
+    """Reduce a JSON body to its shape, keeping only structural values (see KEPT_FIELDS)"""
+    if isinstance(value, dict):
+        return {k: body_shape(v, k, salt) for k, v in value.items()}
+    if isinstance(value, list):
+        return [body_shape(item, key, salt) for item in value]
+    if value is None or isinstance(value, bool) or is_kept(key):
+        return value
+    if isinstance(value, (int, float)):
+        return coarse(value) if key in COORDINATE_FIELDS else type(value)(0)
+    if isinstance(value, str) and key in HASHED_FIELDS:
+        return {'$hash': hmac.new(salt, value.encode('utf-8'), hashlib.sha256).hexdigest()[:16]}
+    if isinstance(value, str):
+        return {'$str': len(value)}
+    return value
+
+def coarse_bbox(value):
+    """Round a west,south,east,north box outwards"""
+    factor = 10 ** COORDINATE_DECIMALS
+    try:
+        west, south, east, north = (float(part) for part in value.split(','))
+    except ValueError:
+        return 'x' * len(value)
+    return ','.join(str(bound / factor) for bound in (
+        math.floor(west * factor), math.floor(south * factor), math.ceil(east * factor), math.ceil(north * factor)
+    ))
+
+def query_shape(query):
+    """Redact a query string like a body: structural values kept, coordinates rounded, the rest masked"""
+    params = []
+    for key, value in parse_qsl(query, keep_blank_values=True):
+        if is_kept(key):
+            params.append((key, value))
+        elif key == 'bbox':
+            params.append((key, coarse_bbox(value)))
+        elif key in COORDINATE_FIELDS:
+            try:
+                params.append((key, coarse(float(value))))
+            except ValueError:
+                params.append((key, 'x' * len(value)))
+        else:
+            params.append((key, 'x' * len(value)))
+    return urlencode(params)
+
+def expand_shape(shape, password=None, key=None):
+    """Build a replayable body from a captured shape.
+
+    Redacted passwords are replaced by `password` when given, so logins succeed
+    against databases with known credentials such as the ones seed.py creates.
+    """
+    if isinstance(shape, dict):
+        if set(shape) == {'$hash'}:
+            return f"user-{shape['$hash']}@example.com"
+        if set(shape) == {'$str'}:
+            if password is not None and key == 'password':
+                return password
+            if key in PLACEHOLDERS:
+                return PLACEHOLDERS[key]
+            return 'x' * shape['$str']
+        return {k: expand_shape(v, password, k) for k, v in shape.items()}
+    if isinstance(shape, list):
+        return [expand_shape(item, password, key) for item in shape]
+    return shape
+
+class CaptureMiddleware:
+    """WSGI middleware appending one JSON line per API request to a capture file"""
+
+    def __init__(self, wsgi_app, path, prefix='/api/'):
+        self.wsgi_app = wsgi_app
+        self.path = path
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.file = open(path, 'a', buffering=1)
+        # Never written anywhere, so the hashes cannot be matched against known emails
+        self.salt = os.urandom(16)
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '/')
+        if not path.startswith(self.prefix):
+            return self.wsgi_app(environ, start_response)
+
+        entry = {
+            't': round(time.time(), 4),
+            'method': environ.get('REQUEST_METHOD', 'GET'),
+            'path': path,
+            'query': query_shape(environ.get('QUERY_STRING', '')),
+        }
+
+        # Read the body once and hand an identical stream to the app
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        if length:
+            raw = environ['wsgi.input'].read(length)
+            environ['wsgi.input'] = io.BytesIO(raw)
+            try:
+                entry['body'] = body_shape(json.loads(raw), salt=self.salt)
+            except ValueError:
+                entry['body'] = {'$str': len(raw)}
+
+        def capture_start_response(status, headers, exc_info=None):
+            # Written once the response type is known, event streams are skipped
+            if not profiler.is_event_stream(headers):
+                line = json.dumps(entry, separators=(',', ':'))
+                with self.lock:
+                    self.file.write(line + '\n')
+            return start_response(status, headers, exc_info)
+
+        return self.wsgi_app(environ, capture_start_response)
+
+def init_app(app):
+    """Install the capture middleware when TRAFFIC_CAPTURE_PATH is configured"""
+    path = app.config.get('TRAFFIC_CAPTURE_PATH')
+    if not path:
+        return False
+    app.wsgi_app = CaptureMiddleware(app.wsgi_app, path)
+    print(f"Capturing API traffic to {path}")
+    return True
+
+def load_capture(path):
+    with open(path) as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    entries.sort(key=lambda entry: entry['t'])
+    return entries
+
+def endpoint_name(method, path):
+    """Group paths by route shape, e.g. GET /api/jobs/:id/apply"""
+    parts = [':id' if part.isdigit() else part for part in path.split('/')]
+    return f"{method} {'/'.join(parts)}"
+
+def replay(entries, app, speed=1.0, workers=4, password=None):
+    """Replay captured entries at `speed` times the original rate.
+
+    Requests are released on the original schedule (compressed by `speed`) and
+    executed by a pool of worker threads, each with its own test client.
+    Returns per-endpoint latency lists, 4xx/5xx counts and the schedule lag.
+    """
+    jobs = queue.Queue(maxsize=workers * 4)
+    latencies = collections.defaultdict(list)
+    errors = collections.Counter()
+    rejected = collections.Counter()
+    statuses = collections.Counter()
+    lags = []
+    lock = threading.Lock()
+
+    def worker():
+        client = app.test_client()
+        while True:
+            item = jobs.get()
+            if item is None:
+                return
+            entry, due = item
+            lag = max(time.perf_counter() - due, 0.0)
+            url = entry['path'] + ('?' + entry['query'] if entry.get('query') else '')
+            body = expand_shape(entry['body'], password) if 'body' in entry else None
+            started = time.perf_counter()
+            try:
+                response = client.open(url, method=entry['method'], json=body, buffered=False)
+                # Captures older than the stream filter may hold event streams, never read those
+                if response.mimetype != 'text/event-stream':
+                    response.get_data()
+                response.close()
+                status = response.status_code
+            except Exception as e:
+                print(f"Replay request failed: {e}")
+                status = 599
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            name = endpoint_name(entry['method'], entry['path'])
+            with lock:
+                latencies[name].append(elapsed_ms)
+                statuses[status] += 1
+                lags.append(lag * 1000)
+                if status >= 500:
+                    errors[name] += 1
+                elif status >= 400:
+                    rejected[name] += 1
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    started = time.perf_counter()
+    first = entries[0]['t'] if entries else 0
+    for entry in entries:
+        due = started + (entry['t'] - first) / speed
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        jobs.put((entry, due))
+
+    for _ in threads:
+        jobs.put(None)
+    for thread in threads:
+        thread.join()
+
+    return {
+        'elapsed': time.perf_counter() - started,
+        'latencies': latencies,
+        'errors': errors,
+        'rejected': rejected,
+        'statuses': statuses,
+        'lags': lags,
+    }
+
+def report(result):
+    total = sum(len(values) for values in result['latencies'].values())
+    elapsed = result['elapsed']
+    print(f"Replayed {total} requests in {elapsed:.2f}s ({total / elapsed if elapsed else 0:.1f} req/s)")
+    print(f"Status codes: {dict(sorted(result['statuses'].items()))}")
+    lags = sorted(result['lags'])
+    print(f"Schedule lag p50 {percentile(lags, 50):.2f} ms, p99 {percentile(lags, 99):.2f} ms")
+    print()
+    print(f"{'endpoint':<48} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'4xx':>7} {'5xx':>7}")
+    for name, values in sorted(result['latencies'].items(), key=lambda item: -len(item[1])):
+        values.sort()
+        rejected_rate = result['rejected'][name] / len(values) * 100
+        error_rate = result['errors'][name] / len(values) * 100
+        print(f"{name:<48} {len(values):>7} {percentile(values, 50):>9.2f} "
+              f"{percentile(values, 95):>9.2f} {percentile(values, 99):>9.2f} "
+              f"{rejected_rate:>6.1f}% {error_rate:>6.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured API traffic against a local database copy")
+    parser.add_argument('command', choices=['replay'])
+    parser.add_argument('capture', help="Capture file written by the TRAFFIC_CAPTURE_PATH middleware")
+    parser.add_argument('--db', required=True, help="Database to replay against (a copy is used, it is not modified)")
+    parser.add_argument('--speed', type=float, default=1.0, help="Multiple of the original request rate")
+    parser.add_argument('--workers', type=int, default=4, help="Concurrent replay workers")
+    parser.add_argument('--password', default=None, help="Password used for redacted login passwords")
+    args = parser.parse_args()
+
+    entries = load_capture(args.capture)
+    if not entries:
+        print("Capture file is empty")
+        return
+
+    # Replay against a throwaway copy so applies and updates do not touch the source.
+    # The backup API includes the WAL and gives a consistent snapshot of a live database.
+    workdir = tempfile.mkdtemp(prefix='jobapp-replay-')
+    try:
+        db_copy = os.path.join(workdir, 'replay.db')
+        source = sqlite3.connect(args.db)
+        target = sqlite3.connect(db_copy)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        os.environ['JOBAPP_DB_PATH'] = db_copy
+        import database as db
+        db.DATABASE_PATH = db_copy
+
+        # Only the startup output (migrations, index builds) is silenced, replay errors still show
+        with contextlib.redirect_stdout(io.StringIO()):
+            import app as app_module
+            application = app_module.create_app()
+        result = replay(entries, application, args.speed, args.workers, args.password)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report(result)
+
+if __name__ == "__main__":
+    main()
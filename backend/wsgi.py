@@ -0,0 +1,16 @@
+"""
+Production entry point for multi-process servers.
+
+Each worker imports this module and calls the app factory; schema
+initialization runs behind a file lock so only one worker performs it at a
+time. Example:
+
+    gunicorn --workers 4 --threads 16 --bind 0.0.0.0:5000 'wsgi:application'
+
+Use a threaded (or gevent) worker class: every open event stream
+(/api/.../events) holds a thread for up to events.STREAM_LIFETIME seconds,
+so plain sync workers would be used up by a handful of browser tabs.
+"""
+from app import create_app
+
+application = create_app()
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
-import { getAllJobs, getEmployeeApplications } from '../../services/api';
+import { batchGet, subscribeToEvents } from '../../services/api';
 import '../../styles/Dashboard.css';
 
 function EmployeeDashboard() {
@@ -41,55 +41,58 @@ function EmployeeDashboard() {
       return;
     }
     
-    // Fetch applications
-    const fetchApplications = async () => {
+    // Fetch applications and all available jobs in one batched request
+    const fetchDashboard = async () => {
       setLoading(true);
+      setJobsLoading(true);
       
       try {
-        // Fetch applications submitted by the employee
-        const applicationData = await getEmployeeApplications(employeeId);
-        setApplications(applicationData);
+        const [applicationResult, jobsResult] = await batchGet([
+          `/employees/${employeeId}/applications`,
+          '/jobs'
+        ]);
         
-        // Calculate statistics
-        const totalApps = applicationData.length;
-        const waitingApps = applicationData.filter(app => app.status === 'waiting').length;
-        const acceptedApps = applicationData.filter(app => app.status === 'accepted').length;
-        const rejectedApps = applicationData.filter(app => app.status === 'rejected').length;
+        // Applications submitted by the employee
+        const applicationData = applicationResult.status === 'success' && Array.isArray(applicationResult.applications)
+          ? applicationResult.applications
+          : [];
+        setApplications(applicationData);
         
-        setStats({
-          totalApplications: totalApps,
-          waitingApplications: waitingApps,
-          acceptedApplications: acceptedApps,
-          rejectedApplications: rejectedApps
-        });
+        // Make sure we're setting an array even if the API returned something unexpected
+        setJobs(jobsResult.status === 'success' && Array.isArray(jobsResult.jobs) ? jobsResult.jobs : []);
       } catch (error) {
         console.error('Error fetching employee data:', error);
+        setJobs([]);
       } finally {
         setLoading(false);
+        setJobsLoading(false);
       }
     };
     
-    // Fetch all available jobs separately
-    const fetchJobs = async () => {
-      setJobsLoading(true);
-      try {
-        const jobsData = await getAllJobs();
-        console.log("Jobs received in dashboard:", jobsData); // Add for debugging
-        
-        // Make sure we're setting an array even if the API returned something unexpected
-        setJobs(Array.isArray(jobsData) ? jobsData : []);
-      } catch (error) {
-        console.error('Error fetching jobs:', error);
-        setJobs([]);
-      } finally {
-        setJobsLoading(false);
+    fetchDashboard();
+    
+    // Status changes made by employers arrive as they happen
+    const unsubscribe = subscribeToEvents('employee', employeeId, (eventName, data) => {
+      if (eventName === 'application_status') {
+        setApplications(current => current.map(app => 
+          app.id === data.application_id ? { ...app, status: data.status } : app
+        ));
       }
-    };
+    });
     
-    fetchApplications();
-    fetchJobs();
+    return unsubscribe;
   }, [employeeId, navigate]);
   
+  // Calculate statistics whenever the applications change
+  useEffect(() => {
+    setStats({
+      totalApplications: applications.length,
+      waitingApplications: applications.filter(app => app.status === 'waiting').length,
+      acceptedApplications: applications.filter(app => app.status === 'accepted').length,
+      rejectedApplications: applications.filter(app => app.status === 'rejected').length
+    });
+  }, [applications]);
+  
   const formatDate = (dateString) => {
     const options = { year: 'numeric', month: 'short', day: 'numeric' };
     return new Date(dateString).toLocaleDateString(undefined, options);
@@ -256,9 +259,7 @@ function EmployeeDashboard() {
                     <span><i className="date-icon"></i> Posted: {formatDate(job.created_at)}</span>
                   </div>
                   <div className="job-description-preview">
-                    {job.description && job.description.length > 150 
-                      ? `${job.description.substring(0, 150)}...` 
-                      : job.description || 'No description provided'}
+                    {job.summary || 'No description provided'}
                   </div>
                   <div className="job-actions">
                     <Link to={`/employee/jobs/${job.id}`} className="view-job-btn">
@@ -1,8 +1,15 @@
 import React, { useState, useEffect } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
-import { getEmployerJobs, getEmployerApplications, getEmployerDetails, deleteJob } from '../../services/api';
+import { getEmployerJobs, getEmployerApplications, getEmployerDetails, getEmployerStats, deleteJob } from '../../services/api';
 import '../../styles/Dashboard.css';
 
+// Dashboard statistics from the /stats totals, kept by counters on the jobs table
+const statsFromTotals = (totals) => ({
+  activeJobs: totals.open_job_count,
+  totalApplicants: totals.application_count,
+  newApplications: totals.waiting_count
+});
+
 function EmployerDashboard() {
   const navigate = useNavigate();
   const [postedJobs, setPostedJobs] = useState([]);
@@ -61,22 +68,16 @@ function EmployerDashboard() {
         const jobs = Array.isArray(jobsData) ? jobsData : [];
         setPostedJobs(jobs);
         
-        // Fetch applications received by the employer
+        // Fetch applications received by the employer (for the recent applications list)
         const applicationData = await getEmployerApplications(employerId);
         // Ensure we have an array
         const applications = Array.isArray(applicationData) ? applicationData : [];
         setApplications(applications);
         
-        // Calculate statistics
-        const activeJobCount = jobs.filter(job => job.status === 'open').length;
-        const totalApplicantsCount = applications.length;
-        const newApplicationsCount = applications.filter(app => app.status === 'waiting').length;
-        
-        setStats({
-          activeJobs: activeJobCount,
-          totalApplicants: totalApplicantsCount,
-          newApplications: newApplicationsCount
-        });
+        const totals = await getEmployerStats(employerId);
+        if (totals) {
+          setStats(statsFromTotals(totals));
+        }
       } catch (error) {
         console.error('Error fetching employer data:', error);
       } finally {
@@ -141,13 +142,11 @@ function EmployerDashboard() {
           // Update applications list by removing applications for the deleted job
           setApplications(prevApps => prevApps.filter(app => app.job_id !== jobId));
           
-          // Update stats
-          setStats(prevStats => ({
-            ...prevStats,
-            activeJobs: prevStats.activeJobs - 1,
-            totalApplicants: Math.max(0, prevStats.totalApplicants - (response.applicationsDeleted || 0)),
-            newApplications: Math.max(0, prevStats.newApplications - (response.applicationsDeleted || 0))
-          }));
+          // Refresh stats from the counters
+          const totals = await getEmployerStats(employerId);
+          if (totals) {
+            setStats(statsFromTotals(totals));
+          }
           
           alert(`Job and ${response.applicationsDeleted || 0} related applications have been deleted.`);
         } else {
@@ -255,9 +254,7 @@ function EmployerDashboard() {
                     <span><i className="date-icon"></i> Posted: {formatDate(job.created_at)}</span>
                   </div>
                   <div className="job-description-preview">
-                    {job.description && job.description.length > 150 
-                      ? `${job.description.substring(0, 150)}...` 
-                      : job.description || 'No description provided'}
+                    {job.summary || 'No description provided'}
                   </div>
                   <div className="job-actions">
                     <Link to={`/employer/jobs/${job.id}`} className="view-job-btn">
@@ -253,6 +253,26 @@ export const getEmployerApplications = async (employerId) => {
   }
 };
 
+/**
+ * Get applicant counts per job and in total for an employer, read from the stored counters
+ * @param {number} employerId Employer ID
+ * @returns {Promise<Object|null>} Totals (application_count, waiting_count, open_job_count, ...) or null
+ */
+export const getEmployerStats = async (employerId) => {
+  try {
+    const response = await fetch(`${API_URL}/employers/${employerId}/stats`, {
+      headers: {
+        'Authorization': `Bearer ${localStorage.getItem('token')}`,
+      }
+    });
+    const data = await response.json();
+    return data.status === 'success' ? data.totals : null;
+  } catch (error) {
+    console.error('Error fetching employer stats:', error);
+    return null;
+  }
+};
+
 /**
  * Get applications submitted by an employee
  * @param {number} employeeId Employee ID
@@ -493,4 +513,53 @@ export const updatePassword = async (userId, userType, passwordData) => {
     console.error('Error updating password:', error);
     return { status: 'error', message: 'Failed to update password' };
   }
-};
\ No newline at end of file
+};
+/**
+ * Fetch several GET endpoints in one round trip through /api/batch
+ * @param {Array<string>} paths Paths relative to the API root, e.g. '/jobs?fields=id,title'
+ * @returns {Promise<Array<Object>>} The response body of every path, in order
+ */
+export const batchGet = async (paths) => {
+  try {
+    const response = await fetch(`${API_URL}/batch`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'Authorization': `Bearer ${localStorage.getItem('token')}`
+      },
+      body: JSON.stringify({ requests: paths.map(path => `/api${path}`) })
+    });
+    const data = await response.json();
+    
+    if (data.status === 'success' && Array.isArray(data.responses)) {
+      return data.responses.map(result => result.body);
+    }
+    return paths.map(() => ({ status: 'error', message: data.message || 'Batch request failed' }));
+  } catch (error) {
+    console.error('Error in batch request:', error);
+    return paths.map(() => ({ status: 'error', message: error.message }));
+  }
+};
+
+/**
+ * Subscribe to live application events of a user (Server-Sent Events)
+ * @param {string} userType - 'employee' or 'employer'
+ * @param {number} userId - The user's ID
+ * @param {Function} onEvent - Called with (eventName, data) for every event
+ * @returns {Function} Closes the stream
+ */
+export const subscribeToEvents = (userType, userId, onEvent) => {
+  const source = new EventSource(`${API_URL}/${userType}s/${userId}/events`);
+  
+  ['application_created', 'application_status'].forEach(eventName => {
+    source.addEventListener(eventName, (event) => {
+      onEvent(eventName, JSON.parse(event.data));
+    });
+  });
+  source.onerror = (error) => {
+    // EventSource reconnects by itself and resumes from the last event id
+    console.error('Event stream error:', error);
+  };
+  
+  return () => source.close();
+};